@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from functools import cached_property
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+
+class Location(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: Optional[str] = None
+    city: str
+    country: str = "AU"
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+    bom_url: str = ""
+    fire_district: Optional[str] = None
+    show_fire_danger: bool = False
+
+    @model_validator(mode="after")
+    def coordinates_together(self):
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValueError("latitude and longitude must be given together")
+        return self
+
+    @property
+    def display_name(self) -> str:
+        return self.name or self.city
+
+
+class PrefetchSettings(BaseModel):
+    enabled: bool = True
+    forecast_interval: float = Field(default=600, gt=0)
+    fire_interval: float = Field(default=900, gt=0)
+    jitter: float = Field(default=0.1, ge=0, lt=1)
+
+
+class ForecastCacheSettings(BaseModel):
+    ttl: float = Field(default=900, gt=0)
+    stale_ttl: float = Field(default=3600, ge=0)
+    max_size: int = Field(default=1024, gt=0)
+    # Forecast grid cell size in degrees, see app/services/weather.py
+    grid: float = Field(default=0.1, gt=0, le=1)
+
+
+class FireFeedSettings(BaseModel):
+    refresh_interval: float = Field(default=900, gt=0)
+    retry_interval: float = Field(default=60, gt=0)
+
+
+class HistorySettings(BaseModel):
+    # Directory of ring buffer files, relative to backend/; defaults to backend/history
+    path: Optional[str] = None
+    capacity: int = Field(default=2048, gt=0)
+    retention: float = Field(default=7 * 86400, gt=0)
+
+
+class SharedCacheSettings(BaseModel):
+    enabled: bool = True
+    # SQLite file, relative to backend/; defaults to backend/shared_cache.sqlite3
+    path: Optional[str] = None
+    # Seconds other workers wait for the one fetching a key before fetching themselves
+    lease: float = Field(default=10, gt=0)
+
+
+class DeadlineSettings(BaseModel):
+    total: float = Field(default=10.0, gt=0)
+    fire_share: float = Field(default=0.3, gt=0, le=1)
+
+
+class Settings(BaseModel):
+    concurrency: int = Field(default=8, gt=0)
+    location_timeout: float = Field(default=10.0, gt=0)
+    deadline: DeadlineSettings = DeadlineSettings()
+    prefetch: PrefetchSettings = PrefetchSettings()
+    forecast_cache: ForecastCacheSettings = ForecastCacheSettings()
+    fire_feeds: Dict[Literal["bom", "cfa"], FireFeedSettings] = {}
+    geocode_cache_path: Optional[str] = None
+    # Opt-in: GeoJSON of official fire weather district boundaries (see app/data/README.md),
+    # relative to backend/, used to assign `fire_district` to locations with coordinates
+    fire_district_boundaries: Optional[str] = None
+    history: HistorySettings = HistorySettings()
+    shared_cache: SharedCacheSettings = SharedCacheSettings()
+    # Free-form httpx pool options per upstream, see app/services/http.py
+    upstreams: Dict[str, dict] = {}
+
+
+class DashboardConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    # The default set, shown when no user is given
+    locations: List[Location]
+    # Per-user location sets, keyed by user name
+    users: Dict[str, List[Location]] = {}
+    settings: Settings = Settings()
+
+    @model_validator(mode="after")
+    def unique_names(self):
+        # Cards are told apart by location name, e.g. in /api/weather/changes
+        for owner, locations in [("locations", self.locations), *self.users.items()]:
+            names = [loc.display_name for loc in locations]
+            duplicates = sorted({name for name in names if names.count(name) > 1})
+            if duplicates:
+                raise ValueError(f"Duplicate location names in {owner}: {', '.join(duplicates)} "
+                                 "(give them distinct `name`s)")
+        return self
+
+    @model_validator(mode="after")
+    def fire_districts_given(self):
+        # Fire danger shown for the wrong district is worse than none: never guess it
+        lookup = self.settings.fire_district_boundaries is not None
+        for owner, locations in [("locations", self.locations), *self.users.items()]:
+            for loc in locations:
+                if loc.show_fire_danger and loc.fire_district is None and not (lookup and loc.latitude is not None):
+                    raise ValueError(f"{loc.display_name} in {owner} shows fire danger but has no fire_district")
+        return self
+
+    def locations_for(self, user: Optional[str] = None) -> List[Location]:
+        """The default set, or `user`'s; raises KeyError for an unknown user."""
+        return self.locations if user is None else self.users[user]
+
+    @cached_property
+    def all_locations(self) -> List[Location]:
+        """Every distinct location across the default and user sets, first seen first."""
+        return list(dict.fromkeys([*self.locations, *(loc for locs in self.users.values() for loc in locs)]))
+
+    @cached_property
+    def fire_districts(self) -> frozenset:
+        """Fire districts referenced by any location — the only ones worth parsing."""
+        return frozenset(loc.fire_district for loc in self.all_locations if loc.fire_district)
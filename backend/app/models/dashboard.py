@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel
+
+
+class CardResult(BaseModel):
+    # "stale": older than the provider's TTL, or the last good data after a failed fetch
+    status: Literal["ok", "stale", "error"]
+    # Unix timestamp of when `data` was fetched
+    updated_at: Optional[float] = None
+    error: Optional[str] = None
+    data: Any = None
+
+
+class DashboardResponse(BaseModel):
+    # Card name -> result, in registration order (see app/services/cards.py)
+    cards: Dict[str, CardResult]
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class HistoryStats(BaseModel):
+    # Over the non-missing readings in the range; None when there are none
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+
+
+class HistoryResponse(BaseModel):
+    location: str
+    # Unix timestamps of each recorded refresh, oldest first
+    time: List[float]
+    # Column -> one reading per timestamp (null where missing), see app/services/history.py
+    series: Dict[str, List[Optional[float]]]
+    stats: Dict[str, HistoryStats]
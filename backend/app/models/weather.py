@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -19,14 +19,83 @@ class FireDangerDay(BaseModel):
 
 class WeatherResponse(BaseModel):
     location: str
-    temperature: float
-    description: str
-    humidity: int
-    wind_speed: float
-    temp_min: float
-    temp_max: float
-    forecast_7day: List[DayForecast]
+    # Measurements are None only on a degraded card, i.e. when `error` is set
+    temperature: Optional[float] = None
+    description: Optional[str] = None
+    humidity: Optional[int] = None
+    wind_speed: Optional[float] = None
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    forecast_7day: List[DayForecast] = []
     bom_today_url: str
     bom_7day_url: str
     total_fire_ban: bool = False
     fire_danger: Optional[List[FireDangerDay]] = None
+    error: Optional[str] = None
+
+
+class WeatherUpdate(BaseModel):
+    """Difference between two dashboard snapshots, as pushed to live clients."""
+    version: int
+    # Card locations in display order, so clients can also apply adds and removals
+    order: List[str]
+    changed: List[WeatherResponse]
+    removed: List[str] = []
+
+
+class WeatherChanges(BaseModel):
+    """Answer to GET /api/weather/changes?since=<version>."""
+    # "<epoch>:<n>": opaque to clients, only ever passed back as `since`
+    version: str
+    # True when `since` is no longer (or never was) kept: `changed` then holds every card in full
+    full: bool = False
+    order: List[str]
+    # Location -> only the fields that differ from version `since` (whole card if new)
+    changed: Dict[str, Dict[str, Any]]
+    removed: List[str] = []
+
+
+class LocationFailure(BaseModel):
+    location: str
+    error: str
+
+
+class WeatherStreamStatus(BaseModel):
+    """Final line of the NDJSON variant of GET /api/weather/."""
+    done: bool = True
+    total: int
+    failed: List[LocationFailure] = []
+
+
+class ForecastSummary(BaseModel):
+    temp_min: Optional[float] = None
+    temp_max: Optional[float] = None
+    temp_mean: Optional[float] = None
+    precipitation_probability_max: Optional[int] = None
+    wind_speed_max: Optional[float] = None
+    uv_index_max: Optional[float] = None
+
+
+class PartOfDaySummary(ForecastSummary):
+    part: str  # night (00–06), morning, afternoon or evening (18–24), local time
+
+
+class DaySummary(ForecastSummary):
+    date: str
+    day: str
+    parts: List[PartOfDaySummary] = []
+
+
+class HourlySeries(BaseModel):
+    # Parallel arrays, one entry per hour in local time; null where Open-Meteo has no value
+    time: List[str]
+    temperature: List[Optional[float]]
+    precipitation_probability: List[Optional[int]]
+    wind_speed: List[Optional[float]]
+    uv_index: List[Optional[float]]
+
+
+class HourlyForecastResponse(BaseModel):
+    location: str
+    days: List[DaySummary]
+    hourly: HourlySeries
@@ -0,0 +1,24 @@
+from typing import Optional
+
+from fastapi import APIRouter
+
+from app.models.dashboard import DashboardResponse
+from app.routers.weather import user_locations
+from app.services.cards import cards
+from app.services.config import config_store
+from app.services.resilience import deadline
+import app.services.dashboard  # noqa: F401  (registers the fire and weather cards)
+
+router = APIRouter()
+
+
+@router.get("/", response_model=DashboardResponse)
+async def dashboard(user: Optional[str] = None):
+    """
+    Every card's data in one response, each with its own status: one failing
+    card is reported as "stale" or "error" while the others are still served.
+    """
+    user_locations(user)
+    config = config_store.get()
+    with deadline(config.settings.deadline.total):
+        return DashboardResponse(cards=await cards.build(config, user))
@@ -1,46 +1,203 @@
-from fastapi import APIRouter, HTTPException
-import yaml
+import asyncio
+from datetime import datetime
+from typing import Optional
 
-from app.models.weather import WeatherResponse
-from app.services.fire import fetch_fire_data
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.models.config import Location
+from app.models.history import HistoryResponse
+from app.models.weather import (
+    HourlyForecastResponse, LocationFailure, WeatherChanges, WeatherResponse, WeatherStreamStatus,
+)
+from app.services.config import config_store
+from app.services.dashboard import (
+    WEATHER_LIST, Snapshot, build_weather, diff_snapshots, scheduler, series_key, stream_weather,
+)
+from app.services.history import history_store
+from app.services.hourly import MAX_DAYS, get_hourly
+from app.services.metrics import timed
+from app.services.quota import QuotaExceeded
+from app.services.resilience import DeadlineExceeded, deadline
 from app.services.weather import get_weather
 
 router = APIRouter()
 
+KEEPALIVE_INTERVAL = 15.0  # seconds between comments on an idle event stream
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison per RFC 9110, also accepting the gzip variant's tag."""
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or etag[:-1] + '-gz"' in tags
+
 
-def load_locations():
-    with open("config.yaml") as f:
-        return yaml.safe_load(f)["locations"]
+def snapshot_response(snapshot: Snapshot, request: Request) -> Response:
+    """Serve a snapshot's pre-encoded bytes, honouring If-None-Match and gzip."""
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match", ""), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["ETag"] = snapshot.etag[:-1] + '-gz"'
+        headers["Content-Encoding"] = "gzip"
+        return Response(snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+
+NDJSON = "application/x-ndjson"
+
+
+def user_locations(user: Optional[str]) -> list[Location]:
+    """The location set to show: the default one, or `user`'s (404 if unknown)."""
+    try:
+        return config_store.get().locations_for(user)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown user: {user}")
+
+
+async def ndjson_weather(user: str = None):
+    """
+    One line per card as soon as it is ready — {"index": <config position>,
+    "weather": {...}} — then a WeatherStreamStatus line listing the failures.
+    """
+    snapshot = scheduler.snapshot_for(user)
+    failed = []
+
+    def line(index: int, card: WeatherResponse) -> bytes:
+        if card.error is not None:
+            failed.append(LocationFailure(location=card.location, error=card.error))
+        return b'{"index":%d,"weather":%s}\n' % (index, card.model_dump_json().encode())
+
+    if snapshot is not None:
+        for index, card in enumerate(snapshot.weather):
+            yield line(index, card)
+        total = len(snapshot.weather)
+    else:
+        config = config_store.get()
+        locations = config.locations_for(user)
+        with deadline(config.settings.deadline.total):
+            async for index, card in stream_weather(config, locations):
+                yield line(index, card)
+        total = len(locations)
+    yield WeatherStreamStatus(total=total, failed=failed).model_dump_json().encode() + b"\n"
 
 
 @router.get("/", response_model=list[WeatherResponse])
-async def all_locations():
-    locations = load_locations()
-    fire_data = fetch_fire_data()
-    results = []
-    for loc in locations:
+async def all_locations(request: Request, user: Optional[str] = None):
+    locations = user_locations(user)
+    # Opt-in progressive variant for clients that render cards as they arrive
+    if NDJSON in request.headers.get("accept", ""):
+        return StreamingResponse(ndjson_weather(user), media_type=NDJSON,
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Served from the background-refreshed snapshot; built on demand only
+    # before the first snapshot exists or when prefetching is disabled
+    snapshot = scheduler.snapshot_for(user)
+    if snapshot is not None:
+        return snapshot_response(snapshot, request)
+    config = config_store.get()
+    with deadline(config.settings.deadline.total):
+        weather = await build_weather(config, locations)
+    with timed("serialize"):
+        body = WEATHER_LIST.dump_json(weather)
+    return Response(body, media_type="application/json")
+
+
+def sse_event(event: str, data: bytes, event_id: int) -> bytes:
+    return b"event: %s\nid: %d\ndata: %s\n\n" % (event.encode(), event_id, data)
+
+
+async def live_events(keepalive: float = KEEPALIVE_INTERVAL, user: str = None):
+    """
+    Server-Sent Events for one client: a `snapshot` event with every card, then
+    an `update` event (see WeatherUpdate) for each published snapshot that
+    changed something. Nothing is fetched per client — all of them share the
+    scheduler's snapshots.
+    """
+    last = None
+    while True:
         try:
-            results.append(await get_weather(
-                loc["city"],
-                loc["country"],
-                loc["bom_url"],
-                fire_district=loc.get("fire_district"),
-                show_fire_danger=loc.get("show_fire_danger", False),
-                fire_data=fire_data,
-                latitude=loc.get("latitude"),
-                longitude=loc.get("longitude"),
-                location_name=loc.get("name"),
-            ))
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=str(e))
-    return results
+            snapshot = await scheduler.next_snapshot(after=last.version if last else 0, timeout=keepalive,
+                                                     user=user)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+            continue
+        if snapshot is None:
+            return  # shutting down, or the user was removed
+        if last is None:
+            yield sse_event("snapshot", b'{"version":%d,"weather":%s}' % (snapshot.version, snapshot.body),
+                            snapshot.version)
+        else:
+            update = diff_snapshots(last, snapshot)
+            if update is not None:
+                yield sse_event("update", update.model_dump_json().encode(), snapshot.version)
+        last = snapshot
+
+
+@router.get("/stream")
+async def stream(user: Optional[str] = None):
+    # Declared before /{city} so "stream" isn't taken for a city name
+    user_locations(user)
+    if not scheduler.running:
+        raise HTTPException(status_code=503, detail="Live updates need settings.prefetch.enabled")
+    return StreamingResponse(live_events(user=user), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/changes", response_model=WeatherChanges)
+async def changes(since: str = "", user: Optional[str] = None):
+    """
+    Only the cards and fields that changed since snapshot version `since`, or
+    every card (`full: true`) when that version is too old, unknown or from
+    another worker or process.
+    """
+    user_locations(user)
+    body = scheduler.changes(since, user) if scheduler.running else None
+    if body is None:
+        raise HTTPException(status_code=503, detail="No snapshot yet (needs settings.prefetch.enabled)")
+    return Response(body, media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/{location}/history", response_model=HistoryResponse)
+async def location_history(location: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           user: Optional[str] = None):
+    """Recorded readings of a configured location (by name) plus min/max/mean over the range."""
+    loc = next((loc for loc in user_locations(user) if loc.display_name.casefold() == location.casefold()), None)
+    if loc is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location: {location}")
+    with timed("history"):
+        result = history_store.query(
+            series_key(loc),
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+        )
+    return HistoryResponse(location=loc.display_name, **result)
+
+
+@router.get("/{city}/hourly", response_model=HourlyForecastResponse)
+async def hourly_forecast(city: str, country: str = "AU", days: int = Query(default=7, ge=1, le=MAX_DAYS)):
+    try:
+        with deadline(config_store.get().settings.deadline.total):
+            return await get_hourly(city, country, days)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 
 @router.get("/{city}", response_model=WeatherResponse)
 async def single_location(city: str, country: str = "AU", bom_url: str = ""):
     try:
-        return await get_weather(city, country, bom_url)
+        with deadline(config_store.get().settings.deadline.total):
+            return await get_weather(city, country, bom_url)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
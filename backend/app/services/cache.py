@@ -0,0 +1,141 @@
+"""
+In-process TTL cache with LRU eviction and stale-while-revalidate.
+Entries younger than `ttl` are served as-is. Entries past `ttl` but within
+`stale_ttl` more seconds are still served immediately while a single background
+task refreshes them, at background priority for the upstream quotas
+(see app.services.quota). Anything older is fetched inline.
+With a `shared` store (see app.services.shared_cache) every value fetched is
+also written there, and before fetching, the cache first looks for a newer copy
+another worker process stored. Only one worker fetches a key at a time.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from app.services.metrics import metrics
+from app.services.quota import BACKGROUND, priority
+from app.services.shared_cache import MISSING, SharedCache
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    def __init__(self, ttl: float = 900.0, stale_ttl: float = 3600.0, max_size: int = 1024,
+                 clock: Callable[[], float] = time.monotonic, name: str = "cache",
+                 shared: SharedCache = None):
+        self.name = name
+        self.shared = shared
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()  # key -> (stored_at, value)
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+
+    def configure(self, ttl: float = None, stale_ttl: float = None, max_size: int = None):
+        if ttl is not None:
+            self.ttl = ttl
+        if stale_ttl is not None:
+            self.stale_ttl = stale_ttl
+        if max_size is not None:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._refreshing.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key: Hashable):
+        """Return the stored value regardless of age, or None."""
+        entry = self._entries.get(key) or self._adopt_shared(key)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: Hashable, value):
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.put(self.name, key, value, self.ttl + self.stale_ttl)
+
+    def _store(self, key: Hashable, value, age: float = 0.0):
+        entry = self._entries[key] = (self.clock() - age, value)
+        self._entries.move_to_end(key)
+        self._evict()
+        return entry
+
+    def _adopt_shared(self, key: Hashable, newer_than: float = None):
+        """Take the shared store's copy of `key` if it is younger than `newer_than` seconds."""
+        found = self.shared.get(self.name, key) if self.shared is not None else None
+        if found is None or (newer_than is not None and found[0] >= newer_than):
+            return None
+        age, value = found
+        return self._store(key, value, age)
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        entry = self._entries.get(key)
+        if entry is None or self.clock() - entry[0] >= self.ttl:
+            # Another worker may have fetched it since
+            newer_than = None if entry is None else self.clock() - entry[0]
+            entry = self._adopt_shared(key, newer_than) or entry
+        if entry is not None:
+            stored_at, value = entry
+            age = self.clock() - stored_at
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                if age >= self.ttl:
+                    metrics.count_cache(self.name, "stale")
+                    self._refresh_in_background(key, fetch)
+                else:
+                    metrics.count_cache(self.name, "hit")
+                return value
+        metrics.count_cache(self.name, "miss")
+        return await self._fetch(key, fetch)
+
+    async def refresh(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        """
+        Fetch and store a new value regardless of the current entry's age.
+        A copy another worker stored within the last ttl/2 seconds counts as
+        refreshed, so N workers' prefetch loops don't fetch N times.
+        """
+        entry = self._adopt_shared(key, self.ttl / 2)
+        if entry is not None:
+            return entry[1]
+        return await self._fetch(key, fetch)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        async def fetch_and_store():
+            value = await fetch()
+            self.set(key, value)
+            return value
+
+        if self.shared is None:
+            return await fetch_and_store()
+
+        def read():
+            entry = self._adopt_shared(key, self.ttl)
+            return entry[1] if entry is not None else MISSING
+
+        return await self.shared.fetch_once(self.name, key, fetch_and_store, read)
+
+    def _refresh_in_background(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                with priority(BACKGROUND):
+                    await self._fetch(key, fetch)
+            except Exception:
+                # Keep serving the stale value until the next attempt
+                logger.exception("Background refresh of %s %r failed", self.name, key)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.ensure_future(refresh())
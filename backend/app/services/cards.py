@@ -0,0 +1,136 @@
+"""
+Dashboard card providers.
+Each card registers an async fetch function with its TTL and the cards it
+depends on. CardRegistry.build runs every provider once per request, in
+dependency order and otherwise concurrently, handing each provider the data of
+its dependencies, so upstream data shared by several cards is fetched once.
+Results are cached per provider (and per user for per-user cards) with
+stale-while-revalidate, and concurrent builds share one fetch per card.
+The DashboardScheduler refreshes every card in the background at its own
+`interval` (its TTL by default), so requests are normally served from cache.
+A card that fails serves its last good data marked "stale", or an "error";
+it never fails the other cards.
+Dependencies must be registered before the cards that use them, which keeps
+the graph acyclic and makes registration order a valid build order.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from app.models.config import DashboardConfig
+from app.models.dashboard import CardResult
+from app.services.cache import TTLCache
+from app.services.resilience import within_deadline
+from app.services.singleflight import SingleFlight
+
+
+@dataclass(frozen=True)
+class CardContext:
+    config: DashboardConfig
+    user: Optional[str]
+    # Dependency name -> its data (possibly stale), or None if it failed
+    deps: dict[str, Any]
+
+
+@dataclass(frozen=True)
+class CardProvider:
+    name: str
+    fetch: Callable[[CardContext], Awaitable]
+    ttl: float = 60.0
+    stale_ttl: float = 3600.0
+    depends_on: tuple[str, ...] = ()
+    per_user: bool = False
+    interval: float = 60.0  # seconds between background refreshes
+
+
+class CardRegistry:
+    def __init__(self):
+        self._providers: dict[str, CardProvider] = {}
+        self._caches: dict[str, TTLCache] = {}
+        self._flights = SingleFlight()
+
+    def provider(self, name: str, ttl: float = 60.0, stale_ttl: float = 3600.0,
+                 depends_on: tuple[str, ...] = (), per_user: bool = False, interval: float = None):
+        """
+        Register the decorated `async def fetch(context: CardContext)` as card
+        `name`, refreshed in the background every `interval` seconds (default: `ttl`).
+        """
+        def register(fetch):
+            if name in self._providers:
+                raise ValueError(f"Card {name!r} is already registered")
+            unknown = [dep for dep in depends_on if dep not in self._providers]
+            if unknown:
+                raise ValueError(f"Card {name!r} depends on unregistered cards: {', '.join(unknown)}")
+            self._providers[name] = CardProvider(name, fetch, ttl, stale_ttl, tuple(depends_on), per_user,
+                                                 ttl if interval is None else interval)
+            self._caches[name] = TTLCache(ttl=ttl, stale_ttl=stale_ttl, max_size=256, name=f"card-{name}")
+            return fetch
+        return register
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._providers)
+
+    @property
+    def providers(self) -> list[CardProvider]:
+        return list(self._providers.values())
+
+    def _needed(self, name: str) -> set[str]:
+        """`name` and every card it depends on, directly or not."""
+        needed = {name}
+        for dep in self._providers[name].depends_on:
+            needed |= self._needed(dep)
+        return needed
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    async def build(self, config: DashboardConfig, user: str = None, refresh: str = None) -> dict[str, CardResult]:
+        """
+        Every card's result for `user` (the default location set if None).
+        With `refresh`, only that card, fetched now whatever its cache holds,
+        and the cards it depends on.
+        """
+        needed = self._needed(refresh) if refresh else self._providers
+        tasks: dict[str, asyncio.Task] = {}
+        for name, provider in self._providers.items():
+            if name not in needed:
+                continue
+            deps = {dep: tasks[dep] for dep in provider.depends_on}
+            tasks[name] = asyncio.ensure_future(self._run(provider, config, user, deps, name == refresh))
+        try:
+            return dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def _run(self, provider: CardProvider, config: DashboardConfig, user: Optional[str],
+                   deps: dict[str, asyncio.Task], refresh: bool = False) -> CardResult:
+        results = {name: await task for name, task in deps.items()}
+        context = CardContext(config, user, {name: result.data for name, result in results.items()})
+        key = user if provider.per_user else None
+        cache = self._caches[provider.name]
+
+        async def fetch():
+            return time.time(), await provider.fetch(context)
+
+        def shared_fetch():
+            return self._flights.do((provider.name, key), fetch)
+
+        try:
+            lookup = cache.refresh(key, shared_fetch) if refresh else cache.get_or_fetch(key, shared_fetch)
+            updated_at, data = await within_deadline(lookup)
+            error = None
+        except Exception as e:
+            cached = cache.peek(key)
+            error = "Timed out" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+            if cached is None:
+                return CardResult(status="error", error=error)
+            updated_at, data = cached
+        fresh = error is None and time.time() - updated_at < provider.ttl
+        return CardResult(status="ok" if fresh else "stale", updated_at=updated_at, error=error, data=data)
+
+
+cards = CardRegistry()
@@ -0,0 +1,134 @@
+"""
+Configuration service.
+Parses config.yaml once into a validated DashboardConfig and hot-reloads it when
+the file's mtime changes. Readers call `config_store.get()`, which returns the
+current immutable config without any file I/O; a reload builds a complete new
+config and swaps it in, so a request never sees a half-applied change.
+Schema errors raise ConfigError at startup. During a hot reload they are logged
+and the previous config stays in place.
+If `settings.fire_district_boundaries` is set, locations with coordinates but
+no `fire_district` get one from those boundaries while the file is parsed,
+never while a request is served. Otherwise `fire_district` is never guessed.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import yaml
+from pydantic import ValidationError
+
+from app.models.config import DashboardConfig, Location
+from app.services.districts import DistrictIndex, district_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[2] / "config.yaml"
+WATCH_INTERVAL = 2.0
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def parse_config(text: str, source: str = "config.yaml", base_dir: Path = DEFAULT_CONFIG_PATH.parent) -> DashboardConfig:
+    try:
+        raw = yaml.safe_load(text) or {}
+        config = DashboardConfig.model_validate(raw)
+    except (yaml.YAMLError, ValidationError) as e:
+        raise ConfigError(f"Invalid {source}: {e}") from e
+    boundaries = config.settings.fire_district_boundaries
+    if boundaries is None:
+        return config
+    try:
+        index = district_index(base_dir / boundaries)
+    except (OSError, ValueError, KeyError) as e:
+        raise ConfigError(f"Invalid fire_district_boundaries in {source}: {e!r}") from e
+    return assign_fire_districts(config, index, source)
+
+
+def assign_fire_districts(config: DashboardConfig, index: DistrictIndex,
+                          source: str = "config.yaml") -> DashboardConfig:
+    def assign(loc: Location) -> Location:
+        if loc.fire_district is not None or loc.latitude is None:
+            return loc
+        district = index.lookup(loc.latitude, loc.longitude)
+        if district is None:
+            if loc.show_fire_danger:
+                raise ConfigError(f"Invalid {source}: {loc.display_name} ({loc.latitude}, {loc.longitude}) "
+                                  "is in no fire district; set its fire_district")
+            logger.warning("%s (%s, %s) is in no fire district; set fire_district to show its fire bans",
+                           loc.display_name, loc.latitude, loc.longitude)
+        return loc.model_copy(update={"fire_district": district})
+
+    return config.model_copy(update={
+        "locations": [assign(loc) for loc in config.locations],
+        "users": {user: [assign(loc) for loc in locs] for user, locs in config.users.items()},
+    })
+
+
+class ConfigStore:
+    def __init__(self, path=DEFAULT_CONFIG_PATH):
+        self.path = Path(path)
+        self._config: DashboardConfig = None
+        self._mtime: int = None
+        self._rejected_mtime: int = None
+        self._listeners: list = []
+        self._task: asyncio.Task = None
+
+    def load(self) -> DashboardConfig:
+        """Read and validate the file now, replacing the current config."""
+        mtime = os.stat(self.path).st_mtime_ns
+        config = parse_config(self.path.read_text(), source=str(self.path), base_dir=self.path.parent)
+        self._config, self._mtime = config, mtime
+        return config
+
+    def get(self) -> DashboardConfig:
+        if self._config is None:
+            return self.load()
+        return self._config
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.error("Keeping previous configuration: %s", e)
+            return False
+        if mtime in (self._mtime, self._rejected_mtime):
+            return False
+        try:
+            self.load()
+        except (OSError, ConfigError) as e:
+            self._rejected_mtime = mtime  # report each bad edit once
+            logger.error("Keeping previous configuration: %s", e)
+            return False
+        logger.info("Reloaded %s", self.path)
+        return True
+
+    def add_listener(self, listener: Callable[[], Awaitable]):
+        """Register a coroutine function awaited after each successful hot reload."""
+        self._listeners.append(listener)
+
+    async def watch(self, interval: float = WATCH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            if self.reload_if_changed():
+                for listener in self._listeners:
+                    try:
+                        await listener()
+                    except Exception:
+                        logger.exception("Config reload listener failed")
+
+    def start_watching(self, interval: float = WATCH_INTERVAL):
+        self._task = asyncio.create_task(self.watch(interval))
+
+    async def stop_watching(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._listeners.clear()
+
+
+config_store = ConfigStore()
@@ -0,0 +1,424 @@
+"""
+Dashboard snapshot service.
+Builds the weather cards for every configured location and keeps an immutable
+snapshot of them refreshed in the background, so GET /api/weather/ can answer
+without touching any upstream API. Live clients wait on the scheduler for the
+next snapshot and are sent only the cards that changed; pollers ask for the
+fields changed since the version they have. Every round that fetches
+forecasts is also appended to the history store.
+Also registers the "fire" and "weather" cards served by /api/dashboard.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import random
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import Awaitable, Callable
+
+from pydantic import TypeAdapter
+
+from app.models.config import DashboardConfig, Location
+from app.models.weather import WeatherChanges, WeatherResponse, WeatherUpdate
+from app.services.cards import CardContext, CardProvider, cards
+from app.services.fire import fetch_fire_data
+from app.services.history import history_store
+from app.services.metrics import timed
+from app.services.quota import BACKGROUND, priority
+from app.services.resilience import budget, deadline, remaining
+from app.services.shared_cache import shared_cache
+from app.services.weather import forecast_batcher, get_weather, grid_cell
+
+logger = logging.getLogger(__name__)
+
+WEATHER_LIST = TypeAdapter(list[WeatherResponse])
+
+DEADLINE_GRACE = 0.1  # seconds
+
+# Past snapshots per location set that /api/weather/changes can diff against;
+# forecast (10 minute) and fire (15 minute) rounds each publish one by default,
+# so this covers about 3 hours
+KEPT_VERSIONS = 32
+
+# Shared cache lease held by the one worker that records history
+HISTORY_LEASE = ("history", "writer")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One published dashboard state. The JSON body, its gzip variant and a strong
+    ETag are computed once when the snapshot is built, so serving it costs no
+    validation or serialization.
+    """
+    version: int
+    built_at: float
+    weather: tuple[WeatherResponse, ...]
+    body: bytes = b""
+    gzip_body: bytes = b""
+    etag: str = ""
+
+
+def make_snapshot(version: int, weather) -> Snapshot:
+    weather = tuple(weather)
+    with timed("serialize"):
+        body = WEATHER_LIST.dump_json(list(weather))
+    return Snapshot(
+        version=version,
+        built_at=time.time(),
+        weather=weather,
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=6, mtime=0),
+        etag='"%s"' % hashlib.sha256(body).hexdigest()[:32],
+    )
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> WeatherUpdate:
+    """
+    Cards in `new` that differ from `old`, or None if nothing visible changed.
+    Fire district changes show up as the changed cards of the locations in them.
+    """
+    before = {w.location: w for w in old.weather}
+    order = [w.location for w in new.weather]
+    changed = [w for w in new.weather if before.get(w.location) != w]
+    removed = [name for name in before if name not in set(order)]
+    if not changed and not removed and order == [w.location for w in old.weather]:
+        return None
+    return WeatherUpdate(version=new.version, order=order, changed=changed, removed=removed)
+
+
+def changes_since(old: tuple[WeatherResponse, ...], new: Snapshot, version: str) -> WeatherChanges:
+    """
+    Per-card, per-field difference from the cards `old` to snapshot `new`
+    (published as `version`); with no `old` every card of `new` is sent in full.
+    """
+    order = [w.location for w in new.weather]
+    if old is None:
+        return WeatherChanges(version=version, full=True, order=order,
+                              changed={w.location: w.model_dump() for w in new.weather})
+    before = {w.location: w for w in old}
+    changed = {}
+    for card in new.weather:
+        previous = before.get(card.location)
+        if previous is None:
+            changed[card.location] = card.model_dump()
+        elif previous != card:
+            fields = previous.model_dump()
+            changed[card.location] = {k: v for k, v in card.model_dump().items() if fields[k] != v}
+    removed = [name for name in before if name not in set(order)]
+    return WeatherChanges(version=version, order=order, changed=changed, removed=removed)
+
+
+async def fetch_location(loc: Location, fire_data: dict, timeout: float,
+                         refresh: bool = False) -> WeatherResponse:
+    """
+    Fetch one configured location under its own deadline.
+    Upstream calls inside see the deadline and fall back to cached data when it
+    runs out; any remaining failure degrades only this card: a WeatherResponse
+    carrying `error` is returned.
+    """
+    try:
+        with deadline(timeout):
+            # The grace lets get_weather's own fallback win the race with this backstop
+            return await asyncio.wait_for(get_weather(
+                loc.city,
+                loc.country,
+                loc.bom_url,
+                fire_district=loc.fire_district,
+                show_fire_danger=loc.show_fire_danger,
+                fire_data=fire_data,
+                latitude=loc.latitude,
+                longitude=loc.longitude,
+                location_name=loc.name,
+                refresh=refresh,
+            ), timeout=max(0.0, remaining()) + DEADLINE_GRACE)
+    except asyncio.TimeoutError:
+        error = f"Timed out after {timeout:g}s"
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return WeatherResponse(
+        location=loc.display_name,
+        bom_today_url=loc.bom_url + "#today",
+        bom_7day_url=loc.bom_url + "#7-days",
+        error=error,
+    )
+
+
+def location_cell(loc: Location):
+    """The forecast grid cell of a location, or its city if it must be geocoded first."""
+    if loc.latitude is not None:
+        return grid_cell(loc.latitude, loc.longitude)
+    return loc.city.casefold(), loc.country
+
+
+def series_key(loc: Location) -> str:
+    """History series of a location: its forecast cell plus its fire district."""
+    return "%s,%s|%s" % (*location_cell(loc), loc.fire_district or "")
+
+
+def readings(loc: Location, card: WeatherResponse, fire_data: dict) -> dict:
+    # Fire readings come from the district, whether or not the card shows them
+    district = fire_data.get(loc.fire_district) or {}
+    today = (district.get("fire_danger") or [None])[0]
+    return {
+        "temperature": card.temperature,
+        "humidity": card.humidity,
+        "wind_speed": card.wind_speed,
+        "fire_danger_index": today.index if today else None,
+        "total_fire_ban": district.get("total_fire_ban") if loc.fire_district else None,
+    }
+
+
+def record_history(cards: dict[Location, WeatherResponse], fire_data: dict, when: float):
+    """Append one row per series; degraded cards are skipped rather than recorded as gaps."""
+    rows = {series_key(loc): (loc, card) for loc, card in cards.items() if card.error is None}
+    for key, (loc, card) in rows.items():
+        history_store.record(key, readings(loc, card, fire_data), when)
+
+
+async def _after(leader: asyncio.Task, fetch: Callable[[], Awaitable]):
+    await asyncio.wait({leader})
+    return await fetch()
+
+
+async def stream_weather(config: DashboardConfig, locations: list[Location] = None, refresh: bool = False,
+                         fire_data: dict = None):
+    """
+    Fetch `locations` (the default set if None) concurrently, yielding
+    (index, card) in completion order so callers can use each card as soon as
+    it is ready.
+    With refresh=True only the first location in each forecast grid cell forces
+    an upstream refresh; the others wait for it and read the cache, so upstream
+    traffic follows distinct cells, not locations or users.
+    Under a request deadline the fire feeds get `deadline.fire_share` of it and
+    the forecasts the rest; feeds that miss it keep their last good data.
+    Pass `fire_data` if the caller already has it.
+    Every location starts at once, so all of their forecast cells join the same
+    upstream batch; `settings.concurrency` limits the batched requests in flight.
+    """
+    locations = config.locations if locations is None else locations
+    forecast_batcher.configure(max_in_flight=config.settings.concurrency)
+    timeout = config.settings.location_timeout
+    if fire_data is None:
+        with budget(config.settings.deadline.fire_share):
+            fire_data = await fetch_fire_data(config.fire_districts)
+    index_of = {}
+    leaders: dict[tuple, asyncio.Task] = {}
+    for i, loc in enumerate(locations):
+        fetch = partial(fetch_location, loc, fire_data, timeout)
+        leader = leaders.get(location_cell(loc)) if refresh else None
+        if leader is None:
+            task = asyncio.ensure_future(fetch(refresh=refresh))
+            if refresh:
+                leaders[location_cell(loc)] = task
+        else:
+            task = asyncio.ensure_future(_after(leader, fetch))
+        index_of[task] = i
+    pending = set(index_of)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield index_of[task], task.result()
+    finally:
+        # The consumer went away (e.g. a client disconnected mid-stream)
+        for task in pending:
+            task.cancel()
+
+
+async def build_weather(config: DashboardConfig, locations: list[Location] = None,
+                        refresh: bool = False, fire_data: dict = None) -> list[WeatherResponse]:
+    """Fetch `locations` (the default set if None) concurrently, in order."""
+    locations = config.locations if locations is None else locations
+    weather = [None] * len(locations)
+    async for i, card in stream_weather(config, locations, refresh=refresh, fire_data=fire_data):
+        weather[i] = card
+    return weather
+
+
+def jittered(interval: float, jitter: float) -> float:
+    """Spread refreshes by ±jitter (a fraction of interval) so workers don't align."""
+    return interval * (1 + random.uniform(-jitter, jitter))
+
+
+class DashboardScheduler:
+    """
+    Refreshes forecasts and fire data on their own intervals and publishes a new
+    Snapshot per location set (the default one and each user's) after each
+    refresh. A location shared by several sets is fetched once per round.
+    Readers just take `snapshot` or `snapshot_for(user)`; snapshots are
+    replaced, never mutated. Push clients await `next_snapshot()` instead of polling.
+    The cards of the last KEPT_VERSIONS snapshots per set are kept for `changes()`.
+    Versions only count within one scheduler, so pollers are given them
+    qualified by `epoch`, which is different in every worker and after every
+    restart; a version from another epoch gets every card in full.
+    Every registered card is also refreshed on its own interval (see cards.py),
+    once the first snapshot is out.
+    With several workers on a host only one records history: the one holding
+    the shared cache's "history" lease, renewed every forecast round. If that worker
+    stops, another takes over once the lease runs out.
+    """
+
+    def __init__(self):
+        self.snapshot: Snapshot = None
+        self.user_snapshots: dict[str, Snapshot] = {}
+        self._version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self._tasks: list[asyncio.Task] = []
+        self._lock: asyncio.Lock = None
+        self._load_config: Callable[[], DashboardConfig] = None
+        self._history_lease = 0.0
+        self._published = asyncio.Event()
+        self._past: dict[str, OrderedDict[int, tuple]] = {}  # user (None: default set) -> version -> cards
+        self._changes: dict[tuple, bytes] = {}  # (user, since) -> encoded WeatherChanges, this version only
+
+    def snapshot_for(self, user: str = None) -> Snapshot:
+        return self.snapshot if user is None else self.user_snapshots.get(user)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def refresh(self, refresh_forecasts: bool = True) -> Snapshot:
+        async with self._lock:
+            config = self._load_config()
+            locations = config.all_locations
+            # Nobody is waiting on a round: its upstream calls yield to interactive ones
+            with priority(BACKGROUND):
+                cards = dict(zip(locations, await build_weather(config, locations, refresh=refresh_forecasts)))
+                # Already fetched for this round, so this is a cache hit
+                fire_data = await fetch_fire_data(config.fire_districts)
+            # Fire-only and config reload rounds would only repeat the last row
+            if refresh_forecasts and shared_cache.acquire(*HISTORY_LEASE, lease=self._history_lease):
+                record_history(cards, fire_data, time.time())
+            self._version += 1
+            self.user_snapshots = {
+                user: make_snapshot(self._version, [cards[loc] for loc in user_locations])
+                for user, user_locations in config.users.items()
+            }
+            snapshot = make_snapshot(self._version, [cards[loc] for loc in config.locations])
+            self._remember({None: snapshot, **self.user_snapshots})
+            self._publish(snapshot)
+            return self.snapshot
+
+    def _remember(self, snapshots: dict[str, Snapshot]):
+        self._past = {user: self._past.get(user, OrderedDict()) for user in snapshots}
+        for user, snapshot in snapshots.items():
+            past = self._past[user]
+            past[snapshot.version] = snapshot.weather
+            while len(past) > KEPT_VERSIONS:
+                past.popitem(last=False)
+        self._changes = {}
+
+    def published_version(self, version: int) -> str:
+        return f"{self.epoch}:{version}"
+
+    def changes(self, since: str, user: str = None) -> bytes:
+        """
+        JSON-encoded WeatherChanges from published version `since` (see
+        published_version) to `user`'s current snapshot, computed once per
+        (since, version) however many clients ask; None before the first snapshot.
+        """
+        current = self.snapshot_for(user)
+        if current is None:
+            return None
+        epoch, _, number = since.partition(":")
+        old = None
+        if epoch == self.epoch and number.isdigit():
+            old = self._past.get(user, {}).get(int(number))
+        key = (user, since if old is not None else None)
+        body = self._changes.get(key)
+        if body is None:
+            with timed("serialize"):
+                changes = changes_since(old, current, self.published_version(current.version))
+                body = self._changes[key] = changes.model_dump_json().encode()
+        return body
+
+    def _publish(self, snapshot: Snapshot):
+        # Wake everyone waiting on the current event and start a fresh one
+        self.snapshot = snapshot
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    async def next_snapshot(self, after: int = 0, timeout: float = None, user: str = None) -> Snapshot:
+        """
+        Wait for a snapshot of `user`'s set newer than version `after` and return
+        it; None once the scheduler stops or if the user no longer exists.
+        Raises asyncio.TimeoutError after `timeout` seconds.
+        """
+        while self.running and (self.snapshot is None or self.snapshot.version <= after):
+            await asyncio.wait_for(self._published.wait(), timeout)
+        return self.snapshot_for(user) if self.running else None
+
+    async def start(self, load_config: Callable[[], DashboardConfig], forecast_interval: float = 600.0,
+                    fire_interval: float = 900.0, jitter: float = 0.1):
+        self._load_config = load_config
+        # Outlives the gap between two of this worker's forecast rounds, so it stays the writer
+        self._history_lease = 2 * forecast_interval * (1 + jitter)
+        self._lock = asyncio.Lock()
+        self._published = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._loop(forecast_interval, jitter, refresh_forecasts=True)),
+            asyncio.create_task(self._loop(fire_interval, jitter, refresh_forecasts=False, delay=True)),
+            *(asyncio.create_task(self._card_loop(provider, jitter)) for provider in cards.providers),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        shared_cache.release(*HISTORY_LEASE)
+        self.user_snapshots = {}
+        self._past = {}
+        self._changes = {}
+        self._publish(None)
+
+    async def _loop(self, interval: float, jitter: float, refresh_forecasts: bool, delay: bool = False):
+        # Fire-only rounds reuse cached forecasts and pick up new fire data via fetch_fire_data
+        if delay:
+            await asyncio.sleep(jittered(interval, jitter))
+        while True:
+            try:
+                await self.refresh(refresh_forecasts=refresh_forecasts)
+            except Exception:
+                # Keep serving the previous snapshot
+                logger.exception("Dashboard refresh failed")
+            await asyncio.sleep(jittered(interval, jitter))
+
+    async def _card_loop(self, provider: CardProvider, jitter: float):
+        # The first requests build every card on demand; keep them fresh from then on
+        while True:
+            await asyncio.sleep(jittered(provider.interval, jitter))
+            try:
+                config = self._load_config()
+                with priority(BACKGROUND):
+                    for user in [None, *config.users] if provider.per_user else [None]:
+                        await cards.build(config, user, refresh=provider.name)
+            except Exception:
+                # Keep serving the cached cards
+                logger.exception("Refreshing the %s card failed", provider.name)
+
+
+scheduler = DashboardScheduler()
+
+
+@cards.provider("fire")
+async def fire_card(context: CardContext) -> dict:
+    """Fire danger and Total Fire Ban status of every district a location is in."""
+    with budget(context.config.settings.deadline.fire_share):
+        return await fetch_fire_data(context.config.fire_districts)
+
+
+@cards.provider("weather", depends_on=("fire",), per_user=True)
+async def weather_card(context: CardContext) -> list[WeatherResponse]:
+    """The user's weather cards: the published snapshot, or built on demand."""
+    snapshot = scheduler.snapshot_for(context.user)
+    if snapshot is not None:
+        return list(snapshot.weather)
+    return await build_weather(context.config, context.config.locations_for(context.user),
+                               fire_data=context.deps["fire"])
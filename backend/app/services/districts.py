@@ -0,0 +1,130 @@
+"""
+Fire-district lookup by coordinates.
+District boundaries are read from a GeoJSON file (Polygon / MultiPolygon
+features with a `name` property matching the BOM and CFA feed names) and
+indexed on a regular lat/lon grid: each grid cell lists only the districts
+whose bounding box overlaps it, so a lookup is one dict access plus a
+point-in-polygon test against one or two small polygons.
+Nothing is bundled: `settings.fire_district_boundaries` opts in with a file
+made from official boundaries by `python -m app.services.districts SOURCE.geojson`,
+which simplifies them to within SIMPLIFY_TOLERANCE. Each file is indexed once,
+while config.yaml is loaded.
+"""
+import json
+import math
+from pathlib import Path
+
+DEFAULT_OUTPUT_PATH = Path(__file__).resolve().parents[1] / "data" / "vic_fire_districts.geojson"
+INDEX_CELL = 0.25  # degrees
+SIMPLIFY_TOLERANCE = 0.005  # degrees, about 500 m: no simplified border moves further than this
+
+
+def point_in_rings(lon: float, lat: float, rings) -> bool:
+    """Even-odd ray casting over all rings, so holes are handled too."""
+    inside = False
+    for ring in rings:
+        x1, y1 = ring[-1]
+        for x2, y2 in ring:
+            if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+                inside = not inside
+            x1, y1 = x2, y2
+    return inside
+
+
+def simplify(ring: list, tolerance: float = SIMPLIFY_TOLERANCE) -> list:
+    """Douglas-Peucker: drop the vertices within `tolerance` of the line the kept ones draw."""
+    if len(ring) < 3:
+        return ring
+    (x1, y1), (x2, y2) = ring[0], ring[-1]
+    length = math.hypot(x2 - x1, y2 - y1)
+    best, farthest = 0.0, 0
+    for i, (x, y) in enumerate(ring[1:-1], 1):
+        if length:
+            distance = abs((x2 - x1) * (y1 - y) - (x1 - x) * (y2 - y1)) / length
+        else:
+            distance = math.hypot(x - x1, y - y1)  # a closed ring: the distance from its start
+        if distance > best:
+            best, farthest = distance, i
+    if best <= tolerance:
+        return [ring[0], ring[-1]]
+    return simplify(ring[:farthest + 1], tolerance)[:-1] + simplify(ring[farthest:], tolerance)
+
+
+class DistrictIndex:
+    def __init__(self, path, cell: float = INDEX_CELL):
+        self.path = Path(path)
+        self.cell = cell
+        self._polygons: list[tuple[str, list]] = None  # (district name, rings)
+        self._grid: dict[tuple[int, int], list[int]] = {}
+
+    def _key(self, lon: float, lat: float) -> tuple[int, int]:
+        return math.floor(lon / self.cell), math.floor(lat / self.cell)
+
+    def load(self):
+        features = json.loads(self.path.read_text())["features"]
+        polygons, grid = [], {}
+        for feature in features:
+            geometry = feature["geometry"]
+            parts = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            for rings in parts:
+                index = len(polygons)
+                polygons.append((feature["properties"]["name"], rings))
+                lons = [x for x, _ in rings[0]]
+                lats = [y for _, y in rings[0]]
+                (x0, y0), (x1, y1) = self._key(min(lons), min(lats)), self._key(max(lons), max(lats))
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        grid.setdefault((x, y), []).append(index)
+        self._polygons, self._grid = polygons, grid
+
+    def lookup(self, lat: float, lon: float) -> str:
+        """Name of the district containing (lat, lon), or None outside all of them."""
+        if self._polygons is None:
+            self.load()
+        for index in self._grid.get(self._key(lon, lat), ()):
+            name, rings = self._polygons[index]
+            if point_in_rings(lon, lat, rings):
+                return name
+        return None
+
+
+_indexes: dict[Path, DistrictIndex] = {}
+
+
+def district_index(path) -> DistrictIndex:
+    """The loaded index of the boundaries in `path`, read on first use only."""
+    path = Path(path).resolve()
+    if path not in _indexes:
+        index = DistrictIndex(path)
+        index.load()
+        _indexes[path] = index
+    return _indexes[path]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Write district boundaries in the bundled format")
+    parser.add_argument("source", help="GeoJSON of the districts (WGS84 lon/lat)")
+    parser.add_argument("--name-property", default="name", help="feature property holding the district name")
+    parser.add_argument("--tolerance", type=float, default=SIMPLIFY_TOLERANCE, help="degrees")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_PATH))
+    args = parser.parse_args()
+    features = []
+    for feature in json.loads(Path(args.source).read_text())["features"]:
+        geometry = feature["geometry"]
+        parts = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+        simplified = []
+        for rings in parts:
+            rings = [[[round(x, 4), round(y, 4)] for x, y in simplify(ring, args.tolerance)] for ring in rings]
+            if len(rings[0]) >= 4:  # smaller than the tolerance: dropped, like holes that small
+                simplified.append([ring for ring in rings if len(ring) >= 4])
+        features.append(json.dumps({
+            "type": "Feature",
+            "properties": {"name": feature["properties"][args.name_property]},
+            "geometry": {"type": "MultiPolygon", "coordinates": simplified},
+        }))
+    Path(args.output).write_text('{"type": "FeatureCollection", "features": [\n' + ",\n".join(features) + "\n]}\n")
+
+
+if __name__ == "__main__":
+    main()
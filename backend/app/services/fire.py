@@ -3,62 +3,109 @@ Fire danger service.
 Fetches fire danger data from two sources:
 - BOM XML feed: fire danger ratings and FBI index per district
 - CFA RSS feed: Total Fire Ban status per district
-No external dependencies — uses Python stdlib only.
+Feeds are fetched asynchronously over the shared pooled clients in
+app.services.http, cached after parsing and revalidated with conditional GETs.
+ElementTree is only imported when a feed is first parsed, which happens in
+the background prefetch rather than while the app boots.
+Parsed results are also put in the cross-worker shared cache, so with several
+worker processes one of them downloads and parses each feed per refresh
+interval and the rest pick up its result.
 """
+import asyncio
 import html
+import io
 import re
-import urllib.request
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
-from xml.etree import ElementTree as ET
+import time
+from datetime import date
 
 from app.models.weather import FireDangerDay
+from app.services.http import upstream_get
+from app.services.metrics import metrics, timed
+from app.services.shared_cache import MISSING, shared_cache
+from app.services.singleflight import SingleFlight
 
 BOM_FEED_URL = "https://www.bom.gov.au/fwo/IDV18555.xml"
 CFA_FEED_URL = "https://www.cfa.vic.gov.au/cfa/rssfeed/tfbfdrforecast_rss.xml"
 
 
-def parse_bom_xml(xml_data) -> dict:
+WEEKDAY_LETTERS = "MTWTFSS"
+
+
+def parse_bom_xml(xml_data, districts=None) -> dict:
     """
-    Parse BOM fire danger XML feed.
+    Parse BOM fire danger XML feed incrementally with iterparse.
+    Accepts bytes, str or a binary file-like object.
+    If `districts` is given, only those fire districts are built and parsing
+    stops as soon as all of them have been seen.
     Returns dict mapping district name to list of FireDangerDay (4 days).
     Returns {} on parse error.
     """
+    from xml.etree import ElementTree as ET
+
+    if isinstance(xml_data, str):
+        xml_data = xml_data.encode('utf-8')
+    source = io.BytesIO(xml_data) if isinstance(xml_data, bytes) else xml_data
+    wanted = set(districts) if districts is not None else None
+    if wanted is not None and not wanted:
+        return {}
+    result = {}
+    district = None  # set while inside a fire-district area we want
+    periods = []
     try:
-        if isinstance(xml_data, bytes):
-            xml_data = xml_data.decode('utf-8')
-        root = ET.fromstring(xml_data)
-        result = {}
-        for area in root.findall('./forecast/area[@type="fire-district"]'):
-            district = area.get('description')
-            if not district:
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == 'area':
+                    district = elem.get('description')
+                    if (elem.get('type') != 'fire-district' or not district
+                            or (wanted is not None and district not in wanted)):
+                        district = None
                 continue
-            days = []
-            for period in sorted(area.findall('forecast-period'),
-                                 key=lambda p: int(p.get('index', 99)))[:4]:
-                start = period.get('start-time-local', '')
-                try:
-                    day_letter = datetime.strptime(start[:10], '%Y-%m-%d').strftime('%A')[0]
-                except ValueError:
-                    day_letter = '?'
-                fbi_el = period.find('element[@type="fire_behaviour_index"]')
-                fdr_el = period.find('text[@type="fire_danger"]')
-                index = int(fbi_el.text) if fbi_el is not None and fbi_el.text else None
-                rating = fdr_el.text.strip() if fdr_el is not None and fdr_el.text else 'Unknown'
-                days.append(FireDangerDay(day=day_letter, rating=rating, index=index))
-            if days:
-                result[district] = days
+            if tag == 'forecast-period':
+                if district is not None:
+                    periods.append((int(elem.get('index', 99)), _fire_danger_day(elem)))
+                elem.clear()
+            elif tag == 'area':
+                if district is not None and periods:
+                    periods.sort(key=lambda p: p[0])
+                    result[district] = [day for _, day in periods[:4]]
+                district = None
+                periods = []
+                elem.clear()
+                if wanted is not None and wanted <= result.keys():
+                    break
         return result
     except ET.ParseError:
         return {}
 
 
-def parse_cfa_tfb(xml_data) -> dict:
+def _fire_danger_day(period) -> FireDangerDay:
+    """Build a FireDangerDay from one complete <forecast-period> element."""
+    try:
+        day_letter = WEEKDAY_LETTERS[date.fromisoformat(period.get('start-time-local', '')[:10]).weekday()]
+    except ValueError:
+        day_letter = '?'
+    fbi_el = fdr_el = None
+    for child in period:
+        kind = child.get('type')
+        if fbi_el is None and kind == 'fire_behaviour_index' and child.tag == 'element':
+            fbi_el = child
+        elif fdr_el is None and kind == 'fire_danger' and child.tag == 'text':
+            fdr_el = child
+    index = int(fbi_el.text) if fbi_el is not None and fbi_el.text else None
+    rating = fdr_el.text.strip() if fdr_el is not None and fdr_el.text else 'Unknown'
+    return FireDangerDay(day=day_letter, rating=rating, index=index)
+
+
+def parse_cfa_tfb(xml_data, districts=None) -> dict:
     """
     Parse CFA RSS feed for Total Fire Ban status only.
+    If `districts` is given, only those districts are returned.
     Returns dict mapping district name to bool.
     Returns {} on parse error.
     """
+    from xml.etree import ElementTree as ET
+
     try:
         if isinstance(xml_data, str):
             xml_data = xml_data.encode('utf-8')
@@ -79,7 +126,8 @@ def parse_cfa_tfb(xml_data) -> dict:
             return {}
         result = {}
         for district, value in _parse_district_lines(paragraphs[fdr_idx - 1]).items():
-            result[district] = 'YES' in value and 'NO' not in value
+            if districts is None or district in districts:
+                result[district] = 'YES' in value and 'NO' not in value
         return result
     except ET.ParseError:
         return {}
@@ -105,45 +153,134 @@ def _title_case_rating(rating: str) -> str:
     return '-'.join(part.title() for part in rating.split('-'))
 
 
-def _fetch_url(url: str, timeout: int = 10) -> bytes:
-    """Fetch a URL and return the response bytes."""
-    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urllib.request.urlopen(req, timeout=timeout) as response:
-        return response.read()
-
-
-def fetch_fire_data() -> dict:
+class FireFeed:
     """
-    Fetch BOM and CFA feeds concurrently.
-    BOM feed provides fire danger ratings and FBI index per district.
-    CFA feed provides Total Fire Ban status per district.
-    Returns dict: { district: { total_fire_ban: bool, fire_danger: list|None } }
-    Each feed degrades independently on error.
+    One upstream fire feed with its parsed result cached in memory.
+    Within `refresh_interval` seconds the cached parse is returned without any
+    network I/O. After that the feed is revalidated with ETag / If-Modified-Since;
+    a 304 keeps the existing parse. Failures (network, HTTP error or unparseable
+    body) keep serving the last good parse and are retried after `retry_interval`.
+    Only `districts` (all when None) are parsed; the raw body is kept so a change
+    of districts is re-parsed locally without another download.
+    A parse another worker stored within `refresh_interval` is used instead of
+    revalidating; `decode` rebuilds it from its JSON form.
     """
-    bom_xml = None
-    cfa_xml = None
 
-    def fetch_bom():
-        return _fetch_url(BOM_FEED_URL)
+    def __init__(self, url: str, upstream: str, parse, refresh_interval: float = 900.0,
+                 retry_interval: float = 60.0, clock=time.monotonic, decode=None):
+        self.url = url
+        self.upstream = upstream
+        self.parse = parse
+        self.decode = decode or (lambda data: data)
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self._flight = SingleFlight()
+        self.reset()
 
-    def fetch_cfa():
-        return _fetch_url(CFA_FEED_URL)
+    def reset(self):
+        self.districts = None
+        self.content = None
+        self.data = {}
+        self.version = 0  # bumped whenever `data` is replaced
+        self.etag = None
+        self.last_modified = None
+        self.next_check = 0.0
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        bom_future = executor.submit(fetch_bom)
-        cfa_future = executor.submit(fetch_cfa)
-        try:
-            bom_xml = bom_future.result()
-        except Exception:
-            pass
+    def configure(self, refresh_interval: float = None, retry_interval: float = None):
+        if refresh_interval is not None:
+            self.refresh_interval = refresh_interval
+        if retry_interval is not None:
+            self.retry_interval = retry_interval
+
+    async def get(self, districts=None) -> dict:
+        districts = frozenset(districts) if districts is not None else None
+        if districts != self.districts:
+            self.districts = districts
+            if self.content is not None:
+                self._store(self.parse(self.content, districts))
+            else:
+                self.next_check = 0.0  # nothing to re-parse: fetch (or adopt) the new set now
+        if self.clock() >= self.next_check:
+            # Callers arriving while a revalidation is in flight wait for it
+            await self._flight.do(self.url, self._check)
+        else:
+            metrics.count_cache(f"fire-{self.upstream}", "hit")
+        return self.data
+
+    @property
+    def _shared_key(self):
+        return sorted(self.districts) if self.districts is not None else None
+
+    def _adopt_shared(self) -> bool:
+        """Use the parse another worker stored for these districts, if it is still current."""
+        found = shared_cache.get(f"fire-{self.upstream}", self._shared_key)
+        if found is None:
+            return False
+        age, data = found
+        self._store(self.decode(data))
+        # Our raw body and validators no longer match `data`: the next check is a full GET
+        self.content = self.etag = self.last_modified = None
+        self.next_check = self.clock() + self.refresh_interval - age
+        metrics.count_cache(f"fire-{self.upstream}", "shared")
+        return True
+
+    async def _check(self):
+        if self._adopt_shared():
+            return
         try:
-            cfa_xml = cfa_future.result()
+            adopted = await shared_cache.fetch_once(
+                f"fire-{self.upstream}", self._shared_key, self._revalidate,
+                lambda: self._adopt_shared() or MISSING)
+            if not adopted:
+                self.next_check = self.clock() + self.refresh_interval
         except Exception:
-            pass
+            self.next_check = self.clock() + self.retry_interval
+
+    async def _revalidate(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        response = await upstream_get(self.upstream, self.url, headers=headers)
+        if response.status_code == 304:
+            metrics.count_cache(f"fire-{self.upstream}", "not_modified")
+            self._share()
+            return
+        response.raise_for_status()
+        metrics.count_cache(f"fire-{self.upstream}", "miss")
+        with timed(f"parse-{self.upstream}"):
+            parsed = self.parse(response.content, self.districts)
+        if not parsed and self.districts != frozenset():
+            raise ValueError(f"No fire districts parsed from {self.url}")
+        self.content = response.content
+        self._store(parsed)
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self._share()
+
+    def _share(self):
+        shared_cache.put(f"fire-{self.upstream}", self._shared_key, self.data, self.refresh_interval)
+
+    def _store(self, parsed: dict):
+        self.data = parsed
+        self.version += 1
+
+
+def _decode_bom(data: dict) -> dict:
+    return {district: [FireDangerDay(**day) for day in days] for district, days in data.items()}
+
+
+bom_feed = FireFeed(BOM_FEED_URL, "bom", parse_bom_xml, decode=_decode_bom)
+cfa_feed = FireFeed(CFA_FEED_URL, "cfa", parse_cfa_tfb)
+FEEDS = {"bom": bom_feed, "cfa": cfa_feed}
+
+_merged = {"versions": None, "data": {}}
 
-    bom_data = parse_bom_xml(bom_xml) if bom_xml else {}
-    cfa_data = parse_cfa_tfb(cfa_xml) if cfa_xml else {}
 
+def merge_fire_data(bom_data: dict, cfa_data: dict) -> dict:
+    """Combine per-feed results into { district: { total_fire_ban, fire_danger } }."""
     all_districts = set(bom_data.keys()) | set(cfa_data.keys())
     result = {}
     for district in all_districts:
@@ -152,3 +289,30 @@ def fetch_fire_data() -> dict:
             "fire_danger": bom_data.get(district),
         }
     return result
+
+
+async def fetch_fire_data(districts=None) -> dict:
+    """
+    Return fire data from the BOM and CFA feeds, revalidating each concurrently
+    when its refresh interval has passed. Pass `districts` to limit parsing to
+    the fire districts actually displayed.
+    BOM feed provides fire danger ratings and FBI index per district.
+    CFA feed provides Total Fire Ban status per district.
+    Returns dict: { district: { total_fire_ban: bool, fire_danger: list|None } }
+    Each feed degrades independently on error, falling back to its last good data.
+    """
+    with timed("fire"):
+        bom_data, cfa_data = await asyncio.gather(bom_feed.get(districts), cfa_feed.get(districts))
+    versions = (bom_feed.version, cfa_feed.version)
+    if _merged["versions"] != versions:
+        _merged["data"] = merge_fire_data(bom_data, cfa_data)
+        _merged["versions"] = versions
+    return _merged["data"]
+
+
+def reset_fire_data():
+    """Forget cached feed state (used at startup and in tests)."""
+    for feed in FEEDS.values():
+        feed.reset()
+    _merged["versions"] = None
+    _merged["data"] = {}
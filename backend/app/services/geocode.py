@@ -0,0 +1,153 @@
+"""
+Geocoding service.
+Resolves a city name to coordinates via Open-Meteo's geocoding API, with a
+persistent cache in SQLite. City coordinates don't change, so hits are kept
+forever; "not found" answers are kept for NEGATIVE_TTL so unknown cities get a
+fast 404 without hammering the API. The whole table is loaded into memory at
+startup and shared by all requests. The table is also how worker processes
+share geocodes: a local miss is looked up in it before going upstream, and only
+one worker at a time resolves a given city (see app.services.shared_cache).
+Like the shared cache, it never waits for another worker's write lock on the
+event loop: a busy database is a miss, and a write it refuses stays in memory.
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+from app.services.http import upstream_get
+from app.services.metrics import metrics
+from app.services.shared_cache import MISSING, OPEN_TIMEOUT, is_busy, shared_cache
+from app.services.singleflight import SingleFlight
+
+GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / "geocode_cache.sqlite3"
+NEGATIVE_TTL = 86400.0
+
+
+def normalize_key(city: str, country: str) -> tuple[str, str]:
+    return " ".join(city.split()).casefold(), (country or "").strip().upper()
+
+
+class GeocodeCache:
+    """
+    In-memory map of (city, country) -> (name, lat, lon) or None, mirrored to SQLite.
+    Without open() (e.g. in unit tests) it is memory-only.
+    """
+
+    def __init__(self, negative_ttl: float = NEGATIVE_TTL, clock=time.time):
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._entries: dict[tuple[str, str], tuple] = {}  # key -> (result, cached_at)
+        self._db: sqlite3.Connection = None
+
+    def open(self, path=DEFAULT_CACHE_PATH):
+        self.close()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=OPEN_TIMEOUT)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " city TEXT NOT NULL, country TEXT NOT NULL,"
+            " name TEXT, latitude REAL, longitude REAL, cached_at REAL NOT NULL,"
+            " PRIMARY KEY (city, country))"
+        )
+        self._db.commit()
+        for city, country, name, lat, lon, cached_at in self._db.execute("SELECT * FROM geocode"):
+            result = (name, lat, lon) if name is not None else None
+            self._entries[(city, country)] = (result, cached_at)
+        self._db.execute("PRAGMA busy_timeout = 0")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, city: str, country: str):
+        """Return (hit, result) where result is (name, lat, lon) or None for a cached miss."""
+        key = normalize_key(city, country)
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry):
+            entry = self._load(key) or entry
+        if entry is None or self._expired(entry):
+            return False, None
+        return True, entry[0]
+
+    def _expired(self, entry) -> bool:
+        result, cached_at = entry
+        return result is None and self.clock() - cached_at >= self.negative_ttl
+
+    def _load(self, key: tuple[str, str]):
+        """Read one entry another worker process may have written since open()."""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT name, latitude, longitude, cached_at FROM geocode WHERE city = ? AND country = ?", key
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            return None
+        if row is None:
+            return None
+        name, lat, lon, cached_at = row
+        entry = self._entries[key] = ((name, lat, lon) if name is not None else None, cached_at)
+        return entry
+
+    def put(self, city: str, country: str, result):
+        key = normalize_key(city, country)
+        cached_at = self.clock()
+        self._entries[key] = (result, cached_at)
+        if self._db is not None:
+            name, lat, lon = result if result is not None else (None, None, None)
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, name, lat, lon, cached_at),
+                )
+                self._db.commit()
+            except sqlite3.OperationalError as e:
+                self._db.rollback()
+                if not is_busy(e):
+                    raise
+
+
+geocode_cache = GeocodeCache()
+geocode_flights = SingleFlight()
+
+
+async def geocode(city: str, country: str) -> tuple[str, float, float]:
+    """
+    Return (name, latitude, longitude) for a city.
+    Raises ValueError if the city is unknown (including a cached miss).
+    """
+    hit, result = geocode_cache.get(city, country)
+    metrics.count_cache("geocode", "hit" if hit else "miss")
+    if not hit:
+        key = normalize_key(city, country)
+
+        def read():
+            found, cached = geocode_cache.get(city, country)
+            return cached if found else MISSING
+
+        result = await geocode_flights.do(key, lambda: shared_cache.fetch_once(
+            "geocode", key, lambda: _lookup(city, country), read))
+    if result is None:
+        raise ValueError(f"Location not found: {city}, {country}")
+    return result
+
+
+async def _lookup(city: str, country: str):
+    geo = await upstream_get("geocoding", GEOCODE_URL, params={"name": city, "count": 1, "country": country})
+    geo.raise_for_status()
+    results = geo.json().get("results", [])
+    if results:
+        first = results[0]
+        result = (first["name"], first["latitude"], first["longitude"])
+    else:
+        result = None
+    geocode_cache.put(city, country, result)
+    return result
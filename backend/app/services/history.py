@@ -0,0 +1,207 @@
+"""
+Local time-series store for dashboard readings.
+Each series (one forecast location) is a fixed-capacity ring buffer in its own
+memory-mapped file, laid out column by column: a block of float64 timestamps,
+then one float64 block per reading in COLUMNS. Missing readings are NaN.
+Reads never loop over rows in Python: a time range is found by bisecting the
+timestamp column, returned as memoryview slices (at most two, where the ring
+wraps) and summarised with C-level builtins (min, max, math.fsum, filter).
+Without open() (e.g. in unit tests) series live in memory only.
+Appends to a file hold an exclusive flock on it while the row and header are
+written, so several processes never interleave their writes (the scheduler
+also lets only one worker per host record; see DashboardScheduler).
+"""
+import hashlib
+import math
+import mmap
+import re
+import struct
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+DEFAULT_HISTORY_PATH = Path(__file__).resolve().parents[2] / "history"
+
+COLUMNS = ("temperature", "humidity", "wind_speed", "fire_danger_index", "total_fire_ban")
+
+MAGIC = b"LDHIST01"
+HEADER = struct.Struct("<8sIIQQ")  # magic, column count, capacity, next write slot, stored count
+HEADER_SIZE = 64
+NAN = float("nan")
+
+
+def series_filename(key: str) -> str:
+    """A readable, collision-free file name for a series key."""
+    slug = re.sub(r"[^a-z0-9]+", "-", key.casefold()).strip("-")[:40]
+    return f"{slug}-{hashlib.sha1(key.encode()).hexdigest()[:10]}.ring"
+
+
+class Series:
+    """One ring buffer of (time, *COLUMNS) rows, backed by an mmap or a bytearray."""
+
+    def __init__(self, capacity: int, path: Path = None):
+        self.capacity = capacity
+        size = HEADER_SIZE + (1 + len(COLUMNS)) * capacity * 8
+        self._file = None
+        if path is None:
+            self._buffer = bytearray(size)
+            self._init_header()
+        else:
+            fresh = not path.exists() or path.stat().st_size != size
+            path.touch()
+            self._file = open(path, "r+b")
+            if fresh:
+                self._file.truncate(size)
+            self._buffer = mmap.mmap(self._file.fileno(), size)
+            magic, ncols, stored_capacity, _, _ = HEADER.unpack_from(self._buffer)
+            if fresh or magic != MAGIC or ncols != len(COLUMNS) or stored_capacity != capacity:
+                self._init_header()
+        view = memoryview(self._buffer)
+        block = capacity * 8
+        self.time = view[HEADER_SIZE:HEADER_SIZE + block].cast("d")
+        self.columns = {
+            name: view[HEADER_SIZE + (i + 1) * block:HEADER_SIZE + (i + 2) * block].cast("d")
+            for i, name in enumerate(COLUMNS)
+        }
+
+    def _init_header(self):
+        HEADER.pack_into(self._buffer, 0, MAGIC, len(COLUMNS), self.capacity, 0, 0)
+
+    @property
+    def head(self) -> int:
+        return HEADER.unpack_from(self._buffer)[3]
+
+    def __len__(self):
+        return HEADER.unpack_from(self._buffer)[4]
+
+    @contextmanager
+    def _locked(self):
+        if self._file is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def append(self, when: float, readings: dict):
+        with self._locked():
+            head, count = self.head, len(self)
+            if count and when < self.time[(head - 1) % self.capacity]:
+                return  # keep the timestamp column sorted; clocks stepping back just skip a row
+            self.time[head] = when
+            for name, column in self.columns.items():
+                value = readings.get(name)
+                column[head] = NAN if value is None else float(value)
+            HEADER.pack_into(self._buffer, 0, MAGIC, len(COLUMNS), self.capacity,
+                             (head + 1) % self.capacity, min(count + 1, self.capacity))
+
+    def segments(self, since: float = None, until: float = None) -> list[slice]:
+        """Physical slices, oldest first, of the rows with since <= time <= until."""
+        head, count = self.head, len(self)
+        if count < self.capacity:
+            spans = [(0, count)]
+        else:
+            spans = [(head, self.capacity), (0, head)]
+        result = []
+        for start, end in spans:
+            if since is not None:
+                start = bisect_left(self.time, since, start, end)
+            if until is not None:
+                end = bisect_right(self.time, until, start, end)
+            if start < end:
+                result.append(slice(start, end))
+        return result
+
+    def close(self):
+        self.time.release()
+        for column in self.columns.values():
+            column.release()
+        if self._file is not None:
+            self._buffer.close()
+            self._file.close()
+
+
+def summarize(values: list) -> dict:
+    """count/min/max/mean of the non-missing values."""
+    present = list(filter(math.isfinite, values))
+    if not present:
+        return {"count": 0, "min": None, "max": None, "mean": None}
+    return {"count": len(present), "min": min(present), "max": max(present),
+            "mean": math.fsum(present) / len(present)}
+
+
+class HistoryStore:
+    def __init__(self, capacity: int = 2048, retention: float = 7 * 86400, clock=time.time):
+        self.capacity = capacity
+        self.retention = retention
+        self.clock = clock
+        self._directory: Path = None
+        self._series: dict[str, Series] = {}
+
+    def configure(self, capacity: int = None, retention: float = None):
+        if capacity is not None and capacity != self.capacity:
+            self.capacity = capacity
+            self.close_series()
+        if retention is not None:
+            self.retention = retention
+
+    def open(self, directory=DEFAULT_HISTORY_PATH):
+        self.close()
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def close_series(self):
+        for series in self._series.values():
+            series.close()
+        self._series.clear()
+
+    def close(self):
+        self.close_series()
+        self._directory = None
+
+    def series(self, key: str, create: bool = False) -> Series:
+        series = self._series.get(key)
+        if series is None:
+            path = self._directory / series_filename(key) if self._directory else None
+            if not create and (path is None or not path.exists()):
+                return None
+            series = self._series[key] = Series(self.capacity, path)
+        return series
+
+    def record(self, key: str, readings: dict, when: float = None):
+        self.series(key, create=True).append(self.clock() if when is None else when, readings)
+
+    def query(self, key: str, since: float = None, until: float = None) -> dict:
+        """
+        Rows of `key` within [since, until], clamped to the retention window, as
+        {"time": [...], "series": {column: [...]}, "stats": {column: summary}}.
+        """
+        oldest = self.clock() - self.retention
+        since = oldest if since is None else max(since, oldest)
+        series = self.series(key)
+        segments = series.segments(since, until) if series is not None else []
+
+        def read(column) -> list:
+            values = []
+            for segment in segments:
+                values.extend(column[segment].tolist())
+            return values
+
+        columns = {name: read(column) for name, column in series.columns.items()} if series else \
+            {name: [] for name in COLUMNS}
+        return {
+            "time": read(series.time) if series else [],
+            "series": columns,
+            "stats": {name: summarize(values) for name, values in columns.items()},
+        }
+
+
+history_store = HistoryStore()
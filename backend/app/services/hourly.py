@@ -0,0 +1,119 @@
+"""
+Hourly forecast service.
+Requests hourly temperature, precipitation probability, wind and UV from
+Open-Meteo and summarises them per day and per part of day.
+Aggregation works on whole slices of the returned arrays: day and part-of-day
+boundaries are found by bisecting the (sorted ISO) timestamps, and each slice
+is reduced with C-level builtins (min, max, math.fsum, filter). The Python-level
+work is per day and part, never per hour, so a 16-day horizon costs little more
+than a 1-day one.
+"""
+import math
+from bisect import bisect_left
+from datetime import date, timedelta
+from functools import partial
+from operator import is_not
+
+from app.models.weather import DaySummary, HourlyForecastResponse, HourlySeries, PartOfDaySummary
+from app.services.cache import TTLCache
+from app.services.geocode import geocode
+from app.services.http import upstream_get
+from app.services.metrics import timed
+from app.services.resilience import within_deadline
+from app.services.shared_cache import shared_cache
+from app.services.singleflight import SingleFlight
+from app.services.weather import FORECAST_URL, forecast_point, grid_cell
+
+HOURLY_VARIABLES = "temperature_2m,precipitation_probability,wind_speed_10m,uv_index"
+MAX_DAYS = 16  # Open-Meteo's forecast horizon
+
+# (name, first hour, end hour) in local time
+PARTS_OF_DAY = (("night", 0, 6), ("morning", 6, 12), ("afternoon", 12, 18), ("evening", 18, 24))
+
+hourly_cache = TTLCache(ttl=900, stale_ttl=3600, max_size=256, name="hourly", shared=shared_cache)
+hourly_flights = SingleFlight()
+
+_present = partial(filter, partial(is_not, None))  # drop hours Open-Meteo has no value for
+
+
+def summarize_slice(hourly: dict, start: int, end: int) -> dict:
+    """ForecastSummary fields for hours [start, end)."""
+    temperature = list(_present(hourly["temperature_2m"][start:end]))
+    precipitation = list(_present(hourly["precipitation_probability"][start:end]))
+    wind = list(_present(hourly["wind_speed_10m"][start:end]))
+    uv = list(_present(hourly["uv_index"][start:end]))
+    return {
+        "temp_min": min(temperature, default=None),
+        "temp_max": max(temperature, default=None),
+        "temp_mean": round(math.fsum(temperature) / len(temperature), 1) if temperature else None,
+        "precipitation_probability_max": max(precipitation, default=None),
+        "wind_speed_max": max(wind, default=None),
+        "uv_index_max": max(uv, default=None),
+    }
+
+
+def aggregate_hourly(hourly: dict) -> list[DaySummary]:
+    """Group Open-Meteo's hourly arrays into per-day summaries with parts of the day."""
+    times = hourly["time"]
+    if not times:
+        return []
+    first, last = date.fromisoformat(times[0][:10]), date.fromisoformat(times[-1][:10])
+    days = []
+    for offset in range((last - first).days + 1):
+        current = first + timedelta(days=offset)
+        day = current.isoformat()
+        # ISO timestamps sort as strings, so boundaries hold across DST changes too
+        start = bisect_left(times, day)
+        end = bisect_left(times, (current + timedelta(days=1)).isoformat())
+        parts = []
+        for name, from_hour, to_hour in PARTS_OF_DAY:
+            part_start = bisect_left(times, f"{day}T{from_hour:02d}", start, end)
+            part_end = bisect_left(times, f"{day}T{to_hour:02d}", start, end) if to_hour < 24 else end
+            if part_start < part_end:
+                parts.append(PartOfDaySummary(part=name, **summarize_slice(hourly, part_start, part_end)))
+        days.append(DaySummary(date=day, day=current.strftime("%A")[0], parts=parts,
+                               **summarize_slice(hourly, start, end)))
+    return days
+
+
+async def fetch_hourly(lat: float, lon: float, days: int) -> dict:
+    response = await upstream_get("open-meteo", FORECAST_URL, params={
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": HOURLY_VARIABLES,
+        "forecast_days": days,
+        "timezone": "auto",
+    })
+    response.raise_for_status()
+    return response.json()["hourly"]
+
+
+async def get_hourly(city: str, country: str, days: int = 7) -> HourlyForecastResponse:
+    """
+    Hourly forecast for a city with daily and part-of-day summaries.
+    Raises ValueError if the city is unknown.
+    """
+    with timed("geocode"):
+        name, lat, lon = await geocode(city, country)
+    key = (*grid_cell(lat, lon), days)
+    point = forecast_point(lat, lon)
+    with timed("forecast"):
+        try:
+            hourly = await within_deadline(hourly_cache.get_or_fetch(
+                key, lambda: hourly_flights.do(key, lambda: fetch_hourly(*point, days))))
+        except Exception:
+            hourly = hourly_cache.peek(key)  # last good forecast, however old
+            if hourly is None:
+                raise
+    with timed("build"):
+        return HourlyForecastResponse(
+            location=name,
+            days=aggregate_hourly(hourly),
+            hourly=HourlySeries(
+                time=hourly["time"],
+                temperature=hourly["temperature_2m"],
+                precipitation_probability=hourly["precipitation_probability"],
+                wind_speed=hourly["wind_speed_10m"],
+                uv_index=hourly["uv_index"],
+            ),
+        )
@@ -0,0 +1,244 @@
+"""
+Shared HTTP clients for upstream APIs.
+One pooled client per upstream host, created at application startup and closed
+at shutdown (see the lifespan in main.py), so connections and TLS sessions are
+reused across requests instead of being re-established for every call.
+Clients share one TLS context per ALPN setting: loading the CA bundle is most
+of the cost of creating a client, so a new client (at startup, or a one-off
+one) doesn't pay it again.
+HTTP/2 is used where requested and the optional `h2` package is installed
+(`pip install httpx[http2]`); otherwise clients fall back to HTTP/1.1 keep-alive.
+Every call goes through the upstream's circuit breaker, is bounded by the
+current request deadline and, where `hedge_after` is set, hedged
+(see app/services/resilience.py). Upstreams with call limits take a token from
+their quota first, interactive calls ahead of background ones
+(see app/services/quota.py).
+"""
+import asyncio
+import functools
+import importlib.util
+import ssl
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.services.metrics import metrics
+from app.services.quota import PERIODS, Quota, QuotaExceeded
+from app.services.resilience import CircuitBreaker, DeadlineExceeded, hedged, remaining
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# BOM rejects requests without a browser-like User-Agent
+BROWSER_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Per-upstream defaults; override any key under `settings.upstreams.<name>` in config.yaml.
+# Besides the httpx pool options: `failure_threshold` / `reset_timeout` for the
+# circuit breaker, `hedge_after` (seconds, off when None) for hedged requests,
+# and `calls_per_minute` / `calls_per_hour` / `calls_per_day` for the call quota,
+# with `quota_reserve` (share kept for interactive calls), `quota_max_wait`
+# (seconds) and `quota` (name of another upstream whose quota this one shares).
+# The Open-Meteo limits are those of its free tier.
+UPSTREAMS = {
+    "open-meteo": {"http2": True, "max_connections": 20, "max_keepalive_connections": 10,
+                   "keepalive_expiry": 60.0, "timeout": 10.0, "hedge_after": None,
+                   "calls_per_minute": 600, "calls_per_hour": 5000, "calls_per_day": 10000},
+    "geocoding": {"http2": True, "max_connections": 5, "max_keepalive_connections": 2,
+                  "keepalive_expiry": 30.0, "timeout": 10.0, "quota": "open-meteo"},
+    "bom": {"http2": False, "max_connections": 2, "max_keepalive_connections": 1,
+            "keepalive_expiry": 60.0, "timeout": 10.0, "headers": BROWSER_HEADERS},
+    "cfa": {"http2": False, "max_connections": 2, "max_keepalive_connections": 1,
+            "keepalive_expiry": 60.0, "timeout": 10.0, "headers": BROWSER_HEADERS},
+}
+
+
+@functools.cache
+def tls_context(http2: bool) -> ssl.SSLContext:
+    # httpcore sets ALPN on the context it is given, so HTTP/2 and HTTP/1.1
+    # clients must not share one
+    return httpx.create_ssl_context()
+
+
+def client_options(options: dict) -> dict:
+    """Translate an upstream's settings into httpx client keyword arguments."""
+    http2 = options.get("http2", False) and HTTP2_AVAILABLE
+    return {
+        "http2": http2,
+        "verify": tls_context(http2),
+        "limits": httpx.Limits(
+            max_connections=options.get("max_connections"),
+            max_keepalive_connections=options.get("max_keepalive_connections"),
+            keepalive_expiry=options.get("keepalive_expiry"),
+        ),
+        "timeout": httpx.Timeout(options.get("timeout", 10.0)),
+        "headers": options.get("headers"),
+    }
+
+
+class ClientRegistry:
+    """
+    Holds one pooled async client per named upstream.
+    Before start() (e.g. in unit tests or scripts) upstream_client hands out
+    short-lived clients with the same options instead.
+    """
+
+    def __init__(self, upstreams: dict = None):
+        self.upstreams = {name: dict(options) for name, options in (upstreams or UPSTREAMS).items()}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._quotas: dict[str, Quota] = {}
+
+    def configure(self, overrides: dict = None):
+        for name, options in (overrides or {}).items():
+            self.upstreams.setdefault(name, {}).update(options)
+        self._breakers.clear()
+        self._quotas.clear()
+
+    def options(self, name: str) -> dict:
+        return client_options(self.upstreams.get(name, {}))
+
+    async def start(self, overrides: dict = None):
+        self.configure(overrides)
+        for name in self.upstreams:
+            self._clients[name] = httpx.AsyncClient(**self.options(name))
+            # ready before the first request, not built during it
+            self.breaker(name)
+            self.quota(name)
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def get(self, name: str):
+        return self._clients.get(name)
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            options = self.upstreams.get(name, {})
+            breaker = self._breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=options.get("failure_threshold", 5),
+                reset_timeout=options.get("reset_timeout", 30.0),
+            )
+        return breaker
+
+    def reset_breakers(self):
+        self._breakers.clear()
+
+    def quota(self, name: str) -> Quota:
+        """The call quota `name` draws from, or None if it has no call limits."""
+        group = self.upstreams.get(name, {}).get("quota", name)
+        quota = self._quotas.get(group)
+        if quota is None:
+            options = self.upstreams.get(group, {})
+            limits = {option: options[option] for option in PERIODS if options.get(option)}
+            if not limits:
+                return None
+            quota = self._quotas[group] = Quota(
+                group, limits,
+                reserve=options.get("quota_reserve", 0.2),
+                max_wait=options.get("quota_max_wait", 5.0),
+            )
+        return quota
+
+    def reset_quotas(self):
+        self._quotas.clear()
+
+    def quota_report(self) -> dict:
+        """Current use of every upstream quota, by quota name."""
+        quotas = {quota.name: quota for quota in filter(None, map(self.quota, self.upstreams))}
+        return {name: quota.report() for name, quota in quotas.items()}
+
+
+clients = ClientRegistry()
+
+
+@asynccontextmanager
+async def upstream_client(name: str):
+    """Yield the pooled async client for `name`, or a one-off client if not started."""
+    client = clients.get(name)
+    if client is not None:
+        yield client
+    else:
+        async with httpx.AsyncClient(**clients.options(name)) as client:
+            yield client
+
+
+async def upstream_get(name: str, url: str, cost: int = 1, **kwargs) -> httpx.Response:
+    """
+    GET `url` on the `name` upstream, recording its duration and status code.
+    The call, and a hedged retry of it, each take `cost` quota tokens.
+    Raises CircuitOpenError without any I/O while the upstream's breaker is open,
+    QuotaExceeded when its call quota has no room for the call (see quota.py)
+    and DeadlineExceeded when the request deadline runs out first.
+    """
+    options = clients.upstreams.get(name, {})
+    limit = options.get("timeout", 10.0)
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"No time left for {name}")
+    breaker = clients.breaker(name)
+    try:
+        breaker.check()
+    except Exception:
+        metrics.count_upstream_event(name, "circuit_open")
+        raise
+    quota = clients.quota(name)
+    if quota is not None:
+        try:
+            await quota.acquire(cost=cost)
+        except QuotaExceeded:
+            breaker.release()
+            metrics.count_upstream_event(name, "quota_exceeded")
+            raise
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        left = remaining()  # waiting for a token used some of it
+    timeout = limit if left is None else min(limit, left)
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls > 1 and quota is not None and not quota.try_acquire(cost):
+            raise QuotaExceeded(f"{name} quota is low, not hedging")
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with upstream_client(name) as client:
+                response = await asyncio.wait_for(client.get(url, **kwargs), timeout)
+            status = response.status_code
+            return response
+        finally:
+            metrics.observe_upstream(name, status, time.perf_counter() - start)
+
+    def on_hedge():
+        metrics.count_upstream_event(name, "hedged")
+
+    try:
+        response = await hedged(attempt, options.get("hedge_after"), on_hedge=on_hedge)
+    except asyncio.TimeoutError:
+        if timeout < limit:
+            # Our deadline ran out, not the upstream's own timeout: not its fault
+            breaker.release()
+            metrics.count_upstream_event(name, "deadline")
+            raise DeadlineExceeded(f"Request deadline exceeded waiting for {name}") from None
+        breaker.record_failure()
+        raise
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    if response.status_code == 429 and quota is not None:
+        quota.drain()  # the upstream counts differently from us: back off until the bucket refills
+        metrics.count_upstream_event(name, "throttled")
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
@@ -0,0 +1,162 @@
+"""
+Lightweight in-process instrumentation.
+Records per-stage durations, cache results and upstream status codes into
+histograms and counters served in Prometheus text format at /api/metrics.
+Stages timed while handling a request are also reported back to the client in
+a Server-Timing header by ServerTimingMiddleware.
+No external dependencies — counters are plain dicts, safe on a single event loop.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; spans cache hits (sub-millisecond) to slow upstream calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage -> total milliseconds for the request being handled, if any
+_request_timings: ContextVar[dict] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, list] = {}  # label value -> [bucket counts..., sum, count]
+
+    def observe(self, label_value: str, seconds: float):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect_left(self.buckets, seconds)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, int] = {}
+
+    def inc(self, *label_values):
+        self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def get(self, *label_values) -> int:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self._values.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, values))
+            lines.append(f"{self.name}{{{labels}}} {count}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = Histogram("dashboard_stage_duration_seconds",
+                                "Time spent in each stage of building responses.", "stage")
+        self.upstream_durations = Histogram("dashboard_upstream_duration_seconds",
+                                            "Upstream HTTP request duration.", "upstream")
+        self.requests = Histogram("dashboard_request_duration_seconds",
+                                  "Time to first response byte per endpoint.", "endpoint")
+        self.cache = Counter("dashboard_cache_requests_total",
+                             "Cache lookups by cache and result.", ("cache", "result"))
+        self.upstream_responses = Counter("dashboard_upstream_responses_total",
+                                          "Upstream responses by status code ('error' if none).",
+                                          ("upstream", "status"))
+        self.upstream_events = Counter("dashboard_upstream_events_total",
+                                       "Calls short-circuited by an open breaker, hedged or cut by the deadline.",
+                                       ("upstream", "event"))
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.stages.observe(stage, seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+    def count_cache(self, cache: str, result: str):
+        self.cache.inc(cache, result)
+
+    def observe_upstream(self, upstream: str, status, seconds: float):
+        self.upstream_responses.inc(upstream, str(status))
+        self.upstream_durations.observe(upstream, seconds)
+        self.observe_stage(f"upstream-{upstream}", seconds)
+
+    def count_upstream_event(self, upstream: str, event: str):
+        self.upstream_events.inc(upstream, event)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.stages, self.upstream_durations, self.cache,
+                       self.upstream_responses, self.upstream_events):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timed(stage: str):
+    """Time the enclosed block as `stage` (works in sync and async code alike)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe_stage(stage, time.perf_counter() - start)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware: collects the stages timed during each request and adds
+    them, plus the total, as a Server-Timing header; records per-endpoint latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                endpoint = scope.get("endpoint")
+                metrics.requests.observe(getattr(endpoint, "__name__", "unmatched"), elapsed)
+                entries = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+                entries.append(f"total;dur={elapsed * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
@@ -0,0 +1,155 @@
+"""
+Upstream call quotas.
+Each quota (one per upstream, or shared by upstreams on one provider's limits,
+e.g. Open-Meteo's forecast and geocoding APIs) holds a token bucket for every
+configured limit: calls per minute, per hour and per day. A bucket refills
+continuously at its limit per period, so it approximates a sliding window
+rather than the provider's calendar resets. Every upstream call takes its
+cost in tokens from each bucket: one, or as many as the provider counts it as
+(Open-Meteo counts every location of a batched forecast request).
+- Interactive calls (the default, e.g. /api/weather/{city}) wait for a token,
+  but only as long as the request deadline and `max_wait` allow.
+- Background calls (prefetch rounds, stale-while-revalidate refreshes) never
+  wait. They are deferred with QuotaExceeded while an interactive call is
+  waiting or once less than `reserve` of any bucket is left, so that headroom
+  stays with people looking at the dashboard; callers fall back to cached data.
+The priority of the current task is carried in a context variable, like the
+request deadline. Shared work (a single flight, a forecast batch) is
+interactive as long as any of its callers is. Quotas are per worker process:
+with several uvicorn workers, divide the provider's limits between them.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.services.resilience import from_callers, remaining
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# option name -> seconds in which that many calls are allowed
+PERIODS = {"calls_per_minute": 60.0, "calls_per_hour": 3600.0, "calls_per_day": 86400.0}
+
+_priority: ContextVar[str] = ContextVar("upstream_priority", default=None)  # None: not set here
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def current_priority() -> str:
+    own = _priority.get()
+    if own is not None:
+        return own
+    inherited = from_callers(current_priority)
+    return BACKGROUND if inherited and INTERACTIVE not in inherited else INTERACTIVE
+
+
+@contextmanager
+def priority(level: str):
+    """Run the enclosed work (and tasks it starts) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, period: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / period  # tokens per second
+        self.clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    @property
+    def tokens(self) -> float:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self._tokens
+
+    def wait_time(self, needed: float = 1.0) -> float:
+        """Seconds until `needed` tokens are available."""
+        return max(0.0, (needed - self.tokens) / self.rate)
+
+    def take(self, cost: float = 1.0):
+        self._tokens = self.tokens - cost
+
+    def drain(self):
+        """Empty the bucket, e.g. after the upstream answered 429 Too Many Requests."""
+        self._tokens = 0.0
+        self._updated = self.clock()
+
+
+class Quota:
+    def __init__(self, name: str, limits: dict[str, int], reserve: float = 0.2,
+                 max_wait: float = 5.0, clock=time.monotonic):
+        self.name = name
+        self.buckets = {option: TokenBucket(limit, PERIODS[option], clock)
+                        for option, limit in limits.items() if limit}
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.used = 0
+        self.deferred = 0
+
+    def _wait_time(self, cost: int = 1, reserve: float = 0.0) -> float:
+        return max((bucket.wait_time(cost + bucket.capacity * reserve) for bucket in self.buckets.values()),
+                   default=0.0)
+
+    def _take(self, cost: int = 1):
+        for bucket in self.buckets.values():
+            bucket.take(cost)
+        self.used += cost
+
+    def _check_cost(self, cost: int):
+        # No amount of waiting refills a bucket past its capacity
+        if any(cost > bucket.capacity for bucket in self.buckets.values()):
+            raise QuotaExceeded(f"{self.name} call of cost {cost} exceeds a limit of its quota")
+
+    def try_acquire(self, cost: int = 1) -> bool:
+        """Take `cost` tokens at background priority, without waiting."""
+        if self.waiting or self._wait_time(cost, self.reserve) > 0:
+            return False
+        self._take(cost)
+        return True
+
+    async def acquire(self, level: str = None, cost: int = 1):
+        """
+        Take `cost` tokens for one call at `level` (the current priority by default).
+        Raises QuotaExceeded if a background call has to be deferred, or if an
+        interactive one would have to wait past `max_wait` or the deadline.
+        """
+        self._check_cost(cost)
+        if (level or current_priority()) == BACKGROUND:
+            if not self.try_acquire(cost):
+                self.deferred += 1
+                raise QuotaExceeded(f"{self.name} quota is low, background call deferred")
+            return
+        while (wait := self._wait_time(cost)) > 0:
+            left = remaining()
+            limit = self.max_wait if left is None else min(self.max_wait, left)
+            if wait > limit:
+                raise QuotaExceeded(f"{self.name} quota exhausted, next call allowed in {wait:.0f}s")
+            self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+        self._take(cost)
+
+    def drain(self):
+        for bucket in self.buckets.values():
+            bucket.drain()
+
+    def report(self) -> dict:
+        return {
+            "limits": {option: {"limit": bucket.capacity, "remaining": int(bucket.tokens)}
+                       for option, bucket in self.buckets.items()},
+            "used": self.used,
+            "deferred": self.deferred,
+            "waiting": self.waiting,
+        }
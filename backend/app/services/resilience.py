@@ -0,0 +1,177 @@
+"""
+Upstream resilience primitives.
+- Deadlines: a total time budget for the current request, carried in a context
+  variable so every upstream call below it can see how much time is left.
+  Stages can claim a share of what remains with `budget()`.
+- Shared calls: work done once for several callers (a single flight, a
+  forecast batch) runs outside any one caller's context. It sees the loosest
+  of its callers' deadlines, and `from_callers()` lets other context variables
+  (the upstream call priority) be combined the same way, including callers
+  that join after the work started.
+- Circuit breakers: after `failure_threshold` consecutive failures an upstream
+  is skipped for `reset_timeout` seconds, then one trial call is let through.
+- Hedging: if a call hasn't answered after `hedge_after` seconds a second,
+  identical call is started and whichever succeeds first wins.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Awaitable, Callable
+
+_deadline: ContextVar[float] = ContextVar("deadline", default=None)
+_shared: ContextVar["SharedCall"] = ContextVar("shared_call", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class SharedCall:
+    """The callers of one piece of shared work, each as its context was when it joined."""
+
+    def __init__(self):
+        self.callers: list[Context] = []
+
+    def join(self):
+        """Add the current task as a caller."""
+        self.callers.append(copy_context())
+
+    def start(self, coro: Awaitable) -> asyncio.Task:
+        """Run `coro` as a task in a fresh context that only knows its callers."""
+        context = Context()
+        context.run(_shared.set, self)
+        return asyncio.get_running_loop().create_task(coro, context=context)
+
+
+def from_callers(get: Callable[[], object]) -> list:
+    """`get()` as seen by each caller of the shared call running now; empty outside one."""
+    shared = _shared.get()
+    return [] if shared is None else [context.run(get) for context in shared.callers]
+
+
+def current_deadline() -> float:
+    """The current deadline (monotonic), or None; shared work gets its callers' loosest."""
+    own = _deadline.get()
+    inherited = from_callers(current_deadline)
+    if not inherited or None in inherited:
+        return own
+    loosest = max(inherited)
+    return loosest if own is None else min(own, loosest)
+
+
+def remaining() -> float:
+    """Seconds left before the current deadline, or None if there is none."""
+    current = current_deadline()
+    return None if current is None else current - time.monotonic()
+
+
+async def within_deadline(awaitable):
+    """Await `awaitable`, giving up with DeadlineExceeded when the deadline passes."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, left))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Request deadline exceeded") from None
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Set a total budget for the enclosed work (never extends an outer deadline)."""
+    new = time.monotonic() + seconds
+    outer = current_deadline()
+    token = _deadline.set(new if outer is None else min(outer, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def budget(fraction: float):
+    """Give the enclosed stage `fraction` of the time remaining, if there is a deadline."""
+    left = remaining()
+    if left is None:
+        yield
+        return
+    with deadline(max(0.0, left) * fraction):
+        yield
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        if state == "half-open":
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self):
+        """Forget an unfinished trial call (cancelled, or cut short by our own deadline)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+
+
+async def hedged(call: Callable[[], Awaitable], hedge_after: float = None, on_hedge=None):
+    """
+    Await `call()`; if it takes longer than `hedge_after` seconds, race a second
+    `call()` against it and return the first success. Raises the last error if
+    both fail.
+    """
+    first = asyncio.ensure_future(call())
+    if hedge_after is None:
+        return await first
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return first.result()
+        if on_hedge is not None:
+            on_hedge()
+        pending.add(asyncio.ensure_future(call()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,180 @@
+"""
+Upstream cache shared by the worker processes on one host.
+With `uvicorn main:app --workers N` every worker has its own in-process caches
+and would fetch Open-Meteo, BOM and CFA on its own. This store sits behind
+those caches in one SQLite database in WAL mode (readers never block the
+writer), so a value fetched by one worker is read by the others without any
+network I/O. Entries are JSON with the time they were stored and when they
+expire. A short per-key lease makes sure only one worker fetches a key at a
+time; the others wait for its result instead of fetching it too.
+Every call runs on the event loop, so none may wait for a lock: once the
+database is set up, a statement that finds another worker writing fails at
+once (busy_timeout 0) and counts as a miss. A read finds nothing, a write is
+skipped, and a lease can't be taken, so the caller fetches upstream itself.
+Without open() (e.g. in unit tests) nothing is shared and fetch_once just fetches.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable
+
+DEFAULT_SHARED_CACHE_PATH = Path(__file__).resolve().parents[2] / "shared_cache.sqlite3"
+POLL_INTERVAL = 0.05
+OPEN_TIMEOUT = 5.0  # seconds open() may wait for other workers setting up the same file
+
+BUSY = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+MISSING = object()  # `read` result meaning "nothing usable yet" (None can be a cached value)
+
+
+def encode_key(key) -> str:
+    return json.dumps(key, separators=(",", ":"))
+
+
+def is_busy(error: sqlite3.OperationalError) -> bool:
+    """Whether `error` means another connection holds the lock, not that something is broken."""
+    return (getattr(error, "sqlite_errorcode", 0) & 0xFF) in BUSY
+
+
+def _encode_value(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class SharedCache:
+    def __init__(self, lease: float = 10.0, clock=time.time):
+        self.lease = lease
+        self.clock = clock
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._db: sqlite3.Connection = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def configure(self, lease: float = None):
+        if lease is not None:
+            self.lease = lease
+
+    def open(self, path=DEFAULT_SHARED_CACHE_PATH):
+        self.close()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=OPEN_TIMEOUT,
+                                   isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL,"
+            " owner TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        now = self.clock()
+        self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        self._db.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        self._db.execute("PRAGMA busy_timeout = 0")
+
+    def _execute(self, sql: str, params: tuple) -> sqlite3.Cursor:
+        """Run one statement; None if another worker holds the lock."""
+        try:
+            return self._db.execute(sql, params)
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            return None
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get(self, namespace: str, key):
+        """(age in seconds, value) of an unexpired entry, or None."""
+        if self._db is None:
+            return None
+        cursor = self._execute(
+            "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, encode_key(key), self.clock()),
+        )
+        row = cursor.fetchone() if cursor is not None else None
+        if row is None:
+            return None
+        value, stored_at = row
+        return max(0.0, self.clock() - stored_at), json.loads(value)
+
+    def put(self, namespace: str, key, value, ttl: float):
+        if self._db is None:
+            return
+        now = self.clock()
+        self._execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (namespace, encode_key(key), json.dumps(value, default=_encode_value), now, now + ttl),
+        )
+
+    def acquire(self, namespace: str, key, lease: float = None) -> bool:
+        """
+        Take (or extend) the lease on a key for `lease` seconds (default: the
+        configured lease) unless another worker holds it, or the database is
+        busy. Always granted when nothing is shared.
+        """
+        return self._acquire(namespace, key, lease) is True
+
+    def _acquire(self, namespace: str, key, lease: float = None):
+        """True if granted, False if another worker holds the lease, None if the database is busy."""
+        if self._db is None:
+            return True
+        now = self.clock()
+        cursor = self._execute(
+            "INSERT INTO leases VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE"
+            " SET owner = excluded.owner, expires_at = excluded.expires_at"
+            " WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+            (namespace, encode_key(key), self.owner, now + (lease or self.lease), now),
+        )
+        return None if cursor is None else cursor.rowcount == 1
+
+    def release(self, namespace: str, key):
+        if self._db is None:
+            return
+        # If busy, the lease runs out by itself
+        self._execute("DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?",
+                      (namespace, encode_key(key), self.owner))
+
+    async def fetch_once(self, namespace: str, key, fetch: Callable[[], Awaitable],
+                         read: Callable[[], object]):
+        """
+        Run `fetch()` if this worker gets the lease on `key`; while another worker
+        holds it, poll `read()` (which returns MISSING until a usable value has
+        been stored) and return its result instead. If the holder fails the lease
+        is taken over; if it hangs past the lease, or the database is busy,
+        fetch anyway.
+        Coroutines of one worker share its lease, so they still coalesce in
+        their own SingleFlight rather than waiting on each other here.
+        """
+        if self._db is None:
+            return await fetch()
+        give_up = self.clock() + self.lease
+        while not (granted := self._acquire(namespace, key)):
+            if granted is None or self.clock() >= give_up:
+                return await fetch()
+            await asyncio.sleep(POLL_INTERVAL)
+            value = read()
+            if value is not MISSING:
+                return value
+        try:
+            return await fetch()
+        finally:
+            self.release(namespace, key)
+
+
+shared_cache = SharedCache()
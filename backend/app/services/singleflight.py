@@ -0,0 +1,38 @@
+"""
+Single-flight request coalescing.
+Concurrent callers asking for the same key share one in-flight task and get its
+result or exception, so a burst of identical cache misses costs one upstream call.
+The task runs for all of its callers (see SharedCall in resilience.py): under
+the loosest of their deadlines and the most urgent of their priorities, not
+just those of whoever asked first.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from app.services.resilience import SharedCall
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[Hashable, tuple[asyncio.Future, SharedCall]] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        future, call = self._calls.get(key, (None, None))
+        if future is None:
+            call = SharedCall()
+            future = call.start(fn())
+            self._calls[key] = future, call
+            future.add_done_callback(lambda f: self._done(key, f))
+        call.join()
+        # A caller that gives up (e.g. hits its own deadline) must not cancel the
+        # shared call for everyone else
+        return await asyncio.shield(future)
+
+    def _done(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key, (None,))[0] is future:
+            del self._calls[key]
+        if not future.cancelled():
+            future.exception()  # mark retrieved even if every waiter went away
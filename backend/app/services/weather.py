@@ -1,13 +1,20 @@
-from datetime import datetime
-
-import httpx
+import asyncio
+from datetime import date
+from typing import Iterable
 
+from app.models.config import Location
 from app.models.weather import DayForecast, WeatherResponse
+from app.services.cache import TTLCache
+from app.services.geocode import geocode
+from app.services.http import upstream_get
+from app.services.metrics import timed
+from app.services.resilience import SharedCall, within_deadline
+from app.services.shared_cache import shared_cache
+from app.services.singleflight import SingleFlight
 
 # Open-Meteo — free, no API key required
 # Docs: https://open-meteo.com/en/docs
 FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
 
 WMO_DESCRIPTIONS = {
     0: "Clear sky",
@@ -21,6 +28,159 @@ WMO_DESCRIPTIONS = {
 }
 
 
+FORECAST_PARAMS = {
+    "current": "temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code",
+    "daily": "temperature_2m_max,temperature_2m_min,weather_code",
+    "forecast_days": 8,
+    "timezone": "auto",
+}
+
+# Concurrent forecast lookups arriving within BATCH_WINDOW seconds share one upstream call;
+# at most MAX_IN_FLIGHT such calls run at once (`settings.concurrency`)
+BATCH_WINDOW = 0.01
+MAX_BATCH_SIZE = 50
+MAX_IN_FLIGHT = 8
+
+
+async def fetch_forecasts(coords: list[tuple[float, float]]) -> list[dict]:
+    """
+    Fetch forecasts for several coordinates in a single Open-Meteo request.
+    Open-Meteo accepts comma-separated latitude/longitude lists and answers with
+    an array in the same order; a single coordinate yields a plain object.
+    Open-Meteo counts every coordinate as a call, and so does its quota.
+    """
+    response = await upstream_get("open-meteo", FORECAST_URL, cost=len(coords), params={
+        "latitude": ",".join(str(lat) for lat, _ in coords),
+        "longitude": ",".join(str(lon) for _, lon in coords),
+        **FORECAST_PARAMS,
+    })
+    response.raise_for_status()
+    data = response.json()
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(coords):
+        raise ValueError(f"Expected {len(coords)} forecasts from Open-Meteo, got {len(results)}")
+    return results
+
+
+class ForecastBatcher:
+    """
+    Collects forecast lookups made within a short window and sends them upstream
+    as one multi-coordinate request, then hands each caller its own result.
+    Duplicate coordinates within a batch are only requested once, and the
+    request is made for all of the batch's callers (their loosest deadline and
+    most urgent priority), whoever came first. Lookups join
+    a batch right away; only the upstream requests are limited to
+    `max_in_flight` at a time, so a render of any number of locations still
+    goes out in as few requests as MAX_BATCH_SIZE allows.
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW, max_size: int = MAX_BATCH_SIZE,
+                 max_in_flight: int = MAX_IN_FLIGHT):
+        self.window = window
+        self.max_size = max_size
+        self.max_in_flight = max_in_flight
+        self._semaphore: asyncio.Semaphore = None
+        self._semaphore_loop = None
+        self._pending: dict[tuple[float, float], list[asyncio.Future]] = {}
+        self._callers = SharedCall()
+        self._timer = None
+        self._tasks = set()
+
+    def configure(self, max_in_flight: int = None):
+        if max_in_flight is not None and max_in_flight != self.max_in_flight:
+            # Requests already running keep the old limit until they finish
+            self.max_in_flight = max_in_flight
+            self._semaphore = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Made on first use, in the running loop (each test has its own)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore, self._semaphore_loop = asyncio.Semaphore(self.max_in_flight), loop
+        return self._semaphore
+
+    async def fetch(self, lat: float, lon: float) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault((lat, lon), []).append(future)
+        self._callers.join()
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        callers, self._callers = self._callers, SharedCall()
+        if batch:
+            task = callers.start(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: dict):
+        coords = list(batch)
+        try:
+            async with self._limit():
+                results = await fetch_forecasts(coords)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for coord, data in zip(coords, results):
+            for future in batch[coord]:
+                if not future.done():
+                    future.set_result(data)
+
+
+forecast_batcher = ForecastBatcher()
+
+# Open-Meteo updates roughly every 15 minutes; tune under `settings.forecast_cache` in config.yaml
+forecast_cache = TTLCache(ttl=900, stale_ttl=3600, max_size=1024, name="forecast", shared=shared_cache)
+forecast_flights = SingleFlight()
+
+# Forecasts are cached per GRID_SIZE-degree cell, so every location in a cell
+# (any user's) shares one forecast. It is requested for a real location in the
+# cell rather than its centre, which can be out at sea, and Open-Meteo corrects
+# for the exact point's elevation: the first configured location in the cell,
+# or else the first one looked up there. 0.1° (~11 km) is about the resolution
+# of Open-Meteo's regional models; tune under `settings.forecast_cache.grid`.
+GRID_SIZE = 0.1
+_cell_points: dict[tuple[float, float], tuple[float, float]] = {}
+
+
+def configure_grid(size: float, locations: Iterable[Location] = ()):
+    """Set the cell size; each cell's forecast is requested for the first of `locations` in it."""
+    global GRID_SIZE
+    GRID_SIZE = size
+    _cell_points.clear()
+    for loc in locations:
+        if loc.latitude is not None:
+            forecast_point(loc.latitude, loc.longitude)
+
+
+def grid_cell(lat: float, lon: float) -> tuple[float, float]:
+    """The centre of the forecast grid cell of (lat, lon), which identifies the cell."""
+    return (
+        round(round(lat / GRID_SIZE) * GRID_SIZE, 6),
+        round(round(lon / GRID_SIZE) * GRID_SIZE, 6),
+    )
+
+
+def forecast_point(lat: float, lon: float) -> tuple[float, float]:
+    """Where the forecast of (lat, lon)'s cell is requested: the first location registered in it."""
+    return _cell_points.setdefault(grid_cell(lat, lon), (lat, lon))
+
+
+def forecast_cache_key(lat: float, lon: float) -> tuple:
+    return (*grid_cell(lat, lon), tuple(sorted(FORECAST_PARAMS.items())))
+
+
 async def get_weather(
     city: str,
     country: str,
@@ -31,35 +191,62 @@ async def get_weather(
     latitude: float = None,
     longitude: float = None,
     location_name: str = None,
+    refresh: bool = False,
+) -> WeatherResponse:
+    """
+    Build the weather card for one location.
+    With refresh=True the forecast is always fetched upstream and the cache
+    updated (used by the background prefetch); otherwise the cache is consulted.
+    If the forecast can't be fetched before the request deadline, the last
+    cached forecast is used instead.
+    """
+    # Step 1: resolve coordinates — use config values if provided, else geocode (cached on disk)
+    if latitude is not None and longitude is not None:
+        lat, lon = latitude, longitude
+        name = location_name or city
+    else:
+        with timed("geocode"):
+            geocoded, lat, lon = await geocode(city, country)
+        name = location_name or geocoded
+
+    # Step 2: fetch current weather + 8-day daily forecast for the grid cell —
+    # cached, and batched with concurrent lookups on a miss
+    with timed("forecast"):
+        point = forecast_point(lat, lon)
+        key = forecast_cache_key(lat, lon)
+        # Concurrent misses for the same cell share one upstream fetch
+        fetch = lambda: forecast_flights.do(key, lambda: forecast_batcher.fetch(*point))  # noqa: E731
+        try:
+            if refresh:
+                data = await within_deadline(forecast_cache.refresh(key, fetch))
+            else:
+                data = await within_deadline(forecast_cache.get_or_fetch(key, fetch))
+        except Exception:
+            # Upstream failing, circuit open or out of time: serve the last
+            # forecast we have, however old
+            data = forecast_cache.peek(key)
+            if data is None:
+                raise
+    with timed("build"):
+        return build_weather_response(
+            data, name, bom_url,
+            fire_district=fire_district,
+            show_fire_danger=show_fire_danger,
+            fire_data=fire_data,
+        )
+
+
+def build_weather_response(
+    data: dict,
+    name: str,
+    bom_url: str,
+    fire_district: str = None,
+    show_fire_danger: bool = False,
+    fire_data: dict = None,
 ) -> WeatherResponse:
-    async with httpx.AsyncClient() as client:
-        # Step 1: resolve coordinates — use config values if provided, else geocode
-        if latitude is not None and longitude is not None:
-            lat, lon = latitude, longitude
-            name = location_name or city
-        else:
-            geo = await client.get(GEOCODE_URL, params={"name": city, "count": 1, "country": country})
-            geo.raise_for_status()
-            results = geo.json().get("results", [])
-            if not results:
-                raise ValueError(f"Location not found: {city}, {country}")
-            result = results[0]
-            lat, lon = result["latitude"], result["longitude"]
-            name = result["name"]
-
-        # Step 2: fetch current weather + 8-day daily forecast in one call
-        weather = await client.get(FORECAST_URL, params={
-            "latitude": lat,
-            "longitude": lon,
-            "current": "temperature_2m,relative_humidity_2m,wind_speed_10m,weather_code",
-            "daily": "temperature_2m_max,temperature_2m_min,weather_code",
-            "forecast_days": 8,
-            "timezone": "auto",
-        })
-        weather.raise_for_status()
-        data = weather.json()
-        current = data["current"]
-        daily = data["daily"]
+    """Turn one Open-Meteo forecast object into a WeatherResponse."""
+    current = data["current"]
+    daily = data["daily"]
 
     # Today min/max from daily index 0
     temp_min = daily["temperature_2m_min"][0]
@@ -68,9 +255,9 @@ async def get_weather(
     # 7-day forecast from daily indices 1–7
     forecast_7day = []
     for i in range(1, 8):
-        date = datetime.strptime(daily["time"][i], "%Y-%m-%d")
+        day = date.fromisoformat(daily["time"][i])
         forecast_7day.append(DayForecast(
-            day=date.strftime("%A")[0],
+            day=day.strftime("%A")[0],
             temp_min=round(daily["temperature_2m_min"][i]),
             temp_max=round(daily["temperature_2m_max"][i]),
         ))
@@ -0,0 +1,29 @@
+"""
+Run the whole benchmark suite and write one JSON file per benchmark.
+
+Run from backend/:  python -m benchmarks [--out DIR] [--quick]
+"""
+import argparse
+from pathlib import Path
+
+from benchmarks import bench_api, bench_parsers, bench_startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run all benchmarks")
+    parser.add_argument("--out", default="bench_results", help="directory for JSON results")
+    parser.add_argument("--quick", action="store_true", help="fewer data points, for a smoke run")
+    args = parser.parse_args()
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    bench_parsers.main(["--json", str(out / "parsers.json")])
+    bench_startup.main(["--json", str(out / "startup.json")] + (["--runs", "2"] if args.quick else []))
+    api_args = ["--json", str(out / "api.json")]
+    if args.quick:
+        api_args += ["--locations", "3,10", "--concurrency", "1,8", "--requests", "50"]
+    bench_api.main(api_args)
+
+
+if __name__ == "__main__":
+    main()
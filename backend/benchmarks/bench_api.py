@@ -0,0 +1,215 @@
+"""
+Benchmark: end-to-end latency of GET /api/weather/ over loopback.
+Starts the upstream stand-ins and the real app in subprocesses, then drives the
+app with a closed-loop load generator for each combination of location count,
+client concurrency and mode:
+  snapshot   background prefetch on (the default configuration)
+  on-demand  prefetch off, forecast and fire caches on
+  cold       prefetch off, caches expire immediately — every request goes upstream
+Reports p50/p95/p99 latency, requests per second and upstream calls per request.
+
+Run from backend/:  python -m benchmarks.bench_api [--json results.json]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import yaml
+
+from benchmarks.recordings import VIC_FIRE_DISTRICTS
+from benchmarks.report import environment
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+MODES = {
+    "snapshot": {},
+    "on-demand": {"prefetch": {"enabled": False}},
+    "cold": {
+        "prefetch": {"enabled": False},
+        "forecast_cache": {"ttl": 0.001, "stale_ttl": 0},
+        "fire_feeds": {"bom": {"refresh_interval": 0.001}, "cfa": {"refresh_interval": 0.001}},
+    },
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_config(n_locations: int, mode: str, workdir: Path) -> Path:
+    """n distinct locations on a 0.1° grid across Victoria, cycling through fire districts."""
+    locations = []
+    for i in range(n_locations):
+        locations.append({
+            "name": f"Location {i}",
+            "city": f"Location {i}",
+            "country": "AU",
+            "latitude": round(-36.0 - (i // 20) * 0.1, 4),
+            "longitude": round(141.5 + (i % 20) * 0.2, 4),
+            "bom_url": "https://www.bom.gov.au/location/australia/victoria",
+            "fire_district": VIC_FIRE_DISTRICTS[i % len(VIC_FIRE_DISTRICTS)],
+            "show_fire_danger": i % 2 == 0,
+        })
+    settings = {
+        "geocode_cache_path": str(workdir / "geocode.sqlite3"),
+        "history": {"path": str(workdir / "history")},
+        "shared_cache": {"path": str(workdir / "shared.sqlite3")},
+        **MODES[mode],
+    }
+    path = workdir / f"config-{mode}-{n_locations}.yaml"
+    path.write_text(yaml.safe_dump({"locations": locations, "settings": settings}))
+    return path
+
+
+def wait_until_up(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(*args: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=BACKEND_DIR)
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p95_ms": round(q[94] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+    }
+
+
+async def drive(url: str, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed)
+
+
+def upstream_requests(standins: str) -> int:
+    return httpx.get(standins + "/_stats").json()["requests"]
+
+
+def warm_up(url: str, mode: str, timeout: float = 30.0):
+    """Prime caches; in snapshot mode wait for the first published snapshot (it carries an ETag)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = httpx.get(url, timeout=30.0)
+        if mode != "snapshot" or "etag" in response.headers:
+            return
+        time.sleep(0.1)
+    raise RuntimeError("no snapshot published during warm-up")
+
+
+def run(locations: list[int], concurrency: list[int], modes: list[str], requests: int,
+        latency: float, jitter: float) -> dict:
+    standins_port, app_port = free_port(), free_port()
+    standins = f"http://127.0.0.1:{standins_port}"
+    url = f"http://127.0.0.1:{app_port}/api/weather/"
+    results = []
+    standins_process = spawn("benchmarks.standins", "--port", str(standins_port),
+                             "--latency", str(latency), "--jitter", str(jitter))
+    try:
+        wait_until_up(standins + "/_stats")
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in modes:
+                for n in locations:
+                    config = make_config(n, mode, Path(tmp))
+                    app_process = spawn("benchmarks.serve", "--config", str(config),
+                                        "--upstream", standins, "--port", str(app_port))
+                    try:
+                        wait_until_up(f"http://127.0.0.1:{app_port}/api/health")
+                        warm_up(url, mode)
+                        for c in concurrency:
+                            before = upstream_requests(standins)
+                            stats = asyncio.run(drive(url, c, requests))
+                            calls = upstream_requests(standins) - before
+                            stats["upstream_calls_per_request"] = round(calls / stats["requests"], 3)
+                            results.append({"mode": mode, "locations": n, "concurrency": c, **stats})
+                    finally:
+                        stop(app_process)
+    finally:
+        stop(standins_process)
+    return {
+        "benchmark": "api",
+        "environment": environment(),
+        "upstream_latency_s": latency,
+        "upstream_jitter_s": jitter,
+        "results": results,
+    }
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end /api/weather/ benchmark")
+    parser.add_argument("--locations", type=int_list, default=[3, 10, 30])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated: " + ", ".join(MODES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per data point")
+    parser.add_argument("--latency", type=float, default=0.08, help="stand-in latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="stand-in jitter in seconds")
+    parser.add_argument("--json", metavar="PATH", help="also write machine-readable results here")
+    args = parser.parse_args(argv)
+    report = run(args.locations, args.concurrency, args.modes.split(","), args.requests,
+                 args.latency, args.jitter)
+    print(f"{'mode':10} {'locs':>5} {'conc':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'up/req':>7} {'err':>4}")
+    for r in report["results"]:
+        print(f"{r['mode']:10} {r['locations']:>5} {r['concurrency']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['upstream_calls_per_request']:>7.3f} {r['errors']:>4}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: CPU cost of parsing upstream payloads and building responses.
+- BOM fire danger XML: the previous ElementTree-based parser (kept here as the
+  reference) against the current iterparse parser, for every district and for
+  only the districts referenced by config.yaml
+- CFA Total Fire Ban RSS
+- get_weather post-processing (Open-Meteo JSON -> WeatherResponse)
+Inputs are the recordings in benchmarks/data.
+
+Run from backend/:  python -m benchmarks.bench_parsers [--json PATH]
+"""
+import argparse
+import json
+from pathlib import Path
+import timeit
+import tracemalloc
+from datetime import datetime
+from xml.etree import ElementTree as ET
+
+from app.models.weather import FireDangerDay
+from app.services.config import ConfigStore
+from app.services.fire import merge_fire_data, parse_bom_xml, parse_cfa_tfb
+from app.services.weather import build_weather_response
+from benchmarks import recordings
+from benchmarks.report import environment
+
+
+def parse_bom_xml_tree(xml_data) -> dict:
+    """The pre-iterparse implementation: decode, build the full tree, model every district."""
+    try:
+        if isinstance(xml_data, bytes):
+            xml_data = xml_data.decode('utf-8')
+        root = ET.fromstring(xml_data)
+        result = {}
+        for area in root.findall('./forecast/area[@type="fire-district"]'):
+            district = area.get('description')
+            if not district:
+                continue
+            days = []
+            for period in sorted(area.findall('forecast-period'),
+                                 key=lambda p: int(p.get('index', 99)))[:4]:
+                start = period.get('start-time-local', '')
+                try:
+                    day_letter = datetime.strptime(start[:10], '%Y-%m-%d').strftime('%A')[0]
+                except ValueError:
+                    day_letter = '?'
+                fbi_el = period.find('element[@type="fire_behaviour_index"]')
+                fdr_el = period.find('text[@type="fire_danger"]')
+                index = int(fbi_el.text) if fbi_el is not None and fbi_el.text else None
+                rating = fdr_el.text.strip() if fdr_el is not None and fdr_el.text else 'Unknown'
+                days.append(FireDangerDay(day=day_letter, rating=rating, index=index))
+            if days:
+                result[district] = days
+        return result
+    except ET.ParseError:
+        return {}
+
+
+def measure(fn, repeat: int, number: int) -> dict:
+    best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mean_us": round(best * 1e6, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def run(repeat: int = 5, number: int = 200) -> dict:
+    bom = recordings.load(recordings.BOM_FEED)
+    cfa = recordings.load(recordings.CFA_FEED)
+    forecast = json.loads(recordings.load(recordings.FORECAST))
+    districts = ConfigStore().load().fire_districts
+    assert parse_bom_xml(bom) == parse_bom_xml_tree(bom)
+    fire_data = merge_fire_data(parse_bom_xml(bom), parse_cfa_tfb(cfa))
+    cases = {
+        "bom_tree_all_districts": lambda: parse_bom_xml_tree(bom),
+        "bom_iterparse_all_districts": lambda: parse_bom_xml(bom),
+        "bom_iterparse_configured_districts": lambda: parse_bom_xml(bom, districts),
+        "cfa_tfb": lambda: parse_cfa_tfb(cfa),
+        "build_weather_response": lambda: build_weather_response(
+            forecast, "Castlemaine", "https://www.bom.gov.au/x",
+            fire_district="North Central", show_fire_danger=True, fire_data=fire_data,
+        ),
+    }
+    return {
+        "benchmark": "parsers",
+        "environment": environment(),
+        "configured_districts": sorted(districts),
+        "results": {name: measure(fn, repeat, number) for name, fn in cases.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parser and post-processing microbenchmarks")
+    parser.add_argument("--json", metavar="PATH", help="also write machine-readable results here")
+    args = parser.parse_args(argv)
+    report = run()
+    print(f"Configured districts: {report['configured_districts']}")
+    for name, result in report["results"].items():
+        print(f"  {name:36} {result['mean_us']:>9.1f} us/call  peak {result['peak_kib']:>7.1f} KiB")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
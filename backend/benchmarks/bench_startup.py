@@ -0,0 +1,110 @@
+"""
+Benchmark: cold-start cost of the backend.
+- Import time of `main` from `python -X importtime`: the total, the share spent
+  in the app's own modules and the slowest third-party imports
+- Boot to first byte: from spawning the real app (prefetch off, upstreams
+  pointed at a closed port) until GET /api/health answers
+The import budget enforced by tests/integration/test_startup.py is checked
+against the same numbers.
+
+Run from backend/:  python -m benchmarks.bench_startup [--json PATH] [--runs N]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_api import BACKEND_DIR, free_port, make_config, spawn, stop
+from benchmarks.report import environment
+
+
+def import_times() -> dict[str, tuple[int, int]]:
+    """module -> (self µs, cumulative µs) for one fresh `import main`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, module = line.split(":", 1)[1].split("|")
+        times[module.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def is_app_module(module: str) -> bool:
+    return module == "main" or module == "app" or module.startswith("app.")
+
+
+def profile_imports(runs: int) -> dict:
+    import_times()  # let the bytecode cache settle
+    samples = [import_times() for _ in range(runs)]
+    best = min(samples, key=lambda times: times["main"][1])
+    slowest = sorted(((module, own) for module, (own, _) in best.items() if not is_app_module(module)),
+                     key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "total_ms": round(statistics.median(s["main"][1] for s in samples) / 1000, 1),
+        "app_ms": round(statistics.median(
+            sum(own for module, (own, _) in s.items() if is_app_module(module)) for s in samples) / 1000, 1),
+        "slowest_third_party_ms": {module: round(own / 1000, 1) for module, own in slowest},
+    }
+
+
+def time_to_first_byte(workdir: Path) -> float:
+    port = free_port()
+    config = make_config(3, "on-demand", workdir)
+    started = time.perf_counter()
+    process = spawn("benchmarks.serve", "--config", str(config),
+                    "--upstream", f"http://127.0.0.1:{free_port()}", "--port", str(port))
+    try:
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1.0)
+                return time.perf_counter() - started
+            except httpx.TransportError:
+                if process.poll() is not None:
+                    raise RuntimeError("app exited during startup")
+                time.sleep(0.005)
+    finally:
+        stop(process)
+
+
+def run(runs: int = 5) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        boots = [time_to_first_byte(Path(tmp)) for _ in range(runs)]
+    return {
+        "benchmark": "startup",
+        "environment": environment(),
+        "imports": profile_imports(runs),
+        "first_byte_ms": {
+            "median": round(statistics.median(boots) * 1000, 1),
+            "min": round(min(boots) * 1000, 1),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time and boot-to-first-byte")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="also write machine-readable results here")
+    args = parser.parse_args(argv)
+    report = run(args.runs)
+    imports = report["imports"]
+    print(f"import main      {imports['total_ms']:>8.1f} ms (app modules {imports['app_ms']:.1f} ms)")
+    print(f"first byte       {report['first_byte_ms']['median']:>8.1f} ms median, "
+          f"{report['first_byte_ms']['min']:.1f} ms best")
+    print("slowest third-party imports (self time):")
+    for module, ms in imports["slowest_third_party_ms"].items():
+        print(f"  {module:40} {ms:>7.1f} ms")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Recorded upstream responses replayed by the benchmark stand-ins."""
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent / "data"
+
+FORECAST = "forecast.json"
+GEOCODE = "geocode.json"
+BOM_FEED = "IDV18555.xml"
+CFA_FEED = "tfbfdrforecast_rss.xml"
+
+VIC_FIRE_DISTRICTS = [
+    "Mallee", "Wimmera", "South West", "Northern Country", "North Central",
+    "Central", "North East", "West and South Gippsland", "East Gippsland",
+]
+
+
+def load(name: str) -> bytes:
+    return (DATA_DIR / name).read_bytes()
@@ -0,0 +1,42 @@
+"""
+Run the real FastAPI app against the local stand-ins.
+Upstream URLs are redirected to the stand-in server and config.yaml is replaced
+by the given file; everything else is the production code path.
+
+Run from backend/:  python -m benchmarks.serve --config /tmp/bench.yaml --upstream http://127.0.0.1:8901
+"""
+import argparse
+from pathlib import Path
+
+import uvicorn
+
+from benchmarks.standins import upstream_urls
+
+
+def redirect_upstreams(base: str):
+    from app.services import fire, geocode, weather
+
+    urls = upstream_urls(base)
+    weather.FORECAST_URL = urls["forecast"]
+    geocode.GEOCODE_URL = urls["geocode"]
+    fire.bom_feed.url = urls["bom"]
+    fire.cfa_feed.url = urls["cfa"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app against benchmark stand-ins")
+    parser.add_argument("--config", required=True, help="config.yaml to serve")
+    parser.add_argument("--upstream", required=True, help="base URL of benchmarks.standins")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    from app.services.config import config_store
+    config_store.path = Path(args.config)
+    redirect_upstreams(args.upstream)
+
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Local stand-ins for Open-Meteo (forecast + geocoding), BOM and CFA.
+Replays the recordings in benchmarks/data with a configurable per-request
+latency and jitter, so API benchmarks don't depend on (or load) the real services.
+All four upstreams share one server and are told apart by path.
+
+Run from backend/:  python -m benchmarks.standins --port 8901 --latency 0.08 --jitter 0.02
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from benchmarks import recordings
+
+FORECAST_PATH = "/v1/forecast"
+GEOCODE_PATH = "/v1/search"
+BOM_PATH = "/fwo/IDV18555.xml"
+CFA_PATH = "/cfa/rssfeed/tfbfdrforecast_rss.xml"
+
+
+def create_app(latency: float = 0.0, jitter: float = 0.0) -> Starlette:
+    forecast = json.loads(recordings.load(recordings.FORECAST))
+    geocode = recordings.load(recordings.GEOCODE)
+    stats = {"requests": 0}
+
+    async def delay():
+        stats["requests"] += 1
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    async def forecast_endpoint(request: Request):
+        await delay()
+        lats = request.query_params.get("latitude", "0").split(",")
+        lons = request.query_params.get("longitude", "0").split(",")
+        results = [dict(forecast, latitude=float(lat), longitude=float(lon)) for lat, lon in zip(lats, lons)]
+        body = results[0] if len(results) == 1 else results
+        return Response(json.dumps(body), media_type="application/json")
+
+    async def geocode_endpoint(request: Request):
+        await delay()
+        return Response(geocode, media_type="application/json")
+
+    def feed_endpoint(name: str, media_type: str):
+        body = recordings.load(name)
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+
+        async def endpoint(request: Request):
+            await delay()
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers={"ETag": etag})
+            return Response(body, media_type=media_type, headers={"ETag": etag})
+        return endpoint
+
+    async def stats_endpoint(request: Request):
+        return Response(json.dumps(stats), media_type="application/json")
+
+    return Starlette(routes=[
+        Route(FORECAST_PATH, forecast_endpoint),
+        Route(GEOCODE_PATH, geocode_endpoint),
+        Route(BOM_PATH, feed_endpoint(recordings.BOM_FEED, "application/xml")),
+        Route(CFA_PATH, feed_endpoint(recordings.CFA_FEED, "application/rss+xml")),
+        Route("/_stats", stats_endpoint),
+    ])
+
+
+def upstream_urls(base: str) -> dict:
+    """The URLs the app should use instead of the real upstreams."""
+    return {
+        "forecast": base + FORECAST_PATH,
+        "geocode": base + GEOCODE_PATH,
+        "bom": base + BOM_PATH,
+        "cfa": base + CFA_PATH,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local upstream stand-ins for benchmarks")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="± seconds of uniform jitter")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.jitter), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,75 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from app.routers import weather
+from app.routers import dashboard, weather
+from app.services.config import config_store
+from app.services.dashboard import scheduler
+from app.services.fire import FEEDS
+from app.services.geocode import DEFAULT_CACHE_PATH, geocode_cache
+from app.services.history import DEFAULT_HISTORY_PATH, history_store
+from app.services.http import clients
+from app.services.metrics import ServerTimingMiddleware, metrics
+from app.services.shared_cache import DEFAULT_SHARED_CACHE_PATH, shared_cache
+from app.services.weather import configure_grid, forecast_cache
 
-app = FastAPI(title="Life Dashboard API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Config is validated once here — a bad config.yaml fails startup, not a request
+    config = config_store.load()
+    settings = config.settings
+    # Pooled upstream clients live for the whole process, not per request
+    await clients.start(settings.upstreams)
+    geocode_path = settings.geocode_cache_path
+    geocode_cache.open(config_store.path.parent / geocode_path if geocode_path else DEFAULT_CACHE_PATH)
+    if settings.shared_cache.enabled:
+        # Opened per worker process, after uvicorn forks them
+        shared_cache.configure(lease=settings.shared_cache.lease)
+        shared_path = settings.shared_cache.path
+        shared_cache.open(config_store.path.parent / shared_path if shared_path else DEFAULT_SHARED_CACHE_PATH)
+    history_store.configure(capacity=settings.history.capacity, retention=settings.history.retention)
+    history_path = settings.history.path
+    history_store.open(config_store.path.parent / history_path if history_path else DEFAULT_HISTORY_PATH)
+    forecast_cache.configure(**settings.forecast_cache.model_dump(exclude={"grid"}))
+    configure_grid(settings.forecast_cache.grid, config.all_locations)
+
+    async def reconfigure_grid():
+        configure_grid(settings.forecast_cache.grid, config_store.get().all_locations)
+
+    # Forecasts of edited cells are requested for their (new) configured locations
+    config_store.add_listener(reconfigure_grid)
+    for name, options in settings.fire_feeds.items():
+        FEEDS[name].configure(**options.model_dump())
+    if settings.prefetch.enabled:
+        await scheduler.start(
+            config_store.get,
+            forecast_interval=settings.prefetch.forecast_interval,
+            fire_interval=settings.prefetch.fire_interval,
+            jitter=settings.prefetch.jitter,
+        )
+        # Edited locations show up without waiting for the next refresh round
+        config_store.add_listener(lambda: scheduler.refresh(refresh_forecasts=False))
+    config_store.start_watching()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await config_store.stop_watching()
+        await clients.aclose()
+        geocode_cache.close()
+        shared_cache.close()
+        history_store.close()
+
+
+app = FastAPI(title="Life Dashboard API", lifespan=lifespan)
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(weather.router, prefix="/api/weather", tags=["weather"])
+app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
 
 
 @app.get("/api/health")
@@ -15,6 +77,21 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # On the event loop, which updates the metrics, rather than a worker thread
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/quota")
+async def upstream_quota():
+    """
+    Calls left in each upstream quota, calls made and background calls deferred.
+    Async so it reads the quotas on the event loop that updates them, not a worker thread.
+    """
+    return clients.quota_report()
+
+
 # Serve built Vue frontend — must be mounted after all API routes
 frontend_dist = Path(__file__).parent.parent / "frontend" / "dist"
 if frontend_dist.exists():
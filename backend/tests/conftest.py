@@ -0,0 +1,51 @@
+import pytest
+
+from app.services.cards import cards
+from app.services.fire import reset_fire_data
+from app.services.geocode import geocode_cache
+from app.services.history import history_store
+from app.services.hourly import hourly_cache
+from app.services.http import clients
+from app.services.shared_cache import shared_cache
+from app.services.weather import configure_grid, forecast_cache
+
+
+class FakeClock:
+    """A clock for caches, breakers, quotas and leases that only moves when a test advances `now`."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_clock():
+    return FakeClock()
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Module-level caches, breakers, quotas, history, the shared cache and grid must not leak between tests."""
+    forecast_cache.clear()
+    hourly_cache.clear()
+    geocode_cache.clear()
+    reset_fire_data()
+    clients.reset_breakers()
+    clients.reset_quotas()
+    history_store.close()
+    shared_cache.close()
+    cards.clear()
+    configure_grid(0.1)
+    yield
+    forecast_cache.clear()
+    hourly_cache.clear()
+    geocode_cache.clear()
+    reset_fire_data()
+    clients.reset_breakers()
+    clients.reset_quotas()
+    history_store.close()
+    shared_cache.close()
+    cards.clear()
+    configure_grid(0.1)
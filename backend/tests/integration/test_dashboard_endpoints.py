@@ -0,0 +1,53 @@
+"""
+Integration tests for GET /api/dashboard.
+Tests the API layer using FastAPI's TestClient — real routing and card
+registry, mocked weather and fire services.
+"""
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from main import app
+from app.models.config import DashboardConfig
+from app.models.weather import FireDangerDay
+from app.services.dashboard import make_snapshot
+from tests.integration.test_weather_endpoints import LOCATIONS, MOCK_RESPONSES
+
+client = TestClient(app)
+
+FIRE_DATA = {"Central": {"total_fire_ban": False, "fire_danger": [FireDangerDay(day="M", rating="High", index=30)]}}
+
+
+def test_dashboard_returns_every_card_with_status():
+    config = DashboardConfig(locations=LOCATIONS)
+    with patch("app.routers.dashboard.config_store.get", return_value=config), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value=FIRE_DATA) as fire, \
+         patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
+        mock_get.side_effect = MOCK_RESPONSES
+        response = client.get("/api/dashboard/")
+    assert response.status_code == 200
+    cards = response.json()["cards"]
+    assert list(cards) == ["fire", "weather"]
+    assert cards["fire"]["status"] == "ok"
+    assert cards["fire"]["data"]["Central"]["fire_danger"][0]["rating"] == "High"
+    assert cards["weather"]["status"] == "ok"
+    assert [w["location"] for w in cards["weather"]["data"]] == ["Castlemaine", "Melbourne", "Sorrento"]
+    # The weather card reuses the fire card's data instead of fetching it again
+    assert fire.await_count == 1
+    assert mock_get.await_args.kwargs["fire_data"] == FIRE_DATA
+
+
+def test_dashboard_serves_user_snapshot_and_reports_failed_card():
+    config = DashboardConfig(locations=LOCATIONS, users={"alice": LOCATIONS[:1]})
+    with patch("app.routers.dashboard.config_store.get", return_value=config), \
+         patch.dict("app.services.dashboard.scheduler.user_snapshots", {"alice": make_snapshot(1, MOCK_RESPONSES[:1])}), \
+         patch("app.services.dashboard.fetch_fire_data", side_effect=RuntimeError("BOM down")):
+        cards = client.get("/api/dashboard/", params={"user": "alice"}).json()["cards"]
+    assert cards["fire"] == {"status": "error", "updated_at": None, "error": "BOM down", "data": None}
+    assert [w["location"] for w in cards["weather"]["data"]] == ["Castlemaine"]
+
+
+def test_dashboard_unknown_user_is_404():
+    config = DashboardConfig(locations=LOCATIONS, users={"alice": LOCATIONS[:1]})
+    with patch("app.routers.dashboard.config_store.get", return_value=config):
+        assert client.get("/api/dashboard/", params={"user": "carol"}).status_code == 404
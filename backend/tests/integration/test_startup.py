@@ -0,0 +1,60 @@
+"""
+Import-time budget for the app.
+Runs `python -X importtime` in fresh interpreters, so every module import counts
+as it would on a cold start. Budgets are relative, so they hold on slow machines
+too: `import main` is measured against importing the framework and clients it
+is built on, in the same environment, and the app's own modules against the
+whole import. `python -m benchmarks.bench_startup` (bytecode cached) measures
+about 650 ms in total, most of it FastAPI and pydantic, 1.2-1.4x the baseline,
+and 60 ms (under 10%) in main and app.*.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# What any app on this stack imports before its own code runs
+BASELINE_IMPORT = "import fastapi, fastapi.staticfiles, httpx, yaml"
+IMPORT_BUDGET = 2.0  # x the baseline
+APP_IMPORT_SHARE = 0.25  # of the whole import
+
+# Only needed once the app is running, never to boot it
+DEFERRED_MODULES = ("xml.etree.ElementTree",)
+
+
+def import_times(code: str = "import main") -> dict[str, tuple[int, int]]:
+    """module -> (self µs, cumulative µs)"""
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            own, cumulative, module = line.split(":", 1)[1].split("|")
+            times[module.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def total_time(times: dict) -> int:
+    return sum(own for own, _ in times.values())
+
+
+def app_time(times: dict) -> int:
+    return sum(own for module, (own, _) in times.items()
+               if module in ("main", "app") or module.startswith("app."))
+
+
+def test_startup_defers_modules_only_needed_at_runtime():
+    times = import_times()
+    for module in DEFERRED_MODULES:
+        assert module not in times, f"{module} is imported at startup"
+
+
+def test_import_main_stays_within_budget():
+    import_times()  # write bytecode caches first, as a deployed build has them
+    runs = [import_times() for _ in range(3)]
+    baseline = min(total_time(import_times(BASELINE_IMPORT)) for _ in range(3))
+    assert min(total_time(times) for times in runs) < IMPORT_BUDGET * baseline
+    assert min(app_time(times) / total_time(times) for times in runs) < APP_IMPORT_SHARE
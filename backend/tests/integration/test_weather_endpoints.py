@@ -2,12 +2,20 @@
 Integration tests for weather endpoints.
 Tests the API layer using FastAPI's TestClient — real HTTP routing, mocked services.
 """
+import asyncio
+import json
+import time
+
 import pytest
 from unittest.mock import AsyncMock, patch
 from fastapi.testclient import TestClient
 
 from main import app
+from app.models.config import DashboardConfig
 from app.models.weather import DayForecast, WeatherResponse
+from app.services.dashboard import DashboardScheduler, make_snapshot
+from app.services.quota import QuotaExceeded
+from app.routers.weather import live_events
 
 client = TestClient(app)
 
@@ -43,9 +51,14 @@ MOCK_RESPONSES = [
     make_weather("Sorrento", "https://www.bom.gov.au/location/australia/victoria/central/o2607452563-sorrento"),
 ]
 
+LOCATIONS = [
+    {"name": r.location, "city": r.location, "country": "AU", "bom_url": r.bom_today_url[:-len("#today")]}
+    for r in MOCK_RESPONSES
+]
+
 
 def test_weather_all_locations_returns_three():
-    with patch("app.routers.weather.get_weather", new_callable=AsyncMock) as mock_get:
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
         mock_get.side_effect = MOCK_RESPONSES
         response = client.get("/api/weather/")
     assert response.status_code == 200
@@ -54,7 +67,7 @@ def test_weather_all_locations_returns_three():
 
 
 def test_weather_all_locations_names():
-    with patch("app.routers.weather.get_weather", new_callable=AsyncMock) as mock_get:
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
         mock_get.side_effect = MOCK_RESPONSES
         response = client.get("/api/weather/")
     names = [item["location"] for item in response.json()]
@@ -64,7 +77,7 @@ def test_weather_all_locations_names():
 
 
 def test_weather_response_has_new_fields():
-    with patch("app.routers.weather.get_weather", new_callable=AsyncMock) as mock_get:
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
         mock_get.side_effect = MOCK_RESPONSES
         response = client.get("/api/weather/")
     item = response.json()[0]
@@ -76,7 +89,7 @@ def test_weather_response_has_new_fields():
 
 
 def test_weather_forecast_7day_has_seven_entries():
-    with patch("app.routers.weather.get_weather", new_callable=AsyncMock) as mock_get:
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
         mock_get.side_effect = MOCK_RESPONSES
         response = client.get("/api/weather/")
     forecast = response.json()[0]["forecast_7day"]
@@ -84,9 +97,287 @@ def test_weather_forecast_7day_has_seven_entries():
 
 
 def test_weather_bom_urls_have_correct_anchors():
-    with patch("app.routers.weather.get_weather", new_callable=AsyncMock) as mock_get:
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
         mock_get.side_effect = MOCK_RESPONSES
         response = client.get("/api/weather/")
     item = response.json()[0]
     assert item["bom_today_url"].endswith("#today")
     assert item["bom_7day_url"].endswith("#7-days")
+
+
+def test_weather_all_locations_failure_degrades_single_card():
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
+        mock_get.side_effect = [MOCK_RESPONSES[0], Exception("Open-Meteo down"), MOCK_RESPONSES[2]]
+        response = client.get("/api/weather/")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 3
+    assert data[0]["error"] is None
+    assert data[1]["location"] == "Melbourne"
+    assert data[1]["error"] == "Open-Meteo down"
+    assert data[1]["temperature"] is None
+    assert data[1]["bom_today_url"].endswith("#today")
+    assert data[2]["location"] == "Sorrento"
+
+
+def test_weather_all_locations_slow_location_times_out():
+    async def slow_then_fast(city, *args, **kwargs):
+        if city == "Melbourne":
+            await asyncio.sleep(1)
+        return next(r for r in MOCK_RESPONSES if r.location == city)
+
+    config = DashboardConfig(locations=LOCATIONS, settings={"location_timeout": 0.05})
+    with patch("app.routers.weather.config_store.get", return_value=config), \
+         patch("app.services.dashboard.get_weather", side_effect=slow_then_fast):
+        response = client.get("/api/weather/")
+    data = response.json()
+    assert response.status_code == 200
+    assert data[0]["error"] is None
+    assert data[1]["error"].startswith("Timed out")
+    assert data[2]["error"] is None
+
+
+def test_weather_all_locations_served_from_snapshot():
+    snapshot = make_snapshot(1, MOCK_RESPONSES)
+    with patch("app.routers.weather.scheduler.snapshot", snapshot), \
+         patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
+        response = client.get("/api/weather/")
+    assert response.status_code == 200
+    assert [item["location"] for item in response.json()] == ["Castlemaine", "Melbourne", "Sorrento"]
+    mock_get.assert_not_called()
+
+
+def test_weather_snapshot_has_etag_and_answers_304():
+    snapshot = make_snapshot(1, MOCK_RESPONSES)
+    with patch("app.routers.weather.scheduler.snapshot", snapshot):
+        first = client.get("/api/weather/", headers={"Accept-Encoding": "identity"})
+        second = client.get("/api/weather/", headers={"If-None-Match": first.headers["ETag"]})
+    assert first.status_code == 200
+    assert first.headers["ETag"] == snapshot.etag
+    assert second.status_code == 304
+    assert second.content == b""
+
+
+def test_weather_snapshot_served_gzipped_when_accepted():
+    snapshot = make_snapshot(1, MOCK_RESPONSES)
+    with patch("app.routers.weather.scheduler.snapshot", snapshot):
+        response = client.get("/api/weather/", headers={"Accept-Encoding": "gzip"})
+        revalidated = client.get("/api/weather/", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"].endswith('-gz"')
+    assert len(response.json()) == 3
+    assert revalidated.status_code == 304
+
+
+def test_weather_snapshot_etag_changes_with_data():
+    changed = [MOCK_RESPONSES[0].model_copy(update={"temperature": 30.0}), *MOCK_RESPONSES[1:]]
+    assert make_snapshot(1, MOCK_RESPONSES).etag != make_snapshot(2, changed).etag
+    assert make_snapshot(1, MOCK_RESPONSES).etag == make_snapshot(2, MOCK_RESPONSES).etag
+
+
+def test_weather_single_location_unknown_city_is_404():
+    with patch("app.services.geocode.geocode_cache.get", return_value=(True, None)):
+        response = client.get("/api/weather/Nowhereville")
+    assert response.status_code == 404
+    assert "Location not found" in response.json()["detail"]
+
+
+def test_weather_response_has_server_timing():
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get, \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        mock_get.side_effect = MOCK_RESPONSES
+        response = client.get("/api/weather/")
+    timing = response.headers["Server-Timing"]
+    assert "serialize;dur=" in timing
+    assert "total;dur=" in timing
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    with patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get, \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        mock_get.side_effect = MOCK_RESPONSES
+        client.get("/api/weather/")
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE dashboard_request_duration_seconds histogram" in response.text
+    assert 'dashboard_request_duration_seconds_count{endpoint="all_locations"}' in response.text
+
+
+def test_quota_endpoint_reports_upstream_budgets():
+    response = client.get("/api/quota")
+    assert response.status_code == 200
+    open_meteo = response.json()["open-meteo"]
+    assert open_meteo["limits"]["calls_per_minute"]["limit"] == 600
+    assert set(open_meteo) == {"limits", "used", "deferred", "waiting"}
+
+
+def test_single_location_without_quota_is_unavailable():
+    with patch("app.routers.weather.get_weather", new_callable=AsyncMock,
+               side_effect=QuotaExceeded("open-meteo quota exhausted")):
+        response = client.get("/api/weather/Sydney")
+    assert response.status_code == 503
+
+
+def test_weather_stream_needs_the_scheduler():
+    response = client.get("/api/weather/stream")
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_weather_stream_sends_full_state_then_changes():
+    temperatures = iter([18.0, 18.0, 18.0, 18.0, 25.0, 18.0])
+
+    async def changing_weather(city, *args, **kwargs):
+        card = next(r for r in MOCK_RESPONSES if r.location == city)
+        return card.model_copy(update={"temperature": next(temperatures)})
+
+    config = DashboardConfig(locations=LOCATIONS[:2])
+    scheduler = DashboardScheduler()
+    with patch("app.routers.weather.scheduler", scheduler), \
+         patch("app.services.dashboard.get_weather", side_effect=changing_weather), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: config, forecast_interval=3600, fire_interval=3600)
+        events = live_events(keepalive=0.01)
+        first = await anext(events)
+        await scheduler.refresh()  # nothing changed: no event
+        await scheduler.refresh()  # Castlemaine changed
+        second = await anext(events)
+        while second.startswith(b":"):
+            second = await anext(events)
+        await scheduler.stop()
+        rest = [event async for event in events]
+    assert first.startswith(b"event: snapshot\nid: 1\n")
+    state = json.loads(first.split(b"data: ", 1)[1])
+    assert [w["location"] for w in state["weather"]] == ["Castlemaine", "Melbourne"]
+    assert second.startswith(b"event: update\nid: 3\n")
+    update = json.loads(second.split(b"data: ", 1)[1])
+    assert [w["location"] for w in update["changed"]] == ["Castlemaine"]
+    assert update["changed"][0]["temperature"] == 25.0
+    assert all(event.startswith(b":") for event in rest)
+
+
+@pytest.mark.asyncio
+async def test_weather_changes_returns_changed_fields_since_version():
+    temperatures = iter([18.0, 18.0, 25.0, 18.0])
+
+    async def changing_weather(city, *args, **kwargs):
+        card = next(r for r in MOCK_RESPONSES if r.location == city)
+        return card.model_copy(update={"temperature": next(temperatures)})
+
+    config = DashboardConfig(locations=LOCATIONS[:2])
+    scheduler = DashboardScheduler()
+    with patch("app.routers.weather.config_store.get", return_value=config), \
+         patch("app.routers.weather.scheduler", scheduler), \
+         patch("app.services.dashboard.get_weather", side_effect=changing_weather), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        assert client.get("/api/weather/changes").status_code == 503
+        await scheduler.start(lambda: config, forecast_interval=3600, fire_interval=3600)
+        first = await scheduler.next_snapshot()
+        await scheduler.refresh()
+        delta = client.get("/api/weather/changes",
+                           params={"since": scheduler.published_version(first.version)}).json()
+        current = client.get("/api/weather/changes", params={"since": delta["version"]}).json()
+        full = client.get("/api/weather/changes", params={"since": 0}).json()
+        await scheduler.stop()
+    assert delta == {"version": f"{scheduler.epoch}:2", "full": False, "order": ["Castlemaine", "Melbourne"],
+                     "changed": {"Castlemaine": {"temperature": 25.0}}, "removed": []}
+    assert current["changed"] == {}
+    assert full["full"] is True
+    assert full["changed"]["Melbourne"]["forecast_7day"][0]["day"] == "F"
+
+
+def test_weather_ndjson_streams_cards_as_they_finish():
+    async def melbourne_last(city, *args, **kwargs):
+        if city == "Melbourne":
+            await asyncio.sleep(0.05)
+        if city == "Sorrento":
+            raise Exception("Open-Meteo down")
+        return next(r for r in MOCK_RESPONSES if r.location == city)
+
+    config = DashboardConfig(locations=LOCATIONS)
+    with patch("app.routers.weather.config_store.get", return_value=config), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}), \
+         patch("app.services.dashboard.get_weather", side_effect=melbourne_last):
+        response = client.get("/api/weather/", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines[:-1]][-1] == 1  # Melbourne finished last
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert lines[-1] == {
+        "done": True, "total": 3,
+        "failed": [{"location": "Sorrento", "error": "Open-Meteo down"}],
+    }
+
+
+def test_weather_ndjson_from_snapshot_keeps_config_order():
+    snapshot = make_snapshot(1, MOCK_RESPONSES)
+    with patch("app.routers.weather.scheduler.snapshot", snapshot):
+        response = client.get("/api/weather/", headers={"Accept": "application/x-ndjson"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["weather"]["location"] for line in lines[:-1]] == ["Castlemaine", "Melbourne", "Sorrento"]
+    assert lines[-1]["failed"] == []
+
+
+def test_weather_unknown_user_is_404():
+    config = DashboardConfig(locations=LOCATIONS, users={"alice": LOCATIONS[:1]})
+    with patch("app.routers.weather.config_store.get", return_value=config):
+        response = client.get("/api/weather/", params={"user": "carol"})
+    assert response.status_code == 404
+
+
+def test_weather_user_set_served_from_its_snapshot():
+    config = DashboardConfig(locations=LOCATIONS, users={"alice": LOCATIONS[:1]})
+    snapshot = make_snapshot(1, MOCK_RESPONSES[:1])
+    with patch("app.routers.weather.config_store.get", return_value=config), \
+         patch.dict("app.routers.weather.scheduler.user_snapshots", {"alice": snapshot}), \
+         patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
+        response = client.get("/api/weather/", params={"user": "alice"})
+    assert [item["location"] for item in response.json()] == ["Castlemaine"]
+    mock_get.assert_not_called()
+
+
+def test_weather_user_set_built_on_demand_without_snapshot():
+    config = DashboardConfig(locations=LOCATIONS, users={"alice": LOCATIONS[2:]})
+    with patch("app.routers.weather.config_store.get", return_value=config), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}), \
+         patch("app.services.dashboard.get_weather", new_callable=AsyncMock) as mock_get:
+        mock_get.side_effect = MOCK_RESPONSES[2:]
+        response = client.get("/api/weather/", params={"user": "alice"})
+    assert [item["location"] for item in response.json()] == ["Sorrento"]
+
+
+def test_weather_history_returns_range_and_stats():
+    from app.services.dashboard import series_key
+    from app.services.history import history_store
+    config = DashboardConfig(locations=LOCATIONS)
+    key = series_key(config.locations[1])
+    now = time.time()
+    for minutes_ago, temperature in [(30, 16.0), (20, 18.0), (10, 20.0)]:
+        history_store.record(key, {"temperature": temperature}, when=now - minutes_ago * 60)
+    with patch("app.routers.weather.config_store.get", return_value=config):
+        response = client.get("/api/weather/melbourne/history", params={"since": int(now - 25 * 60)})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["location"] == "Melbourne"
+    assert data["series"]["temperature"] == [18.0, 20.0]
+    assert data["series"]["humidity"] == [None, None]
+    assert data["stats"]["temperature"] == {"count": 2, "min": 18.0, "max": 20.0, "mean": 19.0}
+
+
+def test_weather_history_unknown_location_is_404():
+    with patch("app.routers.weather.config_store.get", return_value=DashboardConfig(locations=LOCATIONS)):
+        response = client.get("/api/weather/Nowhereville/history")
+    assert response.status_code == 404
+
+
+def test_weather_hourly_rejects_horizon_beyond_16_days():
+    response = client.get("/api/weather/Castlemaine/hourly", params={"days": 17})
+    assert response.status_code == 422
+
+
+def test_weather_hourly_unknown_city_is_404():
+    with patch("app.services.geocode.geocode_cache.get", return_value=(True, None)):
+        response = client.get("/api/weather/Nowhereville/hourly")
+    assert response.status_code == 404
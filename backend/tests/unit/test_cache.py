@@ -0,0 +1,75 @@
+"""
+Unit tests for the TTL / stale-while-revalidate cache.
+Time is driven by a fake clock; fetches are plain coroutines.
+"""
+import asyncio
+
+import pytest
+
+from app.services.cache import TTLCache
+
+
+def counting_fetch(values):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return values[len(calls) - 1]
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_from_cache(fake_clock):
+    cache = TTLCache(ttl=10, stale_ttl=10, clock=fake_clock)
+    fetch, calls = counting_fetch(["a", "b"])
+    assert await cache.get_or_fetch("k", fetch) == "a"
+    assert await cache.get_or_fetch("k", fetch) == "a"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing_once(fake_clock):
+    cache = TTLCache(ttl=10, stale_ttl=10, clock=fake_clock)
+    fetch, calls = counting_fetch(["a", "b"])
+    await cache.get_or_fetch("k", fetch)
+    fake_clock.now += 15
+    assert await cache.get_or_fetch("k", fetch) == "a"
+    assert await cache.get_or_fetch("k", fetch) == "a"
+    await asyncio.sleep(0)
+    assert len(calls) == 2
+    assert await cache.get_or_fetch("k", fetch) == "b"
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_fetched_inline(fake_clock):
+    cache = TTLCache(ttl=10, stale_ttl=10, clock=fake_clock)
+    fetch, calls = counting_fetch(["a", "b"])
+    await cache.get_or_fetch("k", fetch)
+    fake_clock.now += 25
+    assert await cache.get_or_fetch("k", fetch) == "b"
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_value_and_logs_the_error(fake_clock, caplog):
+    cache = TTLCache(ttl=10, stale_ttl=10, clock=fake_clock)
+    await cache.get_or_fetch("k", lambda: asyncio.sleep(0, "a"))
+
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    fake_clock.now += 15
+    assert await cache.get_or_fetch("k", failing) == "a"
+    await asyncio.sleep(0)
+    assert await cache.get_or_fetch("k", failing) == "a"
+    assert "upstream down" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_is_evicted(fake_clock):
+    cache = TTLCache(max_size=2, clock=fake_clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    await cache.get_or_fetch("a", None)  # touch "a" so "b" is oldest
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert await cache.get_or_fetch("b", lambda: asyncio.sleep(0, "refetched")) == "refetched"
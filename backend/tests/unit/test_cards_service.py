@@ -0,0 +1,124 @@
+"""
+Unit tests for the dashboard card provider registry.
+Each test builds its own CardRegistry with plain coroutine providers.
+"""
+import asyncio
+
+import pytest
+
+from app.models.config import DashboardConfig
+from app.services.cards import CardRegistry
+
+CONFIG = DashboardConfig(locations=[{"city": "Castlemaine"}], users={"alice": [{"city": "Sorrento"}]})
+
+
+@pytest.mark.asyncio
+async def test_dependency_is_fetched_once_and_passed_to_each_dependant():
+    registry = CardRegistry()
+    calls = []
+
+    @registry.provider("fire")
+    async def fire(context):
+        calls.append("fire")
+        await asyncio.sleep(0)
+        return {"Central": "High"}
+
+    @registry.provider("weather", depends_on=("fire",))
+    async def weather(context):
+        return ["weather", context.deps["fire"]]
+
+    @registry.provider("summary", depends_on=("fire", "weather"))
+    async def summary(context):
+        return sorted(context.deps)
+
+    results = await registry.build(CONFIG)
+    assert list(results) == ["fire", "weather", "summary"]
+    assert {r.status for r in results.values()} == {"ok"}
+    assert results["weather"].data == ["weather", {"Central": "High"}]
+    assert results["summary"].data == ["fire", "weather"]
+    assert calls == ["fire"]
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_per_user_and_shared_by_concurrent_builds():
+    registry = CardRegistry()
+    users = []
+
+    @registry.provider("weather", per_user=True)
+    async def weather(context):
+        users.append(context.user)
+        await asyncio.sleep(0.01)
+        return context.user
+
+    builds = await asyncio.gather(*(registry.build(CONFIG, user) for user in (None, "alice", None, "alice")))
+    assert [b["weather"].data for b in builds] == [None, "alice", None, "alice"]
+    await registry.build(CONFIG, "alice")
+    assert sorted(users, key=str) == [None, "alice"]
+
+
+@pytest.mark.asyncio
+async def test_failing_card_is_reported_without_failing_the_others():
+    registry = CardRegistry()
+
+    @registry.provider("broken")
+    async def broken(context):
+        raise RuntimeError("upstream down")
+
+    @registry.provider("fine", depends_on=("broken",))
+    async def fine(context):
+        return {"broken": context.deps["broken"]}
+
+    results = await registry.build(CONFIG)
+    assert results["broken"].status == "error"
+    assert results["broken"].error == "upstream down"
+    assert results["fine"].status == "ok"
+    assert results["fine"].data == {"broken": None}
+
+
+@pytest.mark.asyncio
+async def test_last_good_data_is_served_stale_after_a_failure():
+    registry = CardRegistry()
+    answers = ["first", RuntimeError("upstream down")]
+
+    @registry.provider("transport", ttl=0.01, stale_ttl=0)
+    async def transport(context):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert (await registry.build(CONFIG))["transport"].status == "ok"
+    await asyncio.sleep(0.02)
+    result = (await registry.build(CONFIG))["transport"]
+    assert (result.status, result.data, result.error) == ("stale", "first", "upstream down")
+
+
+@pytest.mark.asyncio
+async def test_refresh_fetches_one_card_and_its_dependencies_whatever_the_cache_holds():
+    registry = CardRegistry()
+    calls = []
+
+    for name, depends_on in (("fire", ()), ("weather", ("fire",)), ("transport", ())):
+        @registry.provider(name, ttl=3600, depends_on=depends_on)
+        async def fetch(context, name=name):
+            calls.append(name)
+            return name
+
+    await registry.build(CONFIG)
+    calls.clear()
+    results = await registry.build(CONFIG, refresh="weather")
+    assert list(results) == ["fire", "weather"]
+    assert calls == ["weather"]  # fire is still fresh in its cache
+
+
+def test_dependencies_must_be_registered_first():
+    registry = CardRegistry()
+
+    async def fetch(context):
+        return None
+
+    with pytest.raises(ValueError, match="unregistered"):
+        registry.provider("weather", depends_on=("fire",))(fetch)
+    registry.provider("fire")(fetch)
+    with pytest.raises(ValueError, match="already registered"):
+        registry.provider("fire")(fetch)
@@ -0,0 +1,175 @@
+"""
+Unit tests for config loading and hot reload.
+Config files are written to pytest's tmp_path.
+"""
+import json
+import os
+
+import pytest
+from unittest.mock import patch
+
+from app.services.config import ConfigError, ConfigStore, DEFAULT_CONFIG_PATH
+
+VALID = """
+locations:
+  - name: Castlemaine
+    city: Castlemaine
+    latitude: -37.0678
+    longitude: 144.2218
+    fire_district: North Central
+settings:
+  concurrency: 4
+"""
+
+
+def write(path, text, mtime_ns):
+    path.write_text(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_repo_config_is_valid():
+    config = ConfigStore(DEFAULT_CONFIG_PATH).load()
+    assert [loc.display_name for loc in config.locations] == ["Castlemaine", "Melbourne", "Sorrento"]
+
+
+def test_load_returns_typed_locations_and_defaults(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, VALID, 1_000_000_000)
+    config = ConfigStore(path).load()
+    loc = config.locations[0]
+    assert loc.country == "AU"
+    assert loc.show_fire_danger is False
+    assert config.settings.concurrency == 4
+    assert config.settings.location_timeout == 10.0
+
+
+@pytest.mark.parametrize("text", [
+    "locations:\n  - name: No city\n",
+    "locations:\n  - city: Castlemaine\n    latitude: -37.0\n",
+    "settings:\n  concurrency: 0\nlocations: []\n",
+    "locations: [unclosed\n",
+    "locations:\n  - city: Sydney\n  - city: Sydney\n    country: CA\n",
+    "locations: []\nusers:\n  sam:\n    - {name: Home, city: Sydney}\n    - {name: Home, city: Castlemaine}\n",
+])
+def test_schema_errors_raise_at_load(tmp_path, text):
+    path = tmp_path / "config.yaml"
+    write(path, text, 1_000_000_000)
+    with pytest.raises(ConfigError):
+        ConfigStore(path).load()
+
+
+def test_get_does_not_reread_file(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, VALID, 1_000_000_000)
+    store = ConfigStore(path)
+    first = store.get()
+    path.unlink()
+    assert store.get() is first
+
+
+def test_reload_if_changed_swaps_config(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, VALID, 1_000_000_000)
+    store = ConfigStore(path)
+    first = store.get()
+    assert store.reload_if_changed() is False
+    write(path, VALID.replace("Castlemaine", "Kyneton"), 2_000_000_000)
+    assert store.reload_if_changed() is True
+    assert store.get() is not first
+    assert store.get().locations[0].city == "Kyneton"
+
+
+def test_invalid_reload_keeps_previous_config(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, VALID, 1_000_000_000)
+    store = ConfigStore(path)
+    first = store.get()
+    write(path, "locations:\n  - name: broken\n", 2_000_000_000)
+    assert store.reload_if_changed() is False
+    assert store.get() is first
+
+
+def test_rejected_edit_is_not_retried_until_file_changes_again(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, VALID, 1_000_000_000)
+    store = ConfigStore(path)
+    store.get()
+    write(path, "locations:\n  - name: broken\n", 2_000_000_000)
+    store.reload_if_changed()
+    with patch.object(store, "load") as mock_load:
+        assert store.reload_if_changed() is False
+    mock_load.assert_not_called()
+
+
+def write_districts(path):
+    # Central: 144-146°E, Mallee: 141-143°E, both 34-39°S
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name},
+         "geometry": {"type": "Polygon", "coordinates": [[[x0, -39], [x1, -39], [x1, -34], [x0, -34], [x0, -39]]]}}
+        for name, x0, x1 in (("Central", 144, 146), ("Mallee", 141, 143))
+    ]}))
+
+
+def test_fire_district_is_assigned_from_coordinates_when_opted_in(tmp_path):
+    write_districts(tmp_path / "districts.geojson")
+    path = tmp_path / "config.yaml"
+    write(path, """
+locations:
+  - city: Melbourne
+    latitude: -37.8136
+    longitude: 144.9631
+    show_fire_danger: true
+  - city: Bendigo
+    latitude: -36.76
+    longitude: 144.28
+    fire_district: North Central
+  - city: Sydney
+users:
+  alice:
+    - city: Mildura
+      latitude: -34.2080
+      longitude: 142.1246
+settings:
+  fire_district_boundaries: districts.geojson
+""", 1_000_000_000)
+    config = ConfigStore(path).load()
+    assert [loc.fire_district for loc in config.locations] == ["Central", "North Central", None]
+    assert config.users["alice"][0].fire_district == "Mallee"
+    assert config.fire_districts == {"Central", "North Central", "Mallee"}
+
+
+def test_fire_district_is_never_guessed_by_default(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, "locations:\n  - city: Melbourne\n    latitude: -37.8\n    longitude: 144.9\n", 1_000_000_000)
+    assert ConfigStore(path).load().locations[0].fire_district is None
+    write(path, "locations:\n  - city: Melbourne\n    latitude: -37.8\n    longitude: 144.9\n"
+                "    show_fire_danger: true\n", 2_000_000_000)
+    with pytest.raises(ConfigError, match="Melbourne in locations shows fire danger but has no fire_district"):
+        ConfigStore(path).load()
+
+
+def test_location_in_no_fire_district(tmp_path, caplog):
+    write_districts(tmp_path / "districts.geojson")
+    path = tmp_path / "config.yaml"
+    text = """
+locations:
+  - city: Hobart
+    latitude: -42.88
+    longitude: 147.33
+settings:
+  fire_district_boundaries: districts.geojson
+"""
+    write(path, text, 1_000_000_000)
+    assert ConfigStore(path).load().locations[0].fire_district is None
+    assert "Hobart (-42.88, 147.33) is in no fire district" in caplog.text
+    write(path, text.replace("    longitude: 147.33\n", "    longitude: 147.33\n    show_fire_danger: true\n"),
+          2_000_000_000)
+    with pytest.raises(ConfigError, match="Hobart .* is in no fire district"):
+        ConfigStore(path).load()
+
+
+def test_missing_fire_district_boundaries_are_a_config_error(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, "locations: []\nsettings:\n  fire_district_boundaries: nowhere.geojson\n", 1_000_000_000)
+    with pytest.raises(ConfigError, match="fire_district_boundaries"):
+        ConfigStore(path).load()
@@ -0,0 +1,398 @@
+"""
+Unit tests for the dashboard snapshot scheduler.
+get_weather and fetch_fire_data are mocked — no network calls made.
+"""
+import asyncio
+import json
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.models.config import DashboardConfig
+from app.models.weather import WeatherResponse
+from app.services.cards import CardRegistry
+from app.services.dashboard import (
+    DashboardScheduler, build_weather, changes_since, diff_snapshots, jittered, make_snapshot,
+)
+from app.services.quota import BACKGROUND, INTERACTIVE, current_priority
+from tests.unit.test_weather_service import WEATHER_RESPONSE
+
+CONFIG = DashboardConfig(locations=[
+    {"name": "Castlemaine", "city": "Castlemaine", "country": "AU", "bom_url": "https://bom/c"},
+    {"name": "Melbourne", "city": "Melbourne", "country": "AU", "bom_url": "https://bom/m"},
+])
+
+
+def fake_weather(temperature: float):
+    async def get_weather(city, country, bom_url, **kwargs):
+        return WeatherResponse(
+            location=city, temperature=temperature,
+            bom_today_url=bom_url + "#today", bom_7day_url=bom_url + "#7-days",
+        )
+    return get_weather
+
+
+@pytest.mark.asyncio
+async def test_build_weather_keeps_config_order():
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        result = await build_weather(CONFIG)
+    assert [w.location for w in result] == ["Castlemaine", "Melbourne"]
+
+
+@pytest.mark.asyncio
+async def test_build_weather_sends_one_batch_beyond_the_concurrency_limit():
+    config = DashboardConfig(
+        settings={"concurrency": 8},
+        locations=[{"name": f"Town {i}", "city": f"Town {i}", "country": "AU", "bom_url": "https://bom/t",
+                    "latitude": -37.0 - i * 0.2, "longitude": 144.0} for i in range(30)],
+    )
+    batches = []
+
+    async def fetch_forecasts(coords):
+        batches.append(len(coords))
+        await asyncio.sleep(0.05)
+        return [WEATHER_RESPONSE] * len(coords)
+
+    with patch("app.services.weather.fetch_forecasts", side_effect=fetch_forecasts), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        result = await build_weather(config)
+    assert batches == [30]
+    assert all(card.error is None for card in result)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_publishes_new_snapshot_each_refresh():
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        first = scheduler.snapshot
+        second = await scheduler.refresh()
+        await scheduler.stop()
+    assert first.version == 1
+    assert second.version == 2
+    assert isinstance(second.weather, tuple)
+    assert second.weather[0].temperature == 20.0
+    assert first is not second
+
+
+@pytest.mark.asyncio
+async def test_scheduler_forecast_rounds_force_upstream_refresh():
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)) as mock_get, \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        await scheduler.refresh(refresh_forecasts=False)
+        await scheduler.stop()
+    refresh_flags = [call.kwargs["refresh"] for call in mock_get.call_args_list]
+    assert refresh_flags == [True, True, False, False]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rounds_run_at_background_priority():
+    priorities = []
+
+    async def get_weather(city, country, bom_url, **kwargs):
+        priorities.append(current_priority())
+        return await fake_weather(20.0)(city, country, bom_url)
+
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=get_weather), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        await scheduler.stop()
+    assert priorities == [BACKGROUND, BACKGROUND]
+    assert current_priority() == INTERACTIVE
+
+
+def card(location: str, temperature: float) -> WeatherResponse:
+    return WeatherResponse(location=location, temperature=temperature,
+                           bom_today_url="#today", bom_7day_url="#7-days")
+
+
+def test_diff_snapshots_sends_only_changed_cards():
+    old = make_snapshot(1, [card("Castlemaine", 20.0), card("Melbourne", 18.0)])
+    new = make_snapshot(2, [card("Castlemaine", 20.0), card("Melbourne", 19.5)])
+    update = diff_snapshots(old, new)
+    assert update.version == 2
+    assert [w.location for w in update.changed] == ["Melbourne"]
+    assert update.order == ["Castlemaine", "Melbourne"]
+    assert update.removed == []
+
+
+def test_diff_snapshots_reports_added_and_removed_locations():
+    old = make_snapshot(1, [card("Castlemaine", 20.0), card("Melbourne", 18.0)])
+    new = make_snapshot(2, [card("Sorrento", 17.0), card("Castlemaine", 20.0)])
+    update = diff_snapshots(old, new)
+    assert [w.location for w in update.changed] == ["Sorrento"]
+    assert update.removed == ["Melbourne"]
+    assert update.order == ["Sorrento", "Castlemaine"]
+
+
+def test_diff_snapshots_is_none_when_nothing_changed():
+    cards = [card("Castlemaine", 20.0)]
+    assert diff_snapshots(make_snapshot(1, cards), make_snapshot(2, cards)) is None
+
+
+def test_changes_since_sends_only_changed_fields():
+    old = make_snapshot(1, [card("Castlemaine", 20.0), card("Melbourne", 18.0)])
+    new = make_snapshot(3, [card("Sorrento", 17.0), card("Castlemaine", 21.5)])
+    changes = changes_since(old.weather, new, "e:3")
+    assert (changes.version, changes.full) == ("e:3", False)
+    assert changes.order == ["Sorrento", "Castlemaine"]
+    assert changes.changed["Castlemaine"] == {"temperature": 21.5}
+    assert changes.changed["Sorrento"] == card("Sorrento", 17.0).model_dump()
+    assert changes.removed == ["Melbourne"]
+
+
+def test_changes_since_unknown_version_sends_every_card():
+    new = make_snapshot(3, [card("Castlemaine", 20.0)])
+    changes = changes_since(None, new, "e:3")
+    assert changes.full is True
+    assert changes.changed == {"Castlemaine": card("Castlemaine", 20.0).model_dump()}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_changes_only_diff_against_kept_versions():
+    temperatures = iter([20.0, 20.0, 21.0, 20.0, 22.0, 20.0])
+
+    async def get_weather(city, country, bom_url, **kwargs):
+        return card(city, next(temperatures))
+
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.KEPT_VERSIONS", 2), \
+         patch("app.services.dashboard.get_weather", side_effect=get_weather), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        await scheduler.refresh()
+        await scheduler.refresh()
+        latest = scheduler.changes(scheduler.published_version(2))
+        assert scheduler.changes(scheduler.published_version(2)) is latest  # encoded once per version
+        expired = scheduler.changes(scheduler.published_version(1))
+        await scheduler.stop()
+    assert json.loads(latest) == {
+        "version": f"{scheduler.epoch}:3", "full": False, "order": ["Castlemaine", "Melbourne"],
+        "changed": {"Castlemaine": {"temperature": 22.0}}, "removed": [],
+    }
+    assert json.loads(expired)["full"] is True
+
+
+@pytest.mark.asyncio
+async def test_versions_from_another_scheduler_get_every_card():
+    """Another worker, or this one before a restart, counts versions from 1 too."""
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        schedulers = [DashboardScheduler(), DashboardScheduler()]
+        for scheduler in schedulers:
+            await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+            await scheduler.next_snapshot()
+            await scheduler.refresh()
+        same = json.loads(schedulers[1].changes(schedulers[1].published_version(1)))
+        other = json.loads(schedulers[1].changes(schedulers[0].published_version(1)))
+        for scheduler in schedulers:
+            await scheduler.stop()
+    assert schedulers[0].epoch != schedulers[1].epoch
+    assert same["full"] is False
+    assert other["full"] is True
+    assert other["version"] == f"{schedulers[1].epoch}:2"
+
+
+@pytest.mark.asyncio
+async def test_next_snapshot_waits_for_a_newer_version():
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        first = await scheduler.next_snapshot(timeout=1)
+        waiter = asyncio.ensure_future(scheduler.next_snapshot(after=first.version, timeout=1))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await scheduler.refresh(refresh_forecasts=False)
+        second = await waiter
+        pending = asyncio.ensure_future(scheduler.next_snapshot(after=second.version))
+        await scheduler.stop()
+        assert await pending is None
+    assert second.version == first.version + 1
+
+
+USERS_CONFIG = DashboardConfig(
+    locations=[{"name": "Castlemaine", "city": "Castlemaine", "bom_url": "https://bom/c"}],
+    users={
+        "alice": [
+            {"name": "Castlemaine", "city": "Castlemaine", "bom_url": "https://bom/c"},
+            {"name": "Melbourne", "city": "Melbourne", "bom_url": "https://bom/m"},
+        ],
+        "bob": [{"name": "Melbourne", "city": "Melbourne", "bom_url": "https://bom/m"}],
+    },
+)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_builds_every_user_set_fetching_shared_locations_once():
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)) as mock_get, \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: USERS_CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        await scheduler.stop()
+    assert sorted(call.args[0] for call in mock_get.call_args_list) == ["Castlemaine", "Melbourne"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_publishes_a_snapshot_per_user():
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: USERS_CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        default, alice, bob = (scheduler.snapshot_for(user) for user in (None, "alice", "bob"))
+        await scheduler.stop()
+    assert [w.location for w in default.weather] == ["Castlemaine"]
+    assert [w.location for w in alice.weather] == ["Castlemaine", "Melbourne"]
+    assert [w.location for w in bob.weather] == ["Melbourne"]
+    assert alice.version == bob.version == default.version
+    assert scheduler.snapshot_for("carol") is None
+
+
+@pytest.mark.asyncio
+async def test_refresh_forces_one_upstream_refresh_per_grid_cell():
+    config = DashboardConfig(locations=[
+        {"name": "Home", "city": "Castlemaine", "latitude": -37.0678, "longitude": 144.2218},
+        {"name": "Work", "city": "Campbells Creek", "latitude": -37.0889, "longitude": 144.2017},
+        {"name": "Melbourne", "city": "Melbourne", "latitude": -37.8136, "longitude": 144.9631},
+    ])
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)) as mock_get, \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        result = await build_weather(config, refresh=True)
+    refreshes = {call.kwargs["location_name"]: call.kwargs["refresh"] for call in mock_get.call_args_list}
+    assert refreshes == {"Home": True, "Work": False, "Melbourne": True}
+    # The cache reader in a cell only runs once its cell's refresh is done
+    assert [call.kwargs["location_name"] for call in mock_get.call_args_list][-1] == "Work"
+    assert [w.location for w in result] == ["Castlemaine", "Campbells Creek", "Melbourne"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_records_history_per_location_with_district_fire_data():
+    from app.models.weather import FireDangerDay
+    from app.services.dashboard import series_key
+    from app.services.history import history_store
+    config = DashboardConfig(locations=[
+        {"name": "Castlemaine", "city": "Castlemaine", "latitude": -37.0678, "longitude": 144.2218,
+         "fire_district": "North Central"},
+    ])
+    fire_data = {"North Central": {"total_fire_ban": True,
+                                   "fire_danger": [FireDangerDay(day="T", rating="High", index=32)]}}
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value=fire_data):
+        await scheduler.start(lambda: config, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        await scheduler.refresh()
+        await scheduler.stop()
+    result = history_store.query(series_key(config.locations[0]))
+    assert len(result["time"]) == 2
+    assert result["series"]["temperature"] == [20.0, 20.0]
+    assert result["series"]["fire_danger_index"] == [32.0, 32.0]
+    assert result["stats"]["total_fire_ban"]["mean"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_rounds_without_new_forecasts_record_no_history():
+    from app.services.dashboard import series_key
+    from app.services.history import history_store
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+        await scheduler.next_snapshot()
+        # A fire-only round and a config reload
+        await scheduler.refresh(refresh_forecasts=False)
+        await scheduler.refresh(refresh_forecasts=False)
+        await scheduler.stop()
+    assert len(history_store.query(series_key(CONFIG.locations[0]))["time"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_records_history(tmp_path):
+    from app.services.dashboard import series_key
+    from app.services.history import history_store
+    from app.services.shared_cache import SharedCache
+    workers = [SharedCache(), SharedCache()]
+    for worker in workers:
+        worker.open(tmp_path / "shared.sqlite3")
+    history_store.open(tmp_path / "history")
+    try:
+        with patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+             patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+            schedulers = [DashboardScheduler(), DashboardScheduler()]
+            for scheduler, worker in zip(schedulers, workers):
+                with patch("app.services.dashboard.shared_cache", worker):
+                    await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600)
+                    await scheduler.next_snapshot()
+            # Once the writer stops, the other worker takes over
+            with patch("app.services.dashboard.shared_cache", workers[0]):
+                await schedulers[0].stop()
+            with patch("app.services.dashboard.shared_cache", workers[1]):
+                await schedulers[1].refresh()
+                await schedulers[1].stop()
+    finally:
+        for worker in workers:
+            worker.close()
+    assert len(history_store.query(series_key(CONFIG.locations[0]))["time"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_refreshes_each_card_at_its_interval_for_every_user():
+    registry = CardRegistry()
+    refreshed = []
+
+    @registry.provider("transport", ttl=3600, interval=0.05)
+    async def transport(context):
+        refreshed.append(("transport", context.user, current_priority()))
+
+    @registry.provider("calendar", ttl=3600, interval=0.05, per_user=True)
+    async def calendar(context):
+        refreshed.append(("calendar", context.user, current_priority()))
+
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.cards", registry), \
+         patch("app.services.dashboard.get_weather", side_effect=fake_weather(20.0)), \
+         patch("app.services.dashboard.fetch_fire_data", new_callable=AsyncMock, return_value={}):
+        await scheduler.start(lambda: CONFIG, forecast_interval=3600, fire_interval=3600, jitter=0.0)
+        await asyncio.sleep(0.08)
+        await scheduler.stop()
+    assert sorted(refreshed, key=str) == sorted([
+        ("transport", None, BACKGROUND),
+        *(("calendar", user, BACKGROUND) for user in [None, *CONFIG.users]),
+    ], key=str)
+
+
+@pytest.mark.asyncio
+async def test_failed_rounds_are_logged_and_retried(caplog):
+    registry = CardRegistry()
+
+    @registry.provider("transport", ttl=3600, interval=0.02)
+    async def transport(context):
+        return {}
+
+    def load_config():
+        raise RuntimeError("config unreadable")
+
+    scheduler = DashboardScheduler()
+    with patch("app.services.dashboard.cards", registry):
+        await scheduler.start(load_config, forecast_interval=0.02, fire_interval=3600, jitter=0.0)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+    assert caplog.text.count("Dashboard refresh failed") >= 2
+    assert "Refreshing the transport card failed" in caplog.text
+    assert "config unreadable" in caplog.text
+
+
+def test_jittered_stays_within_bounds():
+    for _ in range(100):
+        assert 90 <= jittered(100, 0.1) <= 110
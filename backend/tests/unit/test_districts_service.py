@@ -0,0 +1,55 @@
+"""
+Unit tests for fire-district lookup by coordinates.
+Uses small GeoJSON files written to tmp_path.
+"""
+import json
+
+import pytest
+
+from app.services.districts import DistrictIndex, district_index, point_in_rings, simplify
+
+SQUARE = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+HOLE = [[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]]
+
+
+def feature(name, geometry_type, coordinates):
+    return {"type": "Feature", "properties": {"name": name},
+            "geometry": {"type": geometry_type, "coordinates": coordinates}}
+
+
+def test_point_in_rings_honours_holes():
+    assert point_in_rings(0.5, 0.5, [SQUARE, HOLE])
+    assert not point_in_rings(2, 2, [SQUARE, HOLE])
+    assert not point_in_rings(5, 2, [SQUARE])
+
+
+def test_simplify_keeps_corners_and_drops_vertices_within_tolerance():
+    line = [[0, 0], [1, 0.004], [2, 0], [2, 1], [2.003, 2]]
+    assert simplify(line, 0.005) == [[0, 0], [2, 0], [2.003, 2]]
+    assert simplify(line, 0.001) == line
+    assert simplify(SQUARE, 0.005) == SQUARE
+
+
+def test_custom_file_with_multipolygon(tmp_path):
+    path = tmp_path / "districts.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        feature("Square", "Polygon", [SQUARE, HOLE]),
+        feature("Islands", "MultiPolygon", [
+            [[[10, 0], [11, 0], [11, 1], [10, 1], [10, 0]]],
+            [[[2, 2], [2.5, 2], [2.5, 2.5], [2, 2.5], [2, 2]]],  # inside Square's hole
+        ]),
+    ]}))
+    index = DistrictIndex(path, cell=0.5)
+    assert index.lookup(0.5, 0.5) == "Square"
+    assert index.lookup(0.5, 10.5) == "Islands"
+    assert index.lookup(2.2, 2.2) == "Islands"
+    assert index.lookup(1.5, 1.5) is None
+    assert index.lookup(50, 50) is None
+
+
+def test_each_file_is_indexed_once(tmp_path):
+    path = tmp_path / "districts.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [feature("Square", "Polygon", [SQUARE])]}))
+    index = district_index(path)
+    assert index.lookup(1, 1) == "Square"
+    assert district_index(tmp_path / "." / "districts.geojson") is index
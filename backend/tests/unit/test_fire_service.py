@@ -2,10 +2,16 @@
 Unit tests for fire service.
 Tests XML parsing logic in isolation — no network calls made.
 """
+import asyncio
+import io
+
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.services.fire import parse_bom_xml, parse_cfa_tfb, fetch_fire_data
+from app.services.fire import (
+    BOM_FEED_URL, FireFeed, bom_feed, fetch_fire_data, parse_bom_xml, parse_cfa_tfb,
+)
 
 # Minimal sample RSS XML matching the real CFA feed structure.
 # Day 1 (Thursday): North Central has TFB=YES, rating=EXTREME; Central has TFB=NO, rating=MODERATE
@@ -119,6 +125,25 @@ def test_bom_returns_empty_on_malformed_xml():
     assert parse_bom_xml(b"not xml <<<") == {}
 
 
+def test_bom_only_wanted_districts():
+    result = parse_bom_xml(BOM_SAMPLE_XML, districts={"North Central"})
+    assert list(result) == ["North Central"]
+    assert result["North Central"][0].index == 36
+
+
+def test_bom_stops_once_wanted_districts_found():
+    # Everything after the Central area is garbage; a full parse would fail
+    truncated = BOM_SAMPLE_XML[:BOM_SAMPLE_XML.index(b"</area>") + len(b"</area>")] + b"<<< garbage"
+    assert parse_bom_xml(truncated) == {}
+    result = parse_bom_xml(truncated, districts={"Central"})
+    assert [d.rating for d in result["Central"]] == ["High", "Moderate", "High", "Moderate"]
+
+
+def test_bom_accepts_str_and_file_like():
+    assert parse_bom_xml(BOM_SAMPLE_XML.decode("utf-8")).keys() == {"Central", "North Central"}
+    assert parse_bom_xml(io.BytesIO(BOM_SAMPLE_XML)).keys() == {"Central", "North Central"}
+
+
 # --- parse_cfa_tfb tests ---
 
 def test_cfa_tfb_north_central_has_ban():
@@ -131,60 +156,161 @@ def test_cfa_tfb_central_has_no_ban():
     assert result["Central"] is False
 
 
+def test_cfa_tfb_only_wanted_districts():
+    assert parse_cfa_tfb(SAMPLE_XML, districts={"Central"}) == {"Central": False}
+
+
 def test_cfa_tfb_returns_empty_on_malformed_xml():
     assert parse_cfa_tfb(b"not xml <<<") == {}
 
 
-
-def test_fetch_fire_data_merges_bom_and_cfa():
-    with patch("app.services.fire._fetch_url") as mock_fetch:
-        def side_effect(url, timeout=10):
-            if "bom.gov.au" in url:
-                return BOM_SAMPLE_XML
-            return SAMPLE_XML
-        mock_fetch.side_effect = side_effect
-        result = fetch_fire_data()
+def make_feed_response(content: bytes = b"", status_code: int = 200, headers: dict = None):
+    mock = MagicMock()
+    mock.status_code = status_code
+    mock.content = content
+    mock.headers = headers or {}
+    if status_code >= 400:
+        mock.raise_for_status = MagicMock(side_effect=httpx.HTTPStatusError(
+            "error", request=MagicMock(), response=mock))
+    else:
+        mock.raise_for_status = MagicMock()
+    return mock
+
+
+def mock_feed_client(bom=None, cfa=None):
+    """
+    Client whose get() answers per feed. `bom` / `cfa` are a response,
+    an exception, or a list of either (one per call).
+    """
+    queues = {"bom.gov.au": bom, "cfa.vic.gov.au": cfa}
+
+    async def get(url, headers=None):
+        for host, answer in queues.items():
+            if host in url:
+                if isinstance(answer, list):
+                    answer = answer.pop(0)
+                if isinstance(answer, Exception):
+                    raise answer
+                return answer
+        raise AssertionError(url)
+
+    client = AsyncMock()
+    client.__aenter__ = AsyncMock(return_value=client)
+    client.__aexit__ = AsyncMock(return_value=False)
+    client.get = AsyncMock(side_effect=get)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_fetch_fire_data_merges_bom_and_cfa():
+    client = mock_feed_client(make_feed_response(BOM_SAMPLE_XML), make_feed_response(SAMPLE_XML))
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        result = await fetch_fire_data()
     assert result["Central"]["total_fire_ban"] is False
     assert result["North Central"]["total_fire_ban"] is True
     assert result["Central"]["fire_danger"][0].index == 34
     assert result["North Central"]["fire_danger"][0].index == 36
 
 
-def test_fetch_fire_data_bom_failure_nulls_fire_danger():
-    with patch("app.services.fire._fetch_url") as mock_fetch:
-        def side_effect(url, timeout=10):
-            if "bom.gov.au" in url:
-                raise Exception("BOM down")
-            return SAMPLE_XML
-        mock_fetch.side_effect = side_effect
-        result = fetch_fire_data()
+@pytest.mark.asyncio
+async def test_fetch_fire_data_bom_failure_nulls_fire_danger():
+    client = mock_feed_client(Exception("BOM down"), make_feed_response(SAMPLE_XML))
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        result = await fetch_fire_data()
     assert result.get("North Central", {}).get("fire_danger") is None
     assert result.get("North Central", {}).get("total_fire_ban") is True
 
 
-def test_fetch_fire_data_cfa_failure_defaults_tfb_false():
-    with patch("app.services.fire._fetch_url") as mock_fetch:
-        def side_effect(url, timeout=10):
-            if "cfa.vic.gov.au" in url:
-                raise Exception("CFA down")
-            return BOM_SAMPLE_XML
-        mock_fetch.side_effect = side_effect
-        result = fetch_fire_data()
+@pytest.mark.asyncio
+async def test_fetch_fire_data_cfa_failure_defaults_tfb_false():
+    client = mock_feed_client(make_feed_response(BOM_SAMPLE_XML), Exception("CFA down"))
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        result = await fetch_fire_data()
     assert result["Central"]["total_fire_ban"] is False
     assert result["Central"]["fire_danger"][0].index == 34
 
 
-def test_fetch_fire_data_returns_empty_on_network_error():
-    with patch("app.services.fire.urllib.request.urlopen", side_effect=Exception("Network error")):
-        result = fetch_fire_data()
+@pytest.mark.asyncio
+async def test_fetch_fire_data_returns_empty_on_network_error():
+    with patch("app.services.http.httpx.AsyncClient.get", side_effect=httpx.ConnectError("Network error")):
+        result = await fetch_fire_data()
     assert result == {}
 
 
-def test_fetch_fire_data_returns_empty_on_malformed_xml():
-    mock_response = MagicMock()
-    mock_response.__enter__ = MagicMock(return_value=mock_response)
-    mock_response.__exit__ = MagicMock(return_value=False)
-    mock_response.read = MagicMock(return_value=b"not xml at all <<<")
-    with patch("app.services.fire.urllib.request.urlopen", return_value=mock_response):
-        result = fetch_fire_data()
+@pytest.mark.asyncio
+async def test_fetch_fire_data_returns_empty_on_malformed_xml():
+    with patch("app.services.http.httpx.AsyncClient.get",
+               return_value=make_feed_response(b"not xml at all <<<")):
+        result = await fetch_fire_data()
     assert result == {}
+
+
+@pytest.mark.asyncio
+async def test_fetch_fire_data_served_from_cache_within_refresh_interval():
+    client = mock_feed_client(make_feed_response(BOM_SAMPLE_XML), make_feed_response(SAMPLE_XML))
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await fetch_fire_data()
+        second = await fetch_fire_data()
+    assert client.get.call_count == 2  # one per feed
+    assert second is first
+
+
+@pytest.mark.asyncio
+async def test_fire_feed_revalidates_with_etag_and_keeps_parse_on_304():
+    clock = MagicMock(return_value=0.0)
+    parse = MagicMock(side_effect=parse_bom_xml)
+    feed = FireFeed(BOM_FEED_URL, "bom", parse, refresh_interval=60, clock=clock)
+    client = mock_feed_client(bom=[
+        make_feed_response(BOM_SAMPLE_XML, headers={"ETag": '"v1"', "Last-Modified": "Fri, 20 Feb 2026 05:00:00 GMT"}),
+        make_feed_response(status_code=304),
+    ])
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await feed.get()
+        clock.return_value = 61.0
+        second = await feed.get()
+    assert second is first
+    assert parse.call_count == 1
+    headers = client.get.call_args_list[1].kwargs["headers"]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Fri, 20 Feb 2026 05:00:00 GMT"
+
+
+@pytest.mark.asyncio
+async def test_fire_feed_keeps_last_good_data_on_failure():
+    clock = MagicMock(return_value=0.0)
+    feed = FireFeed(BOM_FEED_URL, "bom", parse_bom_xml, refresh_interval=60, retry_interval=5, clock=clock)
+    client = mock_feed_client(bom=[
+        make_feed_response(BOM_SAMPLE_XML),
+        make_feed_response(status_code=503),
+        make_feed_response(b"not xml <<<"),
+    ])
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        good = await feed.get()
+        clock.return_value = 61.0
+        assert await feed.get() is good
+        clock.return_value = 63.0
+        await feed.get()  # within retry_interval — no request
+        assert client.get.call_count == 2
+        clock.return_value = 67.0
+        assert await feed.get() is good
+    assert client.get.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fetch_fire_data_shares_one_request_per_feed():
+    client = mock_feed_client(make_feed_response(BOM_SAMPLE_XML), make_feed_response(SAMPLE_XML))
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        results = await asyncio.gather(*(fetch_fire_data() for _ in range(5)))
+    assert client.get.call_count == 2
+    assert all(r["Central"]["fire_danger"][0].index == 34 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_fire_feed_reparses_cached_body_when_districts_change():
+    client = mock_feed_client(bom=[make_feed_response(BOM_SAMPLE_XML)])
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await bom_feed.get({"Central"})
+        second = await bom_feed.get({"Central", "North Central"})
+    assert list(first) == ["Central"]
+    assert second.keys() == {"Central", "North Central"}
+    assert client.get.call_count == 1
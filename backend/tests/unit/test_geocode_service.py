@@ -0,0 +1,103 @@
+"""
+Unit tests for the geocoding service and its persistent cache.
+External HTTP calls are mocked; SQLite files live in pytest's tmp_path.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.geocode import GeocodeCache, geocode
+
+GEO_RESPONSE = {
+    "results": [{"name": "Castlemaine", "latitude": -37.0688, "longitude": 144.2197}]
+}
+
+
+def mock_geo_client(*payloads):
+    responses = []
+    for payload in payloads:
+        response = MagicMock()
+        response.status_code = 200
+        response.raise_for_status = MagicMock()
+        response.json = MagicMock(return_value=payload)
+        responses.append(response)
+    client = AsyncMock()
+    client.__aenter__ = AsyncMock(return_value=client)
+    client.__aexit__ = AsyncMock(return_value=False)
+    client.get = AsyncMock(side_effect=responses)
+    return client
+
+
+def test_busy_database_keeps_the_entry_in_memory(tmp_path):
+    path = tmp_path / "geocode.sqlite3"
+    cache = GeocodeCache()
+    cache.open(path)
+    writer = sqlite3.connect(str(path), isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")  # another worker in the middle of a write
+    try:
+        cache.put("Castlemaine", "AU", ("Castlemaine", -37.0688, 144.2197))
+        assert cache.get("Castlemaine", "AU") == (True, ("Castlemaine", -37.0688, 144.2197))
+    finally:
+        writer.rollback()
+        writer.close()
+    cache.put("Sorrento", "AU", ("Sorrento", -38.34, 144.74))  # the file is writable again
+    cache.close()
+    reopened = GeocodeCache()
+    reopened.open(path)
+    assert reopened.get("Sorrento", "AU")[0] is True
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_geocode_caches_result_by_normalized_name():
+    client = mock_geo_client(GEO_RESPONSE)
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await geocode("Castlemaine", "AU")
+        second = await geocode("  castlemaine ", "au")
+    assert first == second == ("Castlemaine", -37.0688, 144.2197)
+    assert client.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_geocode_caches_unknown_city():
+    client = mock_geo_client({"results": []})
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Location not found"):
+                await geocode("Nowhereville", "AU")
+    assert client.get.call_count == 1
+
+
+def test_negative_entries_expire():
+    clock = MagicMock(return_value=0.0)
+    cache = GeocodeCache(negative_ttl=60, clock=clock)
+    cache.put("Nowhereville", "AU", None)
+    assert cache.get("Nowhereville", "AU") == (True, None)
+    clock.return_value = 61.0
+    assert cache.get("Nowhereville", "AU") == (False, None)
+
+
+def test_cache_persists_across_restarts(tmp_path):
+    path = tmp_path / "geocode.sqlite3"
+    cache = GeocodeCache()
+    cache.open(path)
+    cache.put("Castlemaine", "AU", ("Castlemaine", -37.0688, 144.2197))
+    cache.put("Nowhereville", "AU", None)
+    cache.close()
+
+    reopened = GeocodeCache()
+    reopened.open(path)
+    assert reopened.get("castlemaine", "AU") == (True, ("Castlemaine", -37.0688, 144.2197))
+    assert reopened.get("Nowhereville", "AU") == (True, None)
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_geocode_misses_share_one_request():
+    client = mock_geo_client(GEO_RESPONSE)
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        results = await asyncio.gather(*(geocode("Castlemaine", "AU") for _ in range(4)))
+    assert client.get.call_count == 1
+    assert len(set(results)) == 1
@@ -0,0 +1,123 @@
+"""
+Unit tests for the ring-buffer history store.
+"""
+import math
+import multiprocessing
+import time
+
+import pytest
+
+from app.services.history import COLUMNS, HistoryStore, series_filename, summarize
+
+
+def record_range(store, key, times):
+    for t in times:
+        store.record(key, {"temperature": float(t), "total_fire_ban": t % 2}, when=float(t))
+
+
+def test_query_returns_rows_in_range_oldest_first(fake_clock):
+    store = HistoryStore(capacity=10, retention=3600, clock=fake_clock)
+    record_range(store, "cell", range(990, 996))
+    result = store.query("cell", since=992, until=994)
+    assert result["time"] == [992.0, 993.0, 994.0]
+    assert result["series"]["temperature"] == [992.0, 993.0, 994.0]
+    assert set(result["series"]) == set(COLUMNS)
+
+
+def test_ring_keeps_only_the_newest_rows_across_the_wrap(fake_clock):
+    store = HistoryStore(capacity=4, retention=3600, clock=fake_clock)
+    record_range(store, "cell", range(990, 997))
+    assert store.query("cell")["time"] == [993.0, 994.0, 995.0, 996.0]
+    assert store.query("cell", since=995)["time"] == [995.0, 996.0]
+
+
+def test_query_is_clamped_to_the_retention_window(fake_clock):
+    store = HistoryStore(capacity=10, retention=5, clock=fake_clock)
+    record_range(store, "cell", range(990, 1000))
+    assert store.query("cell", since=0)["time"] == [995.0, 996.0, 997.0, 998.0, 999.0]
+
+
+def test_stats_skip_missing_readings(fake_clock):
+    store = HistoryStore(capacity=10, retention=3600, clock=fake_clock)
+    store.record("cell", {"temperature": 10.0}, when=990)
+    store.record("cell", {"temperature": 20.0, "humidity": 50}, when=991)
+    result = store.query("cell")
+    assert result["stats"]["temperature"] == {"count": 2, "min": 10.0, "max": 20.0, "mean": 15.0}
+    assert result["stats"]["humidity"]["count"] == 1
+    assert result["stats"]["wind_speed"] == {"count": 0, "min": None, "max": None, "mean": None}
+    assert math.isnan(result["series"]["humidity"][0])
+
+
+def test_rows_older_than_the_newest_are_dropped(fake_clock):
+    store = HistoryStore(capacity=10, retention=3600, clock=fake_clock)
+    record_range(store, "cell", [995, 990, 996])
+    assert store.query("cell")["time"] == [995.0, 996.0]
+
+
+def test_unknown_series_is_empty(fake_clock):
+    store = HistoryStore(capacity=10, retention=3600, clock=fake_clock)
+    result = store.query("nowhere")
+    assert result["time"] == []
+    assert result["stats"]["temperature"]["count"] == 0
+
+
+def test_series_persist_in_memory_mapped_files(tmp_path, fake_clock):
+    store = HistoryStore(capacity=4, retention=3600, clock=fake_clock)
+    store.open(tmp_path)
+    record_range(store, "-37.1,144.2|North Central", range(990, 996))
+    store.close()
+    assert (tmp_path / series_filename("-37.1,144.2|North Central")).exists()
+
+    reopened = HistoryStore(capacity=4, retention=3600, clock=fake_clock)
+    reopened.open(tmp_path)
+    try:
+        assert reopened.query("-37.1,144.2|North Central")["time"] == [992.0, 993.0, 994.0, 995.0]
+    finally:
+        reopened.close()
+
+
+def test_changed_capacity_starts_a_fresh_file(tmp_path, fake_clock):
+    store = HistoryStore(capacity=4, retention=3600, clock=fake_clock)
+    store.open(tmp_path)
+    record_range(store, "cell", range(990, 993))
+    store.close()
+    store = HistoryStore(capacity=8, retention=3600, clock=fake_clock)
+    store.open(tmp_path)
+    try:
+        assert store.query("cell")["time"] == []
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([], {"count": 0, "min": None, "max": None, "mean": None}),
+    ([float("nan"), 1.0, 3.0], {"count": 2, "min": 1.0, "max": 3.0, "mean": 2.0}),
+])
+def test_summarize(values, expected):
+    assert summarize(values) == expected
+
+
+def append_rows(directory, capacity: int, rows: int):
+    store = HistoryStore(capacity=capacity)
+    store.open(directory)
+    for i in range(rows):
+        store.record("cell", {"temperature": float(i)}, when=time.time())
+    store.close()
+
+
+def test_processes_appending_to_one_series_never_corrupt_it(tmp_path):
+    """Two writers, as with two uvicorn workers: every row lands in its own slot."""
+    writers = [multiprocessing.Process(target=append_rows, args=(tmp_path, 4096, 1000)) for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=30)
+        assert writer.exitcode == 0
+    store = HistoryStore(capacity=4096)
+    store.open(tmp_path)
+    times = store.query("cell")["time"]
+    # Rows arriving out of order are skipped, but none are lost to a torn header
+    assert 1000 <= len(times) <= 2000
+    assert all(t > 0 for t in times)
+    assert times == sorted(times)
+    store.close()
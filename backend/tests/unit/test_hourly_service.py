@@ -0,0 +1,90 @@
+"""
+Unit tests for the hourly forecast service.
+External HTTP calls are mocked — no network calls made.
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.hourly import aggregate_hourly, get_hourly
+
+
+def make_hourly(dates, hours=range(24), uv=None):
+    times = [f"{d}T{h:02d}:00" for d in dates for h in hours]
+    n = len(times)
+    return {
+        "time": times,
+        "temperature_2m": [10.0 + (i % 24) / 2 for i in range(n)],
+        "precipitation_probability": [(i * 5) % 100 for i in range(n)],
+        "wind_speed_10m": [5.0 + i % 24 for i in range(n)],
+        "uv_index": uv if uv is not None else [0.0] * n,
+    }
+
+
+def test_aggregate_hourly_summarises_each_day():
+    days = aggregate_hourly(make_hourly(["2026-10-18", "2026-10-19"]))
+    assert [d.date for d in days] == ["2026-10-18", "2026-10-19"]
+    assert [d.day for d in days] == ["S", "M"]
+    assert days[0].temp_min == 10.0
+    assert days[0].temp_max == 21.5
+    assert days[0].temp_mean == 15.8
+    assert days[0].wind_speed_max == 28.0
+    assert days[1].precipitation_probability_max == 95
+
+
+def test_aggregate_hourly_splits_parts_of_day():
+    parts = aggregate_hourly(make_hourly(["2026-10-18"]))[0].parts
+    assert [p.part for p in parts] == ["night", "morning", "afternoon", "evening"]
+    assert (parts[0].temp_min, parts[0].temp_max) == (10.0, 12.5)
+    assert (parts[3].temp_min, parts[3].temp_max) == (19.0, 21.5)
+
+
+def test_aggregate_hourly_ignores_missing_values():
+    hourly = make_hourly(["2026-10-18"], uv=[None] * 12 + [3.0, 7.5] + [None] * 10)
+    day = aggregate_hourly(hourly)[0]
+    assert day.uv_index_max == 7.5
+    assert day.parts[0].uv_index_max is None
+
+
+def test_aggregate_hourly_handles_a_short_dst_day():
+    # Clocks go forward: 02:00 doesn't exist, so the day has 23 hours
+    hours = [h for h in range(24) if h != 2]
+    day = aggregate_hourly(make_hourly(["2026-10-04"], hours=hours))[0]
+    assert len(day.parts) == 4
+    assert day.temp_max == 21.0
+
+
+def test_aggregate_hourly_empty():
+    assert aggregate_hourly(make_hourly([])) == []
+
+
+def mock_client_returning(*payloads):
+    responses = []
+    for payload in payloads:
+        response = MagicMock()
+        response.status_code = 200
+        response.raise_for_status = MagicMock()
+        response.json = MagicMock(return_value=payload)
+        responses.append(response)
+    client = AsyncMock()
+    client.__aenter__ = AsyncMock(return_value=client)
+    client.__aexit__ = AsyncMock(return_value=False)
+    client.get = AsyncMock(side_effect=responses)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_get_hourly_fetches_grid_cell_once_and_caches():
+    geo = {"results": [{"name": "Castlemaine", "latitude": -37.0688, "longitude": 144.2197}]}
+    forecast = {"hourly": make_hourly(["2026-10-18", "2026-10-19"])}
+    client = mock_client_returning(geo, forecast)
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await get_hourly("Castlemaine", "AU", days=2)
+        second = await get_hourly("Castlemaine", "AU", days=2)
+    assert client.get.call_count == 2  # one geocode, one forecast
+    params = client.get.call_args.kwargs["params"]
+    assert params["forecast_days"] == 2
+    assert (params["latitude"], params["longitude"]) == (-37.0688, 144.2197)
+    assert first.location == "Castlemaine"
+    assert len(first.days) == 2
+    assert len(first.hourly.time) == 48
+    assert second == first
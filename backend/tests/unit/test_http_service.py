@@ -0,0 +1,153 @@
+"""
+Unit tests for the shared upstream HTTP client registry.
+No network calls are made — clients are only constructed and closed.
+"""
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services.http import ClientRegistry, client_options, upstream_client
+
+
+@pytest.mark.asyncio
+async def test_registry_starts_one_client_per_upstream():
+    registry = ClientRegistry({"a": {}, "b": {}})
+    await registry.start()
+    try:
+        assert isinstance(registry.get("a"), httpx.AsyncClient)
+        assert isinstance(registry.get("b"), httpx.AsyncClient)
+        assert registry.get("a") is not registry.get("b")
+    finally:
+        await registry.aclose()
+    assert registry.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_registry_applies_overrides():
+    registry = ClientRegistry({"open-meteo": {"timeout": 10.0, "max_connections": 20}})
+    await registry.start({"open-meteo": {"timeout": 2.5}})
+    try:
+        client = registry.get("open-meteo")
+        assert client.timeout.read == 2.5
+    finally:
+        await registry.aclose()
+    assert registry.upstreams["open-meteo"]["max_connections"] == 20
+
+
+def test_client_options_disable_http2_without_h2():
+    with patch("app.services.http.HTTP2_AVAILABLE", False):
+        assert client_options({"http2": True})["http2"] is False
+
+
+@pytest.mark.asyncio
+async def test_upstream_client_reuses_pooled_client():
+    from app.services.http import clients
+    await clients.start()
+    try:
+        async with upstream_client("open-meteo") as first:
+            pass
+        async with upstream_client("open-meteo") as second:
+            pass
+        assert first is second is clients.get("open-meteo")
+    finally:
+        await clients.aclose()
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_without_io():
+    from app.services.http import clients, upstream_get
+    from app.services.resilience import CircuitOpenError
+    breaker = clients.breaker("bom")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    with patch("app.services.http.httpx.AsyncClient") as client_class:
+        with pytest.raises(CircuitOpenError):
+            await upstream_get("bom", "https://example.invalid/feed.xml")
+    client_class.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upstream_get_is_bounded_by_the_deadline():
+    import asyncio
+    from unittest.mock import AsyncMock
+    from app.services.http import clients, upstream_get
+    from app.services.resilience import DeadlineExceeded, deadline
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = hang
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        with deadline(0.02):
+            with pytest.raises(DeadlineExceeded):
+                await upstream_get("cfa", "https://example.invalid/tfb.xml")
+    # Running out of our own time doesn't count against the upstream
+    assert clients.breaker("cfa").failures == 0
+
+
+def test_upstreams_sharing_a_quota_draw_from_one_bucket():
+    registry = ClientRegistry({
+        "api": {"calls_per_minute": 10},
+        "search": {"quota": "api"},
+        "feed": {},
+    })
+    assert registry.quota("search") is registry.quota("api")
+    assert registry.quota("feed") is None
+    assert list(registry.quota_report()) == ["api"]
+
+
+@pytest.mark.asyncio
+async def test_deferred_background_call_makes_no_request():
+    from app.services.http import clients, upstream_get
+    from app.services.quota import BACKGROUND, QuotaExceeded, priority
+    clients.quota("open-meteo").drain()
+    with patch("app.services.http.httpx.AsyncClient") as client_class:
+        with priority(BACKGROUND):
+            with pytest.raises(QuotaExceeded):
+                await upstream_get("geocoding", "https://example.invalid/search")
+    client_class.assert_not_called()
+    assert clients.quota_report()["open-meteo"]["deferred"] == 1
+
+
+@pytest.mark.asyncio
+async def test_throttled_response_drains_the_quota():
+    from unittest.mock import AsyncMock, MagicMock
+    from app.services.http import clients, upstream_get
+
+    response = MagicMock()
+    response.status_code = 429
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=response)
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        assert (await upstream_get("open-meteo", "https://example.invalid/forecast")).status_code == 429
+    assert clients.quota("open-meteo").try_acquire() is False
+
+
+@pytest.mark.asyncio
+async def test_batched_forecast_and_its_hedge_each_take_a_token_per_location():
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock
+    from app.services.http import clients
+    from app.services.weather import fetch_forecasts
+
+    async def slow_get(url, **kwargs):
+        await asyncio.sleep(0.05)
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = [{}, {}, {}]
+        return response
+
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(side_effect=slow_get)
+    with patch.dict(clients.upstreams["open-meteo"], {"hedge_after": 0.01}), \
+         patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        await fetch_forecasts([(-37.1, 144.2), (-37.8, 145.0), (-38.3, 144.7)])
+    assert mock_client.get.call_count == 2
+    assert clients.quota_report()["open-meteo"]["used"] == 6
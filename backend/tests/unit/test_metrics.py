@@ -0,0 +1,46 @@
+"""
+Unit tests for the instrumentation layer.
+"""
+
+from app.services.metrics import Counter, Histogram, Metrics, _request_timings, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("stage_seconds", "help", "stage", buckets=(0.1, 1.0))
+    histogram.observe("forecast", 0.05)
+    histogram.observe("forecast", 0.5)
+    histogram.observe("forecast", 5.0)
+    lines = histogram.render()
+    assert 'stage_seconds_bucket{stage="forecast",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="forecast",le="1.0"} 2' in lines
+    assert 'stage_seconds_bucket{stage="forecast",le="+Inf"} 3' in lines
+    assert 'stage_seconds_count{stage="forecast"} 3' in lines
+    assert "# TYPE stage_seconds histogram" in lines
+
+
+def test_counter_renders_labels():
+    counter = Counter("cache_total", "help", ("cache", "result"))
+    counter.inc("forecast", "hit")
+    counter.inc("forecast", "hit")
+    assert 'cache_total{cache="forecast",result="hit"} 2' in counter.render()
+
+
+def test_timed_records_into_current_request():
+    token = _request_timings.set({})
+    try:
+        with timed("parse-bom"):
+            pass
+        timings = _request_timings.get()
+    finally:
+        _request_timings.reset(token)
+    assert "parse-bom" in timings
+
+
+def test_upstream_observation_counts_status():
+    m = Metrics()
+    m.observe_upstream("open-meteo", 200, 0.08)
+    m.observe_upstream("open-meteo", "error", 0.01)
+    text = m.render()
+    assert 'dashboard_upstream_responses_total{upstream="open-meteo",status="200"} 1' in text
+    assert 'dashboard_upstream_responses_total{upstream="open-meteo",status="error"} 1' in text
+    assert 'dashboard_upstream_duration_seconds_count{upstream="open-meteo"} 2' in text
@@ -0,0 +1,171 @@
+"""
+Unit tests for upstream call quotas: token buckets and call priorities,
+including the priority and deadline of work shared by several callers.
+"""
+import asyncio
+
+import pytest
+from unittest.mock import patch
+
+from app.services.quota import (
+    BACKGROUND, INTERACTIVE, Quota, QuotaExceeded, TokenBucket, current_priority, priority,
+)
+from app.services.resilience import deadline, remaining
+from app.services.singleflight import SingleFlight
+from app.services.weather import ForecastBatcher
+
+
+def test_bucket_refills_at_its_limit_per_period(fake_clock):
+    bucket = TokenBucket(60, 60.0, fake_clock)
+    for _ in range(60):
+        bucket.take()
+    assert bucket.tokens == 0
+    assert bucket.wait_time() == pytest.approx(1.0)
+    fake_clock.now += 30.0
+    assert bucket.tokens == pytest.approx(30)
+    fake_clock.now += 970.0
+    assert bucket.tokens == 60  # never above capacity
+
+
+def test_priority_is_interactive_unless_set():
+    assert current_priority() == INTERACTIVE
+    with priority(BACKGROUND):
+        assert current_priority() == BACKGROUND
+    assert current_priority() == INTERACTIVE
+
+
+@pytest.mark.asyncio
+async def test_every_limit_is_enforced(fake_clock):
+    quota = Quota("api", {"calls_per_minute": 100, "calls_per_day": 3}, clock=fake_clock)
+    for _ in range(3):
+        await quota.acquire()
+    with pytest.raises(QuotaExceeded):
+        await quota.acquire()  # the day's budget is gone, however many are left this minute
+    assert quota.used == 3
+
+
+@pytest.mark.asyncio
+async def test_background_calls_leave_a_reserve_for_interactive_ones(fake_clock):
+    quota = Quota("api", {"calls_per_minute": 10}, reserve=0.2, clock=fake_clock)
+    with priority(BACKGROUND):
+        for _ in range(8):
+            await quota.acquire()
+        with pytest.raises(QuotaExceeded):
+            await quota.acquire()
+    assert quota.deferred == 1
+    await quota.acquire()
+    await quota.acquire()
+    assert quota.report()["limits"]["calls_per_minute"] == {"limit": 10, "remaining": 0}
+
+
+@pytest.mark.asyncio
+async def test_interactive_call_waits_for_a_token():
+    quota = Quota("api", {"calls_per_minute": 600}, max_wait=1.0)
+    for _ in range(600):
+        await quota.acquire()
+    # The next token arrives in 0.1 s
+    await asyncio.wait_for(quota.acquire(), 1.0)
+    assert quota.used == 601
+
+
+@pytest.mark.asyncio
+async def test_interactive_call_never_waits_past_its_deadline():
+    quota = Quota("api", {"calls_per_minute": 60}, max_wait=5.0)
+    for _ in range(60):
+        await quota.acquire()
+    with deadline(0.2):
+        with pytest.raises(QuotaExceeded):
+            await quota.acquire()  # a token is 1 s away
+
+
+@pytest.mark.asyncio
+async def test_background_calls_yield_to_waiting_interactive_ones():
+    quota = Quota("api", {"calls_per_minute": 600}, reserve=0.0, max_wait=1.0)
+    for _ in range(600):
+        await quota.acquire()
+    waiter = asyncio.ensure_future(quota.acquire())
+    await asyncio.sleep(0)
+    assert quota.waiting == 1
+    await asyncio.sleep(0.15)  # a token has arrived, but the interactive call is first in line
+    with priority(BACKGROUND):
+        with pytest.raises(QuotaExceeded):
+            await quota.acquire()
+    await waiter
+    assert quota.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_call_takes_its_cost_from_every_bucket(fake_clock):
+    quota = Quota("api", {"calls_per_minute": 100, "calls_per_hour": 1000}, clock=fake_clock)
+    await quota.acquire(cost=50)
+    assert quota.used == 50
+    assert quota.report()["limits"] == {"calls_per_minute": {"limit": 100, "remaining": 50},
+                                        "calls_per_hour": {"limit": 1000, "remaining": 950}}
+    assert quota.try_acquire(cost=50) is False  # a background call would eat into the reserve
+    with pytest.raises(QuotaExceeded, match="exceeds a limit"):
+        await quota.acquire(cost=101)  # never affordable, however long it waits
+
+def test_drain_empties_every_bucket(fake_clock):
+    quota = Quota("api", {"calls_per_minute": 10, "calls_per_hour": 100}, clock=fake_clock)
+    quota.drain()
+    assert quota.try_acquire() is False
+    assert quota.report()["limits"]["calls_per_hour"]["remaining"] == 0
+
+
+async def as_caller(level: str, seconds: float, call):
+    with priority(level):
+        if seconds is None:
+            return await call()
+        with deadline(seconds):
+            return await call()
+
+
+@pytest.mark.asyncio
+async def test_flight_runs_for_its_most_urgent_caller():
+    flights = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)  # the interactive caller joins meanwhile
+        return current_priority(), remaining()
+
+    results = await asyncio.gather(
+        as_caller(BACKGROUND, 1.0, lambda: flights.do("k", fn)),
+        as_caller(INTERACTIVE, None, lambda: flights.do("k", fn)),
+    )
+    assert results[0] == results[1] == (INTERACTIVE, None)
+
+
+@pytest.mark.asyncio
+async def test_flight_of_background_callers_stays_background():
+    flights = SingleFlight()
+
+    async def fn():
+        return current_priority(), remaining()
+
+    (level, left), _ = await asyncio.gather(
+        as_caller(BACKGROUND, 0.5, lambda: flights.do("k", fn)),
+        as_caller(BACKGROUND, 1.0, lambda: flights.do("k", fn)),
+    )
+    assert level == BACKGROUND
+    assert 0.5 < left <= 1.0  # the loosest deadline
+
+
+@pytest.mark.asyncio
+async def test_forecast_batch_runs_for_its_most_urgent_caller():
+    seen = []
+
+    async def fetch_forecasts(coords):
+        seen.append((current_priority(), remaining()))
+        return [{}] * len(coords)
+
+    batcher = ForecastBatcher()
+    with patch("app.services.weather.fetch_forecasts", side_effect=fetch_forecasts):
+        await asyncio.gather(
+            as_caller(BACKGROUND, 1.0, lambda: batcher.fetch(-37.1, 144.2)),
+            as_caller(INTERACTIVE, 2.0, lambda: batcher.fetch(-37.8, 145.0)),
+        )
+        await as_caller(BACKGROUND, 1.0, lambda: batcher.fetch(-37.1, 144.2))
+    (first, left), (second, _) = seen
+    assert first == INTERACTIVE
+    assert 1.0 < left <= 2.0
+    assert second == BACKGROUND
@@ -0,0 +1,109 @@
+"""
+Unit tests for deadlines, circuit breakers and hedged calls.
+"""
+import asyncio
+
+import pytest
+
+from app.services.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, budget, deadline, hedged, remaining,
+    within_deadline,
+)
+
+
+def test_no_deadline_by_default():
+    assert remaining() is None
+
+
+def test_inner_deadline_never_extends_outer():
+    with deadline(1.0):
+        with deadline(60.0):
+            assert remaining() <= 1.0
+    assert remaining() is None
+
+
+def test_budget_takes_a_share_of_what_remains():
+    with deadline(10.0):
+        with budget(0.3):
+            assert 2.5 < remaining() <= 3.0
+        assert remaining() > 9.0
+
+
+@pytest.mark.asyncio
+async def test_within_deadline_gives_up():
+    with deadline(0.01):
+        with pytest.raises(DeadlineExceeded):
+            await within_deadline(asyncio.sleep(1))
+
+
+def test_breaker_opens_after_consecutive_failures(fake_clock):
+    breaker = CircuitBreaker("bom", failure_threshold=3, reset_timeout=30, clock=fake_clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_breaker_lets_one_trial_through_after_reset_timeout(fake_clock):
+    breaker = CircuitBreaker("bom", failure_threshold=1, reset_timeout=30, clock=fake_clock)
+    breaker.record_failure()
+    fake_clock.now += 30
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()  # trial already in flight
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker(fake_clock):
+    breaker = CircuitBreaker("bom", failure_threshold=2, reset_timeout=30, clock=fake_clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    fake_clock.now += 30
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_hedged_fast_call_is_not_duplicated():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert await hedged(call, hedge_after=0.05) == "ok"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_slow_call_races_a_second_one():
+    delays = [1.0, 0.01]
+
+    async def call():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await hedged(call, hedge_after=0.01) == 0.01
+
+
+@pytest.mark.asyncio
+async def test_hedged_uses_the_other_call_when_one_fails():
+    outcomes = [ValueError("first"), "second"]
+
+    async def call():
+        outcome = outcomes.pop(0)
+        await asyncio.sleep(0.02)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert await hedged(call, hedge_after=0.01) == "second"
@@ -0,0 +1,124 @@
+"""
+Unit tests for the cross-worker shared cache.
+Two SharedCache instances opened on the same SQLite file in pytest's tmp_path
+stand in for two worker processes; upstream fetches are plain coroutines.
+"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from unittest.mock import patch
+
+from app.services.cache import TTLCache
+from app.services.fire import BOM_FEED_URL, FireFeed, bom_feed, parse_bom_xml
+from app.services.shared_cache import MISSING, SharedCache, shared_cache
+from tests.unit.test_fire_service import BOM_SAMPLE_XML, make_feed_response, mock_feed_client
+
+
+@pytest.fixture
+def workers(tmp_path, fake_clock):
+    caches = [SharedCache(lease=5, clock=fake_clock) for _ in range(2)]
+    for cache in caches:
+        cache.open(tmp_path / "shared.sqlite3")
+    yield (*caches, fake_clock)
+    for cache in caches:
+        cache.close()
+
+
+def test_entries_carry_age_and_expire(workers):
+    first, second, clock = workers
+    first.put("forecast", (-37.1, 144.2), {"temp": 20}, ttl=60)
+    clock.now += 10
+    assert second.get("forecast", [-37.1, 144.2]) == (10.0, {"temp": 20})
+    clock.now += 50
+    assert second.get("forecast", (-37.1, 144.2)) is None
+
+
+def test_lease_is_exclusive_until_released_or_expired(workers):
+    first, second, clock = workers
+    assert first.acquire("forecast", "k")
+    assert first.acquire("forecast", "k")  # a worker's own coroutines share its lease
+    assert not second.acquire("forecast", "k")
+    first.release("forecast", "k")
+    assert second.acquire("forecast", "k")
+    clock.now += 5
+    assert first.acquire("forecast", "k")
+
+
+def test_closed_cache_shares_nothing():
+    cache = SharedCache()
+    cache.put("forecast", "k", 1, ttl=60)
+    assert not cache.enabled
+    assert cache.get("forecast", "k") is None
+
+
+@pytest.mark.asyncio
+async def test_fetch_once_waits_for_the_worker_holding_the_lease(workers):
+    first, second, _ = workers
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return "mine"
+
+    assert first.acquire("geocode", "k")
+    waiter = asyncio.ensure_future(second.fetch_once(
+        "geocode", "k", fetch, lambda: (second.get("geocode", "k") or (None, MISSING))[1]))
+    await asyncio.sleep(0.01)
+    first.put("geocode", "k", "theirs", ttl=60)
+    first.release("geocode", "k")
+    assert await waiter == "theirs"
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_busy_database_is_a_miss_not_a_wait(workers, tmp_path):
+    first, second, _ = workers
+    first.put("forecast", "k", "cached", ttl=60)
+    writer = sqlite3.connect(str(tmp_path / "shared.sqlite3"), isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")  # another worker in the middle of a write
+    try:
+        started = time.perf_counter()
+        second.put("forecast", "k", "skipped", ttl=60)
+        assert not second.acquire("forecast", "other")
+        second.release("forecast", "k")
+
+        async def fetch():
+            return "fetched"
+
+        assert await second.fetch_once("forecast", "other", fetch, lambda: MISSING) == "fetched"
+        assert time.perf_counter() - started < 0.5
+        assert second.get("forecast", "k")[1] == "cached"  # readers never wait in WAL mode
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_ttl_caches_in_two_workers_fetch_once(workers):
+    first, second, _ = workers
+    caches = [TTLCache(ttl=60, stale_ttl=60, name="forecast", shared=shared) for shared in (first, second)]
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"temp": len(calls)}
+
+    assert await caches[0].get_or_fetch("k", fetch) == {"temp": 1}
+    assert await caches[1].get_or_fetch("k", fetch) == {"temp": 1}
+    assert await caches[1].refresh("k", fetch) == {"temp": 1}  # refreshed moments ago by the other worker
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_fire_feed_uses_parse_from_another_worker(tmp_path):
+    shared_cache.open(tmp_path / "shared.sqlite3")
+    feeds = [FireFeed(BOM_FEED_URL, "bom", parse_bom_xml, decode=bom_feed.decode) for _ in range(2)]
+    client = mock_feed_client(bom=[make_feed_response(BOM_SAMPLE_XML)])
+    with patch("app.services.http.httpx.AsyncClient", return_value=client):
+        first = await feeds[0].get({"Central"})
+        second = await feeds[1].get({"Central"})
+    assert client.get.call_count == 1
+    assert second == first
+    assert second["Central"][0].index == 34
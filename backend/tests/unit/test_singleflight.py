@@ -0,0 +1,68 @@
+"""
+Unit tests for single-flight request coalescing.
+"""
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def slow_call(result=None, error=None):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if error:
+            raise error
+        return result
+    return fn, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    fn, calls = slow_call("forecast")
+    results = await asyncio.gather(*(flights.do("k", fn) for _ in range(5)))
+    assert results == ["forecast"] * 5
+    assert len(calls) == 1
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    flights = SingleFlight()
+    fn, calls = slow_call(error=RuntimeError("upstream down"))
+    results = await asyncio.gather(*(flights.do("k", fn) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    fn, calls = slow_call("x")
+    await asyncio.gather(flights.do("a", fn), flights.do("b", fn))
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    flights = SingleFlight()
+    fn, calls = slow_call("forecast")
+    impatient = asyncio.ensure_future(flights.do("k", fn))
+    patient = asyncio.ensure_future(flights.do("k", fn))
+    await asyncio.sleep(0)
+    impatient.cancel()
+    assert await patient == "forecast"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_new_call_after_completion():
+    flights = SingleFlight()
+    fn, calls = slow_call("forecast")
+    await flights.do("k", fn)
+    await flights.do("k", fn)
+    assert len(calls) == 2
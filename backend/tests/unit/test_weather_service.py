@@ -2,11 +2,16 @@
 Unit tests for weather service.
 Tests the service logic in isolation — external HTTP calls are mocked.
 """
+import asyncio
 import json
+import time
+
+import httpx
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from app.services.weather import get_weather
+from app.models.config import Location
+from app.services.weather import configure_grid, forecast_cache, get_weather
 
 BOM_URL = "https://www.bom.gov.au/location/australia/victoria/north-central/bvic_pt012-castlemaine"
 
@@ -41,6 +46,7 @@ WEATHER_RESPONSE = {
 
 def make_mock_response(data: dict):
     mock = MagicMock()
+    mock.status_code = 200
     mock.raise_for_status = MagicMock()
     mock.json = MagicMock(return_value=data)
     return mock
@@ -55,11 +61,25 @@ async def test_get_weather_returns_location():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     assert result.location == "Castlemaine"
 
 
+@pytest.mark.asyncio
+async def test_get_weather_keeps_the_configured_name_of_a_geocoded_location():
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(side_effect=[
+        make_mock_response(GEO_RESPONSE),
+        make_mock_response(WEATHER_RESPONSE),
+    ])
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        result = await get_weather("Castlemaine", "AU", BOM_URL, location_name="Home")
+    assert result.location == "Home"
+
+
 @pytest.mark.asyncio
 async def test_get_weather_current_conditions():
     mock_client = AsyncMock()
@@ -69,7 +89,7 @@ async def test_get_weather_current_conditions():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     assert result.temperature == 17.8
     assert result.description == "Partly cloudy"
@@ -86,7 +106,7 @@ async def test_get_weather_today_min_max():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     assert result.temp_min == 11.2
     assert result.temp_max == 24.1
@@ -101,7 +121,7 @@ async def test_get_weather_forecast_7day_length():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     assert len(result.forecast_7day) == 7
 
@@ -115,7 +135,7 @@ async def test_get_weather_forecast_temperatures_are_integers():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     for day in result.forecast_7day:
         assert isinstance(day.temp_min, int)
@@ -131,7 +151,7 @@ async def test_get_weather_forecast_first_day_is_tomorrow():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     # 2026-02-20 is a Friday
     assert result.forecast_7day[0].day == "F"
@@ -148,7 +168,131 @@ async def test_get_weather_bom_urls():
         make_mock_response(GEO_RESPONSE),
         make_mock_response(WEATHER_RESPONSE),
     ])
-    with patch("app.services.weather.httpx.AsyncClient", return_value=mock_client):
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
         result = await get_weather("Castlemaine", "AU", BOM_URL)
     assert result.bom_today_url == BOM_URL + "#today"
     assert result.bom_7day_url == BOM_URL + "#7-days"
+
+
+@pytest.mark.asyncio
+async def test_get_weather_batches_concurrent_locations():
+    melbourne = {**WEATHER_RESPONSE, "current": {**WEATHER_RESPONSE["current"], "temperature_2m": 21.0}}
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=make_mock_response([WEATHER_RESPONSE, melbourne]))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        castlemaine_result, melbourne_result = await asyncio.gather(
+            get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22),
+            get_weather("Melbourne", "AU", BOM_URL, latitude=-37.81, longitude=144.96),
+        )
+    assert mock_client.get.call_count == 1
+    params = mock_client.get.call_args.kwargs["params"]
+    assert params["latitude"] == "-37.07,-37.81"
+    assert params["longitude"] == "144.22,144.96"
+    assert castlemaine_result.temperature == 17.8
+    assert melbourne_result.temperature == 21.0
+    assert melbourne_result.location == "Melbourne"
+
+
+@pytest.mark.asyncio
+async def test_get_weather_batch_failure_reaches_every_caller():
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(side_effect=httpx.ConnectError("down"))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        results = await asyncio.gather(
+            get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22),
+            get_weather("Melbourne", "AU", BOM_URL, latitude=-37.81, longitude=144.96),
+            return_exceptions=True,
+        )
+    assert mock_client.get.call_count == 1
+    assert all(isinstance(r, httpx.ConnectError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_get_weather_serves_repeat_lookups_from_cache():
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=make_mock_response(WEATHER_RESPONSE))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        first = await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.0678, longitude=144.2218)
+        second = await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.0681, longitude=144.2219)
+    assert mock_client.get.call_count == 1
+    assert first == second
+
+
+@pytest.mark.asyncio
+async def test_get_weather_refresh_keeps_last_forecast_on_failure():
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(side_effect=[
+        make_mock_response(WEATHER_RESPONSE),
+        httpx.ConnectError("down"),
+    ])
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22)
+        result = await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22,
+                                   refresh=True)
+    assert mock_client.get.call_count == 2
+    assert result.temperature == 17.8
+
+
+@pytest.mark.asyncio
+async def test_get_weather_falls_back_to_expired_forecast_at_deadline():
+    from app.services.resilience import deadline
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=make_mock_response(WEATHER_RESPONSE))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22)
+    # Age the entry past ttl + stale_ttl so it would normally be refetched inline
+    forecast_cache.clock = lambda: 1e9
+    try:
+        mock_client.get = hang
+        with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+            with deadline(0.05):
+                result = await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.07, longitude=144.22)
+    finally:
+        forecast_cache.clock = time.monotonic
+    assert result.temperature == 17.8
+
+
+@pytest.mark.asyncio
+async def test_get_weather_locations_in_one_grid_cell_share_a_forecast():
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=make_mock_response(WEATHER_RESPONSE))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        home = await get_weather("Castlemaine", "AU", BOM_URL, latitude=-37.0678, longitude=144.2218,
+                                 location_name="Home")
+        work = await get_weather("Campbells Creek", "AU", BOM_URL, latitude=-37.0889, longitude=144.2017,
+                                 location_name="Work")
+    assert mock_client.get.call_count == 1
+    assert (home.location, work.location) == ("Home", "Work")
+    assert home.temperature == work.temperature
+    # Requested for the first location looked up in the cell, not the cell's centre
+    params = mock_client.get.call_args.kwargs["params"]
+    assert (params["latitude"], params["longitude"]) == ("-37.0678", "144.2218")
+
+
+@pytest.mark.asyncio
+async def test_get_weather_requests_the_configured_location_of_a_cell():
+    configure_grid(0.1, [Location(city="Sorrento", latitude=-38.3407, longitude=144.7433)])
+    mock_client = AsyncMock()
+    mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client.__aexit__ = AsyncMock(return_value=False)
+    mock_client.get = AsyncMock(return_value=make_mock_response(WEATHER_RESPONSE))
+    with patch("app.services.http.httpx.AsyncClient", return_value=mock_client):
+        await get_weather("Portsea", "AU", BOM_URL, latitude=-38.3192, longitude=144.7119)
+    params = mock_client.get.call_args.kwargs["params"]
+    assert (params["latitude"], params["longitude"]) == ("-38.3407", "144.7433")
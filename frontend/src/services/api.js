@@ -9,6 +9,61 @@ export const weatherApi = {
   getAll: () => client.get('/api/weather/'),
   getByCity: (city, country = 'AU') =>
     client.get(`/api/weather/${city}`, { params: { country } }),
+  // Newline-delimited JSON: { index, weather } per card as it is ready, then
+  // a final { done, total, failed } status line
+  getAllProgressive: async (onLine, user = null) => {
+    const query = user ? `?user=${encodeURIComponent(user)}` : ''
+    const res = await fetch(`/api/weather/${query}`, { headers: { Accept: 'application/x-ndjson' } })
+    if (!res.ok) throw new Error(`HTTP ${res.status}`)
+    return readNdjson(res, onLine)
+  },
+  // Server-Sent Events: a `snapshot` event with every card, then `update` events
+  stream: (user = null) =>
+    new EventSource(`/api/weather/stream${user ? `?user=${encodeURIComponent(user)}` : ''}`),
+  // Fields changed since snapshot `since` ({ version, full, order, changed, removed })
+  changes: (since = 0, user = null) =>
+    client.get('/api/weather/changes', { params: user ? { since, user } : { since } }),
+}
+
+export const dashboardApi = {
+  // Every card at once: { cards: { <name>: { status, updated_at, error, data } } }
+  get: (user = null) => client.get('/api/dashboard/', { params: user ? { user } : {} }),
+}
+
+// Call onLine with each parsed line of an NDJSON response as it arrives
+export async function readNdjson(response, onLine) {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop()
+    for (const line of lines) {
+      if (line.trim()) onLine(JSON.parse(line))
+    }
+  }
+  if (buffer.trim()) onLine(JSON.parse(buffer))
+}
+
+// Apply an `update` event ({ order, changed, removed }) to the current cards
+export function applyWeatherUpdate(cards, update) {
+  const byLocation = new Map(cards.map((card) => [card.location, card]))
+  for (const card of update.changed) {
+    byLocation.set(card.location, card)
+  }
+  return update.order.map((location) => byLocation.get(location)).filter(Boolean)
+}
+
+// Apply a /api/weather/changes answer: merge changed fields, or replace every card if `full`
+export function applyWeatherChanges(cards, changes) {
+  const byLocation = new Map(changes.full ? [] : cards.map((card) => [card.location, card]))
+  for (const [location, fields] of Object.entries(changes.changed)) {
+    byLocation.set(location, { ...byLocation.get(location), ...fields })
+  }
+  return changes.order.map((location) => byLocation.get(location)).filter(Boolean)
 }
 
 export default client
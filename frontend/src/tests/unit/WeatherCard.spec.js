@@ -247,4 +247,23 @@ describe('WeatherCard — FDR scale panel FBI ranges', () => {
   })
 })
 
+describe('WeatherCard degraded', () => {
+  const degraded = {
+    location: 'Melbourne',
+    temperature: null,
+    forecast_7day: [],
+    bom_today_url: mockWeather.bom_today_url,
+    bom_7day_url: mockWeather.bom_7day_url,
+    total_fire_ban: false,
+    fire_danger: null,
+    error: 'Timed out after 10s',
+  }
+
+  it('shows the error instead of conditions', () => {
+    const wrapper = mountWithVuetify(WeatherCard, { props: { weather: degraded } })
+    expect(wrapper.text()).toContain('Weather unavailable: Timed out after 10s')
+    expect(wrapper.text()).not.toContain('°C')
+  })
+})
+
 export { mockWeather }
@@ -0,0 +1,75 @@
+/**
+ * Unit tests for the weather API helpers: live updates and NDJSON reading.
+ */
+import { describe, it, expect } from 'vitest'
+import { applyWeatherChanges, applyWeatherUpdate, readNdjson } from '@/services/api.js'
+
+const cards = [
+  { location: 'Castlemaine', temperature: 17.8 },
+  { location: 'Melbourne', temperature: 19.1 },
+]
+
+describe('applyWeatherUpdate', () => {
+  it('replaces only the changed cards', () => {
+    const result = applyWeatherUpdate(cards, {
+      order: ['Castlemaine', 'Melbourne'],
+      changed: [{ location: 'Melbourne', temperature: 21.0 }],
+      removed: [],
+    })
+    expect(result[0]).toBe(cards[0])
+    expect(result[1].temperature).toBe(21.0)
+  })
+
+  it('adds, removes and reorders cards', () => {
+    const result = applyWeatherUpdate(cards, {
+      order: ['Sorrento', 'Castlemaine'],
+      changed: [{ location: 'Sorrento', temperature: 16.4 }],
+      removed: ['Melbourne'],
+    })
+    expect(result.map((card) => card.location)).toEqual(['Sorrento', 'Castlemaine'])
+  })
+})
+
+describe('applyWeatherChanges', () => {
+  it('merges changed fields into the existing cards', () => {
+    const result = applyWeatherChanges(cards, {
+      version: 4,
+      full: false,
+      order: ['Castlemaine', 'Melbourne'],
+      changed: { Melbourne: { temperature: 21.0 } },
+      removed: [],
+    })
+    expect(result[0]).toBe(cards[0])
+    expect(result[1]).toEqual({ location: 'Melbourne', temperature: 21.0 })
+  })
+
+  it('replaces every card on a full answer', () => {
+    const result = applyWeatherChanges(cards, {
+      version: 9,
+      full: true,
+      order: ['Sorrento'],
+      changed: { Sorrento: { location: 'Sorrento', temperature: 16.4 } },
+      removed: [],
+    })
+    expect(result).toEqual([{ location: 'Sorrento', temperature: 16.4 }])
+  })
+})
+
+describe('readNdjson', () => {
+  it('parses lines split across chunks', async () => {
+    const encoder = new TextEncoder()
+    const chunks = ['{"index":1,"weather":{"loc', 'ation":"Melbourne"}}\n{"done":true,', '"total":1,"failed":[]}\n']
+    const body = new ReadableStream({
+      start(controller) {
+        chunks.forEach((chunk) => controller.enqueue(encoder.encode(chunk)))
+        controller.close()
+      },
+    })
+    const lines = []
+    await readNdjson({ body }, (line) => lines.push(line))
+    expect(lines).toEqual([
+      { index: 1, weather: { location: 'Melbourne' } },
+      { done: true, total: 1, failed: [] },
+    ])
+  })
+})